@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from .analytics import router as analytics_router
 from .creatives import router as creatives_router
 from .groups import router as groups_router
+from .metrics import router as metrics_router
 from .settings import router as settings_router
 from .status import router as status_router
 from .upload import router as upload_router
@@ -16,3 +17,4 @@ router.include_router(creatives_router)
 router.include_router(status_router)
 router.include_router(analytics_router)
 router.include_router(settings_router)
+router.include_router(metrics_router)
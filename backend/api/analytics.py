@@ -11,6 +11,7 @@ from fastapi import HTTPException
 from models import AnalyticsResponse
 from services.analytics_service import calculate_group_processing_time
 from services.analytics_service import get_color_class_distribution
+from services.analytics_service import get_timeout_summary
 from services.analytics_service import get_topic_color_distribution
 from sqlalchemy.orm import Session
 
@@ -126,6 +127,7 @@ def get_analytics(group_id: str, db: Session = Depends(get_db)):
             "avg_ocr_confidence": round(avg_ocr_conf, 2),
             "avg_object_confidence": round(avg_obj_conf, 2),
             "avg_topic_confidence": round(avg_topic_conf, 2),
+            **get_timeout_summary(analyses),
         },
         "topics": [{"topic": k, "count": v} for k, v in topics.items()],
         "dominant_colors": [{"hex": k, "count": v} for k, v in colors.items()],
@@ -203,6 +205,7 @@ def get_analytics_all(db: Session = Depends(get_db)):
             "avg_ocr_confidence": round(avg_ocr_conf, 2),
             "avg_object_confidence": round(avg_obj_conf, 2),
             "avg_topic_confidence": round(avg_topic_conf, 2),
+            **get_timeout_summary(analyses),
         },
         "topics": [{"topic": k, "count": v} for k, v in topics.items()],
         "dominant_colors": [{"hex": k, "count": v} for k, v in colors.items()],
@@ -56,6 +56,7 @@ def get_creative(creative_id: str, db: Session = Depends(get_db)):
         "detected_objects": None,
         "main_topic": None,
         "topic_confidence": None,
+        "classification_path": None,
         "dominant_colors": None,
         "secondary_colors": None,
         "palette_colors": None,
@@ -71,6 +72,7 @@ def get_creative(creative_id: str, db: Session = Depends(get_db)):
                 "detected_objects": analysis.detected_objects,
                 "main_topic": analysis.main_topic,
                 "topic_confidence": analysis.topic_confidence,
+                "classification_path": analysis.classification_path,
                 "dominant_colors": analysis.dominant_colors,
                 "secondary_colors": analysis.secondary_colors,
                 "palette_colors": analysis.palette_colors,
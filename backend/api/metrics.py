@@ -0,0 +1,35 @@
+import logging
+
+from fastapi import APIRouter
+from ml_models import classification_cache
+from ml_models import ocr_metrics
+from redis import RedisError
+
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/classification-cache")
+def read_classification_cache_stats():
+    """Счётчики попаданий кэша классификации, общие по воркерам (Redis)."""
+    try:
+        shared = classification_cache.get_shared_cache_stats()
+    except RedisError as e:
+        logger.warning(f"Не удалось прочитать счётчики кэша из Redis: {e}")
+        shared = None
+    return {
+        "enabled": classification_cache.is_enabled(),
+        "shared": shared,
+    }
+
+
+@router.get("/ocr")
+def read_ocr_stats():
+    """Доля креативов, для которых OCR закончился на детекции: регионов текста не найдено."""
+    try:
+        shared = ocr_metrics.get_shared_ocr_stats()
+    except RedisError as e:
+        logger.warning(f"Не удалось прочитать счётчики OCR из Redis: {e}")
+        shared = None
+    return {"shared": shared}
@@ -1,12 +1,16 @@
 from datetime import datetime
 
 from config import ML_STAGES
+from config import STAGE_STATUS_TIMEOUT
+from config import get_stage_timeouts
+from config import settings
 from database import get_db
 from database_models.creative import Creative
 from database_models.creative import CreativeAnalysis
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import HTTPException
+from services.progress_store import get_progress
 from sqlalchemy.orm import Session
 
 
@@ -25,6 +29,8 @@ def get_status(creative_id: str, db: Session = Depends(get_db)):
             return f"{_elapsed:.1f} sec "  # С пробелом PROCESSING
         if status == "ERROR":
             return "X"
+        if status == STAGE_STATUS_TIMEOUT:
+            return STAGE_STATUS_TIMEOUT
         return "—"
 
     analysis = db.query(CreativeAnalysis).filter(
@@ -45,29 +51,46 @@ def get_status(creative_id: str, db: Session = Depends(get_db)):
         "topic_confidence": analysis.topic_confidence if analysis else None,
     }
 
+    # Пока креатив обрабатывается с PROGRESS_STORE, актуальные статусы этапов лежат в Redis
+    progress = get_progress(creative_id) if settings.PROGRESS_STORE else {}
+
+    def field(name, default=None):
+        if name in progress:
+            return progress[name]
+        return getattr(analysis, name, default) if analysis else default
+
+    timed_out_stages = []
     for stage in ML_STAGES:
-        status_val = getattr(analysis, stage["status"], "PENDING") if analysis else "PENDING"
-        started_val = getattr(analysis, stage["started"], None) if analysis else None
-        duration_val = getattr(analysis, stage["duration"], None) if analysis else None
+        status_val = field(stage["status"], "PENDING")
+        if status_val == STAGE_STATUS_TIMEOUT:
+            timed_out_stages.append(stage["name"])
+        started_val = field(stage["started"])
+        duration_val = field(stage["duration"])
 
         formatted = format_status_with_time(status_val, started_val, duration_val)
         result[stage["name"] + "_status"] = formatted
 
     total_time_str = "—"
 
-    if analysis:
-        if analysis.overall_status == "SUCCESS" and analysis.total_duration is not None:
+    overall_status = field("overall_status")
+    if analysis or progress:
+        if overall_status == "SUCCESS" and analysis and analysis.total_duration is not None:
             total_time_str = f"{analysis.total_duration:.1f} sec"
-        elif analysis.overall_status == "PROCESSING":
-            if analysis.ocr_started_at:
-                elapsed = (datetime.utcnow() - analysis.ocr_started_at).total_seconds()
+        elif overall_status == "PROCESSING":
+            ocr_started_at = field("ocr_started_at")
+            if ocr_started_at:
+                elapsed = (datetime.utcnow() - ocr_started_at).total_seconds()
                 total_time_str = f"{elapsed:.1f} sec "
-        elif analysis.overall_status == "ERROR":
+        elif overall_status == "ERROR":
             total_time_str = "X"
         else:
             total_time_str = "—"
     else:
         total_time_str = "—"
     result["overall_status"] = total_time_str
+    # Этапы, прерванные по лимиту времени, и сами лимиты: результат таких креативов неполный
+    result["timed_out_stages"] = timed_out_stages
+    result["degraded"] = bool(timed_out_stages)
+    result["stage_timeouts"] = get_stage_timeouts()
 
     return result
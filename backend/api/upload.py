@@ -13,7 +13,7 @@ from models import UploadResponse
 from PIL import Image
 from services.upload_service import create_creative
 from sqlalchemy.orm import Session
-from tasks import process_creative
+from tasks import dispatch_creative
 from utils.minio_utils import upload_to_minio
 
 
@@ -81,7 +81,7 @@ async def upload_files(
                 image_height=height,
             )
 
-            process_creative.delay(creative_id)
+            dispatch_creative(creative_id)
 
             uploaded += 1
 
@@ -0,0 +1,91 @@
+"""
+Воркер очереди Redis для PIPELINE_MODE=batch и PIPELINE_MODE=pipeline.
+
+batch: забирает до BATCH_MAX_SIZE креативов (или ждёт не дольше
+BATCH_MAX_WAIT_MS после первого) и прогоняет пачку через модели одним вызовом.
+pipeline: передаёт креативы в конвейер, где скачивание, OCR, детекция
+и классификация соседних креативов выполняются одновременно.
+
+Запуск из каталога backend:
+    python batch_worker.py
+"""
+import logging
+import signal
+
+from config import PIPELINE_MODE_PIPELINE
+from config import settings
+from ml_models import classifier
+from services.batch_processing_service import process_creative_batch
+from services.batch_queue import ack_creatives
+from services.batch_queue import enqueue_creative
+from services.batch_queue import pop_batch
+from services.batch_queue import requeue_unacked
+from services.model_loader import load_models
+from services.pipeline_executor import MODEL_STAGES
+from services.pipeline_executor import PipelineExecutor
+from services.thread_budget import configure_process
+
+
+logger = logging.getLogger(__name__)
+
+_stopping = False
+
+
+def _request_stop(signum, _frame):
+    global _stopping  # noqa: PLW0603
+    logger.info(f"Получен сигнал {signum}, воркер остановится после текущей пачки")
+    _stopping = True
+
+
+def main():
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    pipeline_mode = settings.PIPELINE_MODE == PIPELINE_MODE_PIPELINE
+    # В конвейере этапы соседних креативов работают в потоках одновременно
+    configure_process(parallel_stages=len(MODEL_STAGES) if pipeline_mode else 1)
+    if not load_models():
+        logger.error("Критическая ошибка при копировании моделей. Worker может работать некорректно.")
+    try:
+        classifier.warmup_bert_model()
+        logger.info(f"Модель BERT готова, время загрузки: {classifier.get_bert_load_duration():.2f} сек.")
+    except Exception:
+        logger.exception("Не удалось загрузить и прогреть модель BERT при старте воркера.")
+    requeue_unacked()
+    if pipeline_mode:
+        run_pipeline()
+    else:
+        run_batches()
+
+
+def run_batches():
+    logger.info(
+        f"Батчевый воркер запущен: до {settings.BATCH_MAX_SIZE} креативов, "
+        f"ожидание пачки до {settings.BATCH_MAX_WAIT_MS} мс",
+    )
+    while not _stopping:
+        creative_ids = pop_batch(settings.BATCH_MAX_SIZE, settings.BATCH_MAX_WAIT_MS)
+        if creative_ids:
+            process_creative_batch(creative_ids)
+            # Подтверждаем после сохранения результата: при падении процесса пачка вернётся в очередь
+            ack_creatives(creative_ids)
+
+
+def run_pipeline():
+    executor = PipelineExecutor(
+        on_done=lambda creative_id: ack_creatives([creative_id]),
+        # Креатив, чей этап не запускался из-за занятой модели, возвращается в очередь до подтверждения
+        on_retry=enqueue_creative,
+    )
+    try:
+        while not _stopping:
+            # Без ожидания добора: конвейер сам ограничивает число креативов в работе
+            for creative_id in pop_batch(settings.PIPELINE_QUEUE_SIZE, 0):
+                executor.submit(creative_id)
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
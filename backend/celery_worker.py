@@ -1,9 +1,12 @@
+from config import STAGE_QUEUES
+from tasks import STAGE_TASKS
 from tasks import celery
 
 
 celery.conf.update(
     task_routes={
         "tasks.process_creative": {"queue": "creatives"},
+        **{task.name: {"queue": STAGE_QUEUES[stage]} for stage, task in STAGE_TASKS.items()},
     },
     task_serializer="json",
     accept_content=["json"],
@@ -13,6 +13,8 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str
     MINIO_SECURE: bool = False
     MINIO_BUCKET: str = "creatives"
+    MINIO_DOWNLOAD_MODE: str = "memory"  # memory, file
+    MINIO_SPOOL_MAX_SIZE: int = 32 * 1024 * 1024
     MINIO_PUBLIC_URL: str
     BACKEND_CORS_ORIGINS: list = ["http://localhost:8501"]
     REDIS_URL: str
@@ -20,10 +22,59 @@ class Settings(BaseSettings):
     MODEL_CACHE_DIR: str
     MODEL_MINIO_BUCKET: str
     YOLO_MODEL_PATH: str
+    YOLO_MODEL_CONFIG: str = "yolov8m.yaml"
+    YOLO_BACKEND: str = "torch"  # torch, onnx
+    YOLO_ONNX_PATH: str = "yolov8m.onnx"
+    YOLO_ONNX_INT8: bool = False  # Квантовать веса при экспорте ONNX-модели, если её нет в бакете
     EASYOCR_WEIGHTS_DIR: str
     BERT_MODEL_PATH: str
     BERT_TOKENIZER_NAME: str = "sberbank-ai/ruBERT-base"
+    BERT_TOKENIZER_DIR: str = "bert_tokenizer"
     DEVICE: str = "cpu"
+    BERT_BACKEND: str = "torch"  # torch, onnx
+    BERT_ONNX_PATH: str = "best_multimodal_bert.onnx"
+    BERT_QUANTIZE: bool = False
+    BERT_MODEL_VERSION: str = ""  # Меняйте при замене весов под тем же именем файла
+    CLASSIFICATION_CACHE_SIZE: int = 4096  # 0 - кэш отключён
+    CLASSIFICATION_CACHE_TTL: int = 86400
+    CLASSIFICATION_CACHE_REDIS: bool = False
+    CLASSIFICATION_CASCADE: bool = False
+    CASCADE_CONF_THRESHOLD: float = 0.8
+    BERT_BATCH_SIZE: int = 32
+    BERT_PAD_TO_MULTIPLE_OF: int = 8
+    PIPELINE_MODE: str = "single"  # single, stages, batch, pipeline
+    PIPELINE_PARALLEL_STAGES: bool = True
+    PIPELINE_STAGE_THREADS: int = 0  # 0 - поровну делим ядра между параллельными этапами
+    BATCH_MAX_SIZE: int = 16
+    BATCH_MAX_WAIT_MS: int = 200
+    BATCH_WORKER_ID: str = ""  # Имя списка креативов в обработке; по умолчанию - имя хоста
+    PIPELINE_QUEUE_SIZE: int = 2  # креативов в очереди между соседними этапами конвейера
+    INFERENCE_SERVER: bool = False  # Модели держит отдельный процесс inference_server.py
+    INFERENCE_SOCKET_PATH: str = "/tmp/inference.sock"
+    INFERENCE_AUTHKEY: str = ""  # Общий ключ сервера инференса и воркеров; без него сервер не запускается
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: int = 10
+    INFERENCE_TIMEOUT: int = 120
+    PROGRESS_STORE: bool = False  # Статусы этапов в Redis, итог анализа - одной транзакцией в Postgres
+    RETRY_BACKOFF_BASE: int = 5  # сек.; задержка повтора растёт как base * 2^попытка со случайной добавкой
+    RETRY_BACKOFF_MAX: int = 300
+    CELERY_POOL: str = "prefork"  # prefork, threads
+    OCR_MAX_CONCURRENCY: int = 1  # Одновременных вызовов модели на процесс при пуле потоков
+    OCR_BATCH_SIZE: int = 8  # Изображений одного размера в одном проходе детектора EasyOCR
+    OCR_TARGET_SIDE: int = 0  # Длинная сторона изображения для детектора текста, пикс.; 0 - исходный размер
+    OCR_MIN_TEXT_HEIGHT: int = 12  # Минимальная высота строки на входе детектора, ниже - детекция крупнее
+    OCR_TEXT_THRESHOLD: float = 0.7  # Порог уверенности CRAFT для региона текста
+    OCR_MIN_REGION_SIZE: int = 20  # Регионы меньше этого размера (пикс. входа детектора) отбрасываются
+    YOLO_MAX_CONCURRENCY: int = 1
+    BERT_MAX_CONCURRENCY: int = 2
+    CPU_BUDGET_CORES: int = 0  # 0 - все доступные процессу ядра
+    TORCH_INTRA_OP_THREADS: int = 0  # 0 - ядра, делённые на число процессов/потоков воркера
+    TORCH_INTER_OP_THREADS: int = 1
+    STAGE_THREAD_LIMITS: str = ""  # Потоки OpenMP/BLAS по этапам, например ocr=2,color=1
+    STAGE_TIMEOUT: float = 0  # сек.; мягкий лимит на этап, после него этап получает TIMEOUT; 0 - без лимита
+    STAGE_TIMEOUTS: str = ""  # Лимиты по этапам, например ocr=60,color=20; перекрывают STAGE_TIMEOUT
+    WORKER_CPU_AFFINITY: bool = False  # Закреплять дочерние процессы prefork за своими ядрами
+    WORKER_STAGES: str = ""  # Этапы воркера через запятую: ocr,detection,classification,color; пусто - все
 
     class Config:
         env_file = ".env"
@@ -100,6 +151,33 @@ def map_coco_to_topic(coco_class: str) -> str | None:
     return None
 
 
+# Соответствие тем из map_coco_to_topic ключам TOPICS
+COCO_TOPIC_TO_TOPIC = {
+    'Сумки': 'bags',
+    'Столовые_приборы': 'cutlery',
+    'Часы': 'clocks',
+    'Кружки': 'cups',
+    'Галстуки': 'ties',
+}
+
+# Начала слов, по которым OCR-текст относится к теме (для каскадной классификации)
+TOPIC_KEYWORDS = {
+    'cutlery': ['прибор', 'нерж', 'ложк', 'вилк', 'нож', 'посуд', 'cutlery', 'fork', 'spoon', 'knife'],
+    'ties': ['галстук', 'tie'],
+    'bags': ['сумк', 'рюкзак', 'чемодан', 'bag'],
+    'cups': ['круж', 'чашк', 'керамик', 'cup', 'mug'],
+    'clocks': ['часы', 'часов', 'наручн', 'watch', 'clock'],
+}
+
+DOWNLOAD_MODE_MEMORY = "memory"
+PIPELINE_MODE_STAGES = "stages"
+PIPELINE_MODE_BATCH = "batch"
+PIPELINE_MODE_PIPELINE = "pipeline"
+CELERY_POOL_PREFORK = "prefork"
+
+CLASSIFICATION_PATH_BERT = "bert"
+CLASSIFICATION_PATH_CASCADE = "cascade"
+
 # Дефолты для цветового анализа
 DOMINANT_COLORS_COUNT = 3
 SECONDARY_COLORS_COUNT = 3
@@ -167,6 +245,13 @@ COLOR_VISUAL_CLASSES = {
     "Белый": {"f7f7f7"},
 }
 
+STAGE_OCR = "ocr"
+STAGE_DETECTION = "detection"
+STAGE_CLASSIFICATION = "classification"
+STAGE_COLOR = "color"
+# Этап прерван по мягкому лимиту времени (STAGE_TIMEOUT), задача продолжена без его результата
+STAGE_STATUS_TIMEOUT = "TIMEOUT"
+
 ML_STAGES = [
     {
         "name": "ocr",
@@ -197,3 +282,63 @@ ML_STAGES = [
         "duration": "color_analysis_duration",
     },
 ]
+
+# Очереди Celery для режима PIPELINE_MODE=stages
+STAGE_QUEUES = {
+    STAGE_OCR: "ocr",
+    STAGE_DETECTION: "detection",
+    STAGE_CLASSIFICATION: "classification",
+    STAGE_COLOR: "color",
+}
+
+
+def get_worker_stages() -> list[str]:
+    """Этапы, которые обслуживает воркер (WORKER_STAGES), в порядке ML_STAGES."""
+    all_stages = [stage["name"] for stage in ML_STAGES]
+    requested = {stage.strip() for stage in settings.WORKER_STAGES.split(",") if stage.strip()}
+    if not requested:
+        return all_stages
+    unknown = requested - set(all_stages)
+    if unknown:
+        logger.warning(f"Неизвестные этапы в WORKER_STAGES: {sorted(unknown)}")
+    return [stage for stage in all_stages if stage in requested]
+
+
+def _parse_stage_values(raw: str, setting_name: str, convert) -> dict:
+    """Разбирает строку вида ocr=2,color=1; convert возвращает None для некорректного значения."""
+    stages = {stage["name"] for stage in ML_STAGES}
+    values = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        stage, _, value = item.partition("=")
+        stage = stage.strip()
+        parsed = convert(value.strip())
+        if stage not in stages or parsed is None:
+            logger.warning(f"Некорректный элемент {setting_name}: {item!r}")
+            continue
+        values[stage] = parsed
+    return values
+
+
+def _to_thread_count(value: str) -> int | None:
+    return max(1, int(value)) if value.isdigit() else None
+
+
+def _to_seconds(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def get_stage_thread_limits() -> dict[str, int]:
+    """Явные лимиты потоков по этапам из STAGE_THREAD_LIMITS."""
+    return _parse_stage_values(settings.STAGE_THREAD_LIMITS, "STAGE_THREAD_LIMITS", _to_thread_count)
+
+
+def get_stage_timeouts() -> dict[str, float]:
+    """Мягкие лимиты времени этапов в секундах; этапы без лимита не попадают в словарь."""
+    timeouts = {stage["name"]: settings.STAGE_TIMEOUT for stage in ML_STAGES}
+    timeouts.update(_parse_stage_values(settings.STAGE_TIMEOUTS, "STAGE_TIMEOUTS", _to_seconds))
+    return {stage: timeout for stage, timeout in timeouts.items() if timeout > 0}
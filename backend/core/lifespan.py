@@ -5,6 +5,7 @@ from config import DOMINANT_COLORS_COUNT
 from config import SECONDARY_COLORS_COUNT
 from database import Base
 from database import SessionLocal
+from database import add_missing_columns
 from database import engine
 from database_models.app_settings import AppSettings
 from fastapi import FastAPI
@@ -43,6 +44,7 @@ async def lifespan(app: FastAPI):  # noqa: ARG001
     logger.info("Запуск lifespan: создание таблиц БД и инициализация настроек...")
     Base.metadata.create_all(bind=engine)
     logger.info("Таблицы БД созданы (если не существовали).")
+    add_missing_columns(engine)
 
     db = SessionLocal()
     try:
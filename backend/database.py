@@ -1,13 +1,25 @@
+import logging
+
 from config import settings
 from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Колонки, добавленные в модели после первого релиза: create_all не меняет существующие таблицы
+ADDED_COLUMNS = {
+    "creative_analysis": {"classification_path": "VARCHAR"},
+}
+
 
 def get_db():
     db = SessionLocal()
@@ -15,3 +27,23 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def add_missing_columns(bind: Engine = engine) -> list[str]:
+    """Добавляет в существующие таблицы колонки из ADDED_COLUMNS; возвращает добавленные."""
+    inspector = inspect(bind)
+    # IF NOT EXISTS защищает от гонки нескольких экземпляров backend при старте
+    if_not_exists = "IF NOT EXISTS " if bind.dialect.name == "postgresql" else ""
+    added = []
+    with bind.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for column, column_type in columns.items():
+                if column in existing:
+                    continue
+                logger.info(f"Добавление колонки {table}.{column}")
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{column} {column_type}"))
+                added.append(f"{table}.{column}")
+    return added
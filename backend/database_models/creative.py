@@ -38,6 +38,7 @@ class CreativeAnalysis(Base):
     # Предсказание таргета
     main_topic = Column(String)
     topic_confidence = Column(Float)
+    classification_path = Column(String)  # bert, cascade
     # Определени доминантного цвета
     dominant_colors = Column(JSON)
     secondary_colors = Column(JSON)
@@ -0,0 +1,65 @@
+"""
+Сервер инференса: одна копия EasyOCR, YOLO и BERT на машину.
+
+Воркеры Celery с INFERENCE_SERVER=true не загружают модели сами, а отправляют
+запросы OCR, детекции и классификации через Unix-сокет INFERENCE_SOCKET_PATH.
+Запросы всех воркеров собираются в батчи (INFERENCE_MAX_BATCH_SIZE,
+INFERENCE_MAX_WAIT_MS), поэтому память не растёт с --concurrency.
+
+Запуск из каталога backend:
+    python inference_server.py
+"""
+import logging
+import signal
+import sys
+from pathlib import Path
+
+from config import settings
+from ml_models import classifier
+from ml_models import ocr_model
+from ml_models import yolo_detector
+from ml_models.inference_server import create_batchers
+from ml_models.inference_server import create_listener
+from ml_models.inference_server import serve
+from services.model_loader import load_models
+from services.thread_budget import configure_process
+
+
+logger = logging.getLogger(__name__)
+
+
+def _exit(signum, _frame):
+    logger.info(f"Получен сигнал {signum}, сервер инференса останавливается")
+    sys.exit(0)
+
+
+def main():
+    signal.signal(signal.SIGTERM, _exit)
+    if not settings.INFERENCE_AUTHKEY:
+        logger.error("Не задан INFERENCE_AUTHKEY: сервер инференса не запускается без ключа.")
+        raise SystemExit(1)
+
+    configure_process()
+    if not load_models():
+        logger.error("Критическая ошибка при копировании моделей. Сервер может работать некорректно.")
+    ocr_model.get_ocr_reader()
+    yolo_detector.get_yolo_model()
+    classifier.warmup_bert_model()
+
+    socket_path = Path(settings.INFERENCE_SOCKET_PATH)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    # Сокет, оставшийся от предыдущего запуска, мешает bind
+    socket_path.unlink(missing_ok=True)
+
+    batchers = create_batchers()
+    with create_listener(str(socket_path)) as listener:
+        logger.info(
+            f"Сервер инференса слушает {socket_path}: батч до {settings.INFERENCE_MAX_BATCH_SIZE}, "
+            f"ожидание до {settings.INFERENCE_MAX_WAIT_MS} мс",
+        )
+        serve(listener, batchers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,98 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from config import NUM_COCO
+from torch import nn
+
+
+logger = logging.getLogger(__name__)
+
+ONNX_INPUT_NAMES = ["input_ids", "attention_mask", "yolo_vec"]
+ONNX_OUTPUT_NAMES = ["logits"]
+ONNX_OPSET_VERSION = 17
+
+
+class _LogitsOnlyModel(nn.Module):
+    """Обёртка для экспорта: ONNX не умеет возвращать словарь с loss=None."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, yolo_vec):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, yolo_vec=yolo_vec)['logits']
+
+
+def export_bert_to_onnx(model: nn.Module, output_path: str | Path, opset_version: int = ONNX_OPSET_VERSION) -> Path:
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Экспорт модели BERT в ONNX: {output_path}")
+
+    # Обёртка должна быть в eval: экспортёр восстанавливает её режим рекурсивно
+    export_model = _LogitsOnlyModel(model).cpu().eval()
+    dummy_input_ids = torch.ones((2, 16), dtype=torch.long)
+    # Маска с паддингом, чтобы трассировка не выкинула ветку маскирования внимания
+    dummy_attention_mask = torch.ones((2, 16), dtype=torch.long)
+    dummy_attention_mask[1, 8:] = 0
+    dummy_yolo_vec = torch.zeros((2, NUM_COCO), dtype=torch.float32)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            export_model,
+            (dummy_input_ids, dummy_attention_mask, dummy_yolo_vec),
+            str(output_path),
+            input_names=ONNX_INPUT_NAMES,
+            output_names=ONNX_OUTPUT_NAMES,
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "yolo_vec": {0: "batch"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset_version,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    logger.info(f"Модель BERT экспортирована в ONNX: {output_path}")
+    return output_path
+
+
+class OnnxBertClassifier:
+    """
+    Инференс MultiModalBertClassifier через ONNX Runtime на CPU.
+
+    Повторяет интерфейс forward() PyTorch-модели, поэтому classify_creative
+    работает с ним без изменений.
+    """
+
+    def __init__(self, model_path: str | Path, intra_op_num_threads: int = 0):
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = intra_op_num_threads
+        self.model_path = Path(model_path)
+        self.session = ort.InferenceSession(
+            str(self.model_path),
+            sess_options=sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+        logger.info(f"ONNX Runtime сессия создана для {self.model_path}")
+
+    def forward(self, input_ids, attention_mask, yolo_vec, labels=None):  # noqa: ARG002
+        feeds = {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+            "yolo_vec": yolo_vec.cpu().numpy().astype(np.float32),
+        }
+        (logits,) = self.session.run(ONNX_OUTPUT_NAMES, feeds)
+        return {'loss': None, 'logits': torch.from_numpy(logits)}
+
+    __call__ = forward
+
+    def eval(self):
+        return self
+
+    def to(self, _device):
+        return self
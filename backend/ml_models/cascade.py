@@ -0,0 +1,59 @@
+import logging
+
+from config import COCO_TOPIC_TO_TOPIC
+from config import TOPIC_KEYWORDS
+from config import map_coco_to_topic
+from config import settings
+from ml_models.preprocessing import clean_text_for_bert
+from ml_models.preprocessing import yolo_top1_topic_for_bert
+
+
+logger = logging.getLogger(__name__)
+
+
+def text_topics(ocr_text: str) -> set[str]:
+    words = clean_text_for_bert(ocr_text).split()
+    return {
+        topic
+        for topic, keywords in TOPIC_KEYWORDS.items()
+        if any(word.startswith(keyword) for word in words for keyword in keywords)
+    }
+
+
+def detection_topic(detected_objects: list, conf_threshold: float) -> tuple[str, float] | None:
+    if not detected_objects:
+        return None
+    classes = [obj['class'] for obj in detected_objects]
+    confs = [obj['confidence'] for obj in detected_objects]
+
+    coco_topic = yolo_top1_topic_for_bert(classes, confs)
+    top_conf = max(confs)
+    if coco_topic is None or top_conf < conf_threshold:
+        return None
+
+    # Однозначность: ни один другой объект не указывает на другую тему
+    detected_topics = {map_coco_to_topic(cls) for cls in classes} - {None}
+    if detected_topics != {coco_topic}:
+        return None
+    return COCO_TOPIC_TO_TOPIC[coco_topic], top_conf
+
+
+def cascade_topic(
+        ocr_text: str,
+        detected_objects: list,
+        conf_threshold: float | None = None,
+) -> tuple[str, float] | None:
+    """Возвращает тему без BERT, если детекция однозначна, а текст пуст или согласен с ней."""
+    conf_threshold = settings.CASCADE_CONF_THRESHOLD if conf_threshold is None else conf_threshold
+    decision = detection_topic(detected_objects, conf_threshold)
+    if decision is None:
+        return None
+
+    topic, confidence = decision
+    found_topics = text_topics(ocr_text or "")
+    if clean_text_for_bert(ocr_text or "") and found_topics != {topic}:
+        logger.debug(f"Каскад: текст не подтверждает тему {topic}, темы текста: {found_topics}")
+        return None
+
+    logger.info(f"Каскад: тема {topic} определена по детекции, уверенность {confidence:.4f}")
+    return topic, confidence
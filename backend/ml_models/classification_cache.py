@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import redis
+from config import settings
+from utils.redis_counters import BufferedCounters
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "classification_cache:"
+CACHE_STATS_KEY = "classification_cache:stats"
+# Уверенности YOLO округляются до сотых, чтобы шум детекции не дробил ключи
+VECTOR_SCALE = 100
+STAT_FIELDS = ("local_hits", "redis_hits", "misses")
+
+_local_cache: OrderedDict[str, tuple[float, tuple[str, float]]] = OrderedDict()
+_cache_lock = threading.Lock()
+_redis_client = None
+
+
+def make_cache_key(cleaned_text: str, yolo_vector: np.ndarray, model_version: str) -> str:
+    quantized = np.rint(np.asarray(yolo_vector, dtype=np.float64) * VECTOR_SCALE).astype(np.int16)
+    digest = hashlib.sha256()
+    digest.update(model_version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(cleaned_text.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(quantized.tobytes())
+    return digest.hexdigest()
+
+
+def is_enabled() -> bool:
+    return settings.CLASSIFICATION_CACHE_SIZE > 0
+
+
+def _get_redis_client():
+    global _redis_client  # noqa: PLW0603
+    if not settings.CLASSIFICATION_CACHE_REDIS:
+        return None
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1,
+        )
+    return _redis_client
+
+
+# Счётчики уходят в Redis пачками, а не HINCRBY на каждый креатив
+_counters = BufferedCounters(CACHE_STATS_KEY, STAT_FIELDS, _get_redis_client)
+
+
+def _count(field: str):
+    _counters.increment(field)
+
+
+def flush_stats():
+    """Отправляет накопленные счётчики попаданий в Redis."""
+    _counters.flush()
+
+
+def _get_local(key: str) -> tuple[str, float] | None:
+    with _cache_lock:
+        entry = _local_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _local_cache[key]
+            return None
+        _local_cache.move_to_end(key)
+        return value
+
+
+def _put_local(key: str, value: tuple[str, float]):
+    with _cache_lock:
+        _local_cache[key] = (time.monotonic() + settings.CLASSIFICATION_CACHE_TTL, value)
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > settings.CLASSIFICATION_CACHE_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def get(key: str) -> tuple[str, float] | None:
+    """Ищет результат классификации сначала в памяти процесса, затем в Redis."""
+    if not is_enabled():
+        return None
+
+    value = _get_local(key)
+    if value is not None:
+        _count("local_hits")
+        return value
+
+    client = _get_redis_client()
+    if client is not None:
+        try:
+            raw = client.get(CACHE_KEY_PREFIX + key)
+        except redis.RedisError as e:
+            logger.warning(f"Ошибка чтения кэша классификации из Redis: {e}")
+            raw = None
+        if raw is not None:
+            topic, confidence = json.loads(raw)
+            value = (topic, float(confidence))
+            _put_local(key, value)
+            _count("redis_hits")
+            return value
+
+    _count("misses")
+    return None
+
+
+def put(key: str, value: tuple[str, float]):
+    if not is_enabled():
+        return
+    _put_local(key, value)
+    client = _get_redis_client()
+    if client is None:
+        return
+    try:
+        client.set(CACHE_KEY_PREFIX + key, json.dumps(value), ex=settings.CLASSIFICATION_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Ошибка записи кэша классификации в Redis: {e}")
+
+
+def clear():
+    """Очищает кэш процесса и счётчики. Общий кэш в Redis не трогается."""
+    with _cache_lock:
+        _local_cache.clear()
+    _counters.clear()
+
+
+def _with_hit_rate(stats: dict) -> dict:
+    lookups = sum(stats[field] for field in STAT_FIELDS)
+    hits = stats["local_hits"] + stats["redis_hits"]
+    return {**stats, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+def get_cache_stats() -> dict:
+    """Счётчики попаданий текущего процесса."""
+    stats = _counters.totals()
+    with _cache_lock:
+        stats["size"] = len(_local_cache)
+    return _with_hit_rate(stats)
+
+
+def get_shared_cache_stats() -> dict | None:
+    """Счётчики всех воркеров, накопленные в Redis (при CLASSIFICATION_CACHE_REDIS)."""
+    stats = _counters.read_shared()
+    return _with_hit_rate(stats) if stats is not None else None
@@ -1,25 +1,56 @@
 import logging
 import pathlib
+import threading
+import time
 from typing import Any
 
+import numpy as np
 import torch
 from config import NUM_COCO
 from config import NUM_LABELS
 from config import settings
+from ml_models import classification_cache
+from ml_models.bert_onnx import OnnxBertClassifier
 from ml_models.preprocessing import clean_text_for_bert
 from ml_models.preprocessing import yolo_to_vector_for_bert
+from safetensors.torch import load_file as load_safetensors_file
 from torch import nn
+from transformers import AutoConfig
 from transformers import AutoModel
 from transformers import AutoTokenizer
+from transformers import BertConfig
+from transformers.modeling_utils import no_init_weights
 
 
 logger = logging.getLogger(__name__)
 
+_bert_model = None
+_bert_tokenizer = None
+_bert_load_duration = None
+_bert_lock = threading.Lock()
+# Быстрый токенизатор HF падает с "Already borrowed" при вызове из нескольких потоков
+_tokenizer_lock = threading.Lock()
+_bert_semaphore = threading.BoundedSemaphore(settings.BERT_MAX_CONCURRENCY)
+
+WARMUP_TEXT = "smart watch 8 серии"
+MAX_SEQ_LENGTH = 160
+BACKEND_ONNX = "onnx"
+SAFETENSORS_SUFFIX = ".safetensors"
+ID_TO_TOPIC = {0: 'ties', 1: 'cups', 2: 'cutlery', 3: 'bags', 4: 'clocks'}
+BUNDLED_BERT_CONFIG_PATH = pathlib.Path(__file__).parent / "configs" / "rubert_base_config.json"
+
 
 class MultiModalBertClassifier(nn.Module):
-    def __init__(self, model_name, num_numeric_features, num_labels, dropout=0.3, hidden_dim=256):
+    def __init__(
+            self, model_name=None, num_numeric_features=NUM_COCO, num_labels=NUM_LABELS,
+            dropout=0.3, hidden_dim=256, bert_config=None,
+    ):
         super().__init__()
-        self.bert = AutoModel.from_pretrained(model_name)
+        # С конфигом строим только архитектуру: веса придут из дообученного чекпойнта
+        if bert_config is not None:
+            self.bert = AutoModel.from_config(bert_config)
+        else:
+            self.bert = AutoModel.from_pretrained(model_name)
         hid = self.bert.config.hidden_size
         self.dropout = nn.Dropout(dropout)
         self.fc1 = nn.Linear(hid + num_numeric_features, hidden_dim)
@@ -51,100 +82,236 @@ class ModelNotFoundError(Exception):
         super().__init__(f"Model not found at {model_path}")
 
 
-def get_bert_model_and_tokenizer():
-    def _check_model_file(_model_path):
-        if not _model_path.exists():
-            logger.error(f"Модель BERT не найдена по пути {_model_path}")
-            raise ModelNotFoundError(_model_path)
+def _check_model_file(model_path: pathlib.Path):
+    if not model_path.exists():
+        logger.error(f"Модель BERT не найдена по пути {model_path}")
+        raise ModelNotFoundError(model_path)
 
-    logger.info("Загрузка модели BERT и токенизатора")
-    try:
-        tokenizer_name = settings.BERT_TOKENIZER_NAME
-        logger.info(f"Инициализация токенизатора: {tokenizer_name}")
-        _bert_tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
-        logger.info("Токенизатор успешно инициализирован.")
 
-        model_path = pathlib.Path(settings.MODEL_CACHE_DIR) / settings.BERT_MODEL_PATH
-        _check_model_file(model_path)
+def get_bert_tokenizer_dir() -> pathlib.Path:
+    return pathlib.Path(settings.MODEL_CACHE_DIR) / settings.BERT_TOKENIZER_DIR
+
+
+def load_bert_tokenizer():
+    tokenizer_dir = get_bert_tokenizer_dir()
+    if tokenizer_dir.exists():
+        logger.info(f"Инициализация токенизатора из локальных файлов: {tokenizer_dir}")
+        return AutoTokenizer.from_pretrained(tokenizer_dir, local_files_only=True)
+
+    logger.warning(
+        f"Локальные файлы токенизатора не найдены в {tokenizer_dir}. "
+        f"Загрузка с HF Hub: {settings.BERT_TOKENIZER_NAME}",
+    )
+    return AutoTokenizer.from_pretrained(settings.BERT_TOKENIZER_NAME)
 
-        device = torch.device(settings.DEVICE)
-        logger.info(f"Загрузка весов модели BERT с устройства: {device}")
 
-        yolo_vec_size = NUM_COCO
-        num_labels = NUM_LABELS
+def load_bert_config():
+    config_path = get_bert_tokenizer_dir() / "config.json"
+    if config_path.exists():
+        logger.info(f"Конфиг BERT загружен из {config_path}")
+        return AutoConfig.from_pretrained(config_path.parent, local_files_only=True)
+    logger.info(f"Используется встроенный конфиг BERT: {BUNDLED_BERT_CONFIG_PATH}")
+    return BertConfig.from_json_file(BUNDLED_BERT_CONFIG_PATH)
 
-        _bert_model = MultiModalBertClassifier(
-            model_name=tokenizer_name,
+
+def load_torch_bert_model(device: torch.device) -> MultiModalBertClassifier:
+    model_path = pathlib.Path(settings.MODEL_CACHE_DIR) / settings.BERT_MODEL_PATH
+    _check_model_file(model_path)
+
+    logger.info(f"Загрузка весов модели BERT с устройства: {device}")
+
+    yolo_vec_size = NUM_COCO
+    num_labels = NUM_LABELS
+
+    # Базовые веса ruBERT не скачиваются и не инициализируются: их перезапишет чекпойнт
+    with no_init_weights():
+        model = MultiModalBertClassifier(
             num_numeric_features=yolo_vec_size,
             num_labels=num_labels,
             dropout=0.3,
             hidden_dim=256,
+            bert_config=load_bert_config(),
         )
-        logger.info("Модель BERT инициализирована.")
+    logger.info("Модель BERT инициализирована.")
 
+    if model_path.suffix == SAFETENSORS_SUFFIX:
+        # Веса отображаются в память (mmap) и присваиваются модели без копирования,
+        # поэтому дочерние процессы воркера делят страницы весов через page cache
+        checkpoint = load_safetensors_file(model_path, device=str(device))
+        model.load_state_dict(checkpoint, assign=True)
+    else:
         checkpoint = torch.load(model_path, map_location=device)
+        model.load_state_dict(checkpoint)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def quantize_bert_model(model: nn.Module) -> nn.Module:
+    # Динамическое INT8-квантование Linear-слоёв энкодера и головы, только для CPU
+    logger.info("Динамическое INT8-квантование Linear-слоёв модели BERT...")
+    quantized_model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    quantized_model.eval()
+    return quantized_model
+
 
-        _bert_model.load_state_dict(checkpoint)
-        _bert_model.to(device)
-        _bert_model.eval()
+def load_onnx_bert_model() -> OnnxBertClassifier:
+    onnx_path = pathlib.Path(settings.MODEL_CACHE_DIR) / settings.BERT_ONNX_PATH
+    _check_model_file(onnx_path)
+    logger.info(f"Загрузка модели BERT для ONNX Runtime из {onnx_path}")
+    return OnnxBertClassifier(onnx_path)
+
+
+def load_bert_model_and_tokenizer():
+    logger.info(f"Загрузка модели BERT и токенизатора, бэкенд: {settings.BERT_BACKEND}")
+    try:
+        tokenizer = load_bert_tokenizer()
+        logger.info("Токенизатор успешно инициализирован.")
+
+        if settings.BERT_BACKEND == BACKEND_ONNX:
+            model = load_onnx_bert_model()
+        else:
+            model = load_torch_bert_model(torch.device(settings.DEVICE))
+            if settings.BERT_QUANTIZE:
+                if settings.DEVICE == "cpu":
+                    model = quantize_bert_model(model)
+                else:
+                    logger.warning(f"INT8-квантование доступно только на CPU, устройство: {settings.DEVICE}")
         logger.info("Модель BERT и токенизатор успешно загружены и находятся в режиме eval.")
     except Exception:
         logger.exception("Ошибка при инициализации или загрузке весов модели BERT.")
         raise
+    return model, tokenizer
+
+
+def _load_into_registry():
+    global _bert_model, _bert_tokenizer, _bert_load_duration  # noqa: PLW0603
+    started = time.perf_counter()
+    model, tokenizer = load_bert_model_and_tokenizer()
+    _bert_load_duration = time.perf_counter() - started
+    _bert_model, _bert_tokenizer = model, tokenizer
+    logger.info(f"Модель BERT загружена в реестр за {_bert_load_duration:.2f} сек.")
+
+
+def get_bert_model_and_tokenizer():
+    if _bert_model is None or _bert_tokenizer is None:
+        with _bert_lock:
+            if _bert_model is None or _bert_tokenizer is None:
+                _load_into_registry()
     return _bert_model, _bert_tokenizer
 
 
-def classify_creative(ocr_text: str, detected_objects: list) -> tuple[str, Any] | tuple[None, float]:
-    logger.info("Классификация креатива...")
-    try:
-        logger.info("Начало классификации креатива.")
-        model, tokenizer = get_bert_model_and_tokenizer()
+def reload_bert_model_and_tokenizer():
+    logger.info("Перезагрузка модели BERT и токенизатора...")
+    with _bert_lock:
+        _load_into_registry()
+    classification_cache.clear()
+    return _bert_model, _bert_tokenizer
 
-        logger.debug("Шаг 1: Предобработка текста OCR.")
-        cleaned_ocr_text = clean_text_for_bert(ocr_text)
-        logger.debug(f"Очищенный текст OCR: {cleaned_ocr_text}")
 
-        logger.debug("Шаг 2: Извлечение классов и уверенности из YOLO.")
-        yolo_classes = [obj['class'] for obj in detected_objects]
-        yolo_confs = [obj['confidence'] for obj in detected_objects]
-        logger.debug(f"Классы YOLO: {yolo_classes}")
-        logger.debug(f"Уверенности YOLO: {yolo_confs}")
+def unload_bert_model_and_tokenizer():
+    global _bert_model, _bert_tokenizer, _bert_load_duration
+    with _bert_lock:
+        _bert_model, _bert_tokenizer, _bert_load_duration = None, None, None
+    logger.info("Модель BERT выгружена из реестра.")
 
-        logger.debug("Шаг 3: Преобразование YOLO в вектор.")
-        yolo_vector = yolo_to_vector_for_bert(yolo_classes, yolo_confs)
-        logger.debug(f"Вектор YOLO (первые 10 элементов): {yolo_vector[:10]}")
 
-        logger.debug("Шаг 4: Токенизация текста.")
+def get_bert_load_duration() -> float | None:
+    return _bert_load_duration
 
+
+def warmup_bert_model() -> float:
+    get_bert_model_and_tokenizer()
+    started = time.perf_counter()
+    classify_creative(WARMUP_TEXT, [], use_cache=False)
+    duration = time.perf_counter() - started
+    logger.info(f"Прогрев модели BERT выполнен за {duration:.2f} сек.")
+    return duration
+
+
+def _prepare_inputs(ocr_text: str, detected_objects: list) -> tuple[str, np.ndarray]:
+    logger.debug("Шаг 1: Предобработка текста OCR.")
+    cleaned_ocr_text = clean_text_for_bert(ocr_text)
+    logger.debug(f"Очищенный текст OCR: {cleaned_ocr_text}")
+
+    logger.debug("Шаг 2: Извлечение классов и уверенности из YOLO.")
+    yolo_classes = [obj['class'] for obj in detected_objects]
+    yolo_confs = [obj['confidence'] for obj in detected_objects]
+    logger.debug(f"Классы YOLO: {yolo_classes}")
+    logger.debug(f"Уверенности YOLO: {yolo_confs}")
+
+    logger.debug("Шаг 3: Преобразование YOLO в вектор.")
+    yolo_vector = yolo_to_vector_for_bert(yolo_classes, yolo_confs)
+    logger.debug(f"Вектор YOLO (первые 10 элементов): {yolo_vector[:10]}")
+    return cleaned_ocr_text, yolo_vector
+
+
+def _predict(model, tokenizer, texts: list[str], yolo_vectors: list[np.ndarray]) -> list[tuple[str, float]]:
+    logger.debug(f"Шаг 4: Токенизация {len(texts)} текстов с динамическим паддингом.")
+    # Паддинг до самой длинной последовательности в батче, а не до MAX_SEQ_LENGTH
+    with _tokenizer_lock:
         encoding = tokenizer(
-            cleaned_ocr_text,
+            texts,
             return_tensors='pt',
-            padding='max_length',
+            padding='longest',
             truncation=True,
-            max_length=160,
+            max_length=MAX_SEQ_LENGTH,
+            pad_to_multiple_of=settings.BERT_PAD_TO_MULTIPLE_OF or None,
         )
-        input_ids = encoding['input_ids']
-        attention_mask = encoding['attention_mask']
+    device = torch.device(settings.DEVICE)
+    input_ids = encoding['input_ids'].to(device)
+    attention_mask = encoding['attention_mask'].to(device)
+    yolo_vec = torch.tensor(np.stack(yolo_vectors), dtype=torch.float32).to(device)
 
-        yolo_vec = torch.tensor(yolo_vector, dtype=torch.float32).unsqueeze(0)
+    logger.debug(f"Шаг 5: Выполнение предсказания моделью. Размер входа: {tuple(input_ids.shape)}")
+    with _bert_semaphore, torch.no_grad():
+        outputs = model.forward(
+            input_ids=input_ids, attention_mask=attention_mask, yolo_vec=yolo_vec,
+        )
+        probabilities = torch.softmax(outputs['logits'], dim=1)
+        confidences, predicted_class_ids = torch.max(probabilities, dim=1)
 
-        device = torch.device(settings.DEVICE)
-        input_ids = input_ids.to(device)
-        attention_mask = attention_mask.to(device)
-        yolo_vec = yolo_vec.to(device)
+    return [
+        (ID_TO_TOPIC.get(class_id, "unknown"), confidence)
+        for class_id, confidence in zip(predicted_class_ids.tolist(), confidences.tolist(), strict=True)
+    ]
 
-        logger.debug("Шаг 5: Выполнение предсказания моделью.")
-        with torch.no_grad():
-            outputs = model.forward(
-                input_ids=input_ids, attention_mask=attention_mask, yolo_vec=yolo_vec,
-            )
-            logits = outputs['logits']
-            probabilities = torch.softmax(logits, dim=1)
-            predicted_class_id = torch.argmax(probabilities, dim=1).item()
-            confidence = probabilities[0][predicted_class_id].item()
 
-        id_to_topic = {0: 'ties', 1: 'cups', 2: 'cutlery', 3: 'bags', 4: 'clocks'}
-        main_topic_name = id_to_topic.get(predicted_class_id, "unknown")
+def predict_topic(model, tokenizer, ocr_text: str, detected_objects: list) -> tuple[str, float]:
+    """Предсказывает тему заданной моделью, без реестра и кэша (для сравнения fp32 и INT8)."""
+    cleaned_ocr_text, yolo_vector = _prepare_inputs(ocr_text, detected_objects)
+    return _predict(model, tokenizer, [cleaned_ocr_text], [yolo_vector])[0]
+
+
+def get_bert_model_version() -> str:
+    """Версия модели для ключа кэша: бэкенд, файл весов, квантование и BERT_MODEL_VERSION."""
+    model_path = settings.BERT_ONNX_PATH if settings.BERT_BACKEND == BACKEND_ONNX else settings.BERT_MODEL_PATH
+    quantized = settings.BERT_QUANTIZE and settings.BERT_BACKEND != BACKEND_ONNX and settings.DEVICE == "cpu"
+    return f"{settings.BERT_BACKEND}:{model_path}:int8={quantized}:{settings.BERT_MODEL_VERSION}"
+
+
+def classify_creative(
+        ocr_text: str,
+        detected_objects: list,
+        use_cache: bool = True,
+) -> tuple[str, Any] | tuple[None, float]:
+    logger.info("Классификация креатива...")
+    try:
+        logger.info("Начало классификации креатива.")
+        cleaned_ocr_text, yolo_vector = _prepare_inputs(ocr_text, detected_objects)
+
+        cache_key = None
+        if use_cache and classification_cache.is_enabled():
+            cache_key = classification_cache.make_cache_key(cleaned_ocr_text, yolo_vector, get_bert_model_version())
+            cached = classification_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Классификация из кэша. Тема: {cached[0]}, Уверенность: {cached[1]:.4f}")
+                return cached
+
+        model, tokenizer = get_bert_model_and_tokenizer()
+        main_topic_name, confidence = _predict(model, tokenizer, [cleaned_ocr_text], [yolo_vector])[0]
+        if cache_key is not None:
+            classification_cache.put(cache_key, (main_topic_name, confidence))
 
         logger.info(f"Классификация завершена. Предсказанная тема: {main_topic_name}, Уверенность: {confidence:.4f}")
     except Exception as e:
@@ -152,3 +319,60 @@ def classify_creative(ocr_text: str, detected_objects: list) -> tuple[str, Any]
         return None, 0.0
     else:
         return main_topic_name, confidence
+
+
+def classify_creatives(
+        batch: list[tuple[str, list]],
+        batch_size: int | None = None,
+) -> list[tuple[str, Any] | tuple[None, float]]:
+    """Классифицирует пачку пар (ocr_text, detected_objects) батчами."""
+    if not batch:
+        return []
+    batch_size = batch_size or settings.BERT_BATCH_SIZE
+    logger.info(f"Батчевая классификация {len(batch)} креативов, размер батча: {batch_size}")
+    try:
+        prepared = [_prepare_inputs(ocr_text, detected_objects) for ocr_text, detected_objects in batch]
+        results: list[tuple[str, Any] | tuple[None, float]] = [(None, 0.0)] * len(batch)
+
+        cache_keys: list[str | None] = [None] * len(batch)
+        pending = list(range(len(batch)))
+        if classification_cache.is_enabled():
+            model_version = get_bert_model_version()
+            pending = []
+            for i, (text, yolo_vector) in enumerate(prepared):
+                cache_keys[i] = classification_cache.make_cache_key(text, yolo_vector, model_version)
+                cached = classification_cache.get(cache_keys[i])
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    pending.append(i)
+            # Счётчики попаданий всей пачки уходят в Redis одним запросом
+            classification_cache.flush_stats()
+            logger.info(f"Из кэша: {len(batch) - len(pending)}, к модели: {len(pending)}")
+        if not pending:
+            return results
+
+        model, tokenizer = get_bert_model_and_tokenizer()
+        # Сортируем по длине текста, чтобы в один батч попадали близкие по длине
+        # последовательности и паддинг был минимальным
+        order = sorted(pending, key=lambda i: len(prepared[i][0].split()))
+
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            predictions = _predict(
+                model,
+                tokenizer,
+                [prepared[i][0] for i in chunk],
+                [prepared[i][1] for i in chunk],
+            )
+            for i, prediction in zip(chunk, predictions, strict=True):
+                results[i] = prediction
+                if cache_keys[i] is not None:
+                    classification_cache.put(cache_keys[i], prediction)
+
+        logger.info(f"Батчевая классификация завершена: {len(results)} креативов.")
+    except Exception as e:
+        logger.error(f"Ошибка при батчевой классификации креативов: {e}", exc_info=True)
+        return [(None, 0.0)] * len(batch)
+    else:
+        return results
@@ -0,0 +1,81 @@
+import logging
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from config import settings
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+METHOD_OCR = "ocr"
+METHOD_DETECTION = "detection"
+METHOD_CLASSIFICATION = "classification"
+
+# Своё соединение на поток: запросы этапов одного процесса не перемешиваются
+_local = threading.local()
+
+
+class InferenceServerError(Exception):
+    pass
+
+
+def get_authkey() -> bytes:
+    # Сообщения соединения распаковываются pickle: без ключа сокет исполнил бы чужой код
+    if not settings.INFERENCE_AUTHKEY:
+        msg = "Не задан INFERENCE_AUTHKEY"
+        raise InferenceServerError(msg)
+    return settings.INFERENCE_AUTHKEY.encode()
+
+
+def _get_connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = Client(settings.INFERENCE_SOCKET_PATH, family="AF_UNIX", authkey=get_authkey())
+        _local.connection = connection
+    return connection
+
+
+def _drop_connection():
+    connection = getattr(_local, "connection", None)
+    _local.connection = None
+    if connection is not None:
+        connection.close()
+
+
+def _call(method: str, payload):
+    try:
+        connection = _get_connection()
+        connection.send((method, payload))
+        if not connection.poll(settings.INFERENCE_TIMEOUT):
+            _drop_connection()
+            msg = f"Сервер инференса не ответил за {settings.INFERENCE_TIMEOUT} сек. ({method})"
+            raise InferenceServerError(msg)
+        status, result = connection.recv()
+    except (OSError, EOFError, AuthenticationError) as e:
+        _drop_connection()
+        msg = f"Сервер инференса недоступен ({settings.INFERENCE_SOCKET_PATH}): {e}"
+        raise InferenceServerError(msg) from e
+
+    if status != "ok":
+        msg = f"Ошибка сервера инференса ({method}): {result}"
+        raise InferenceServerError(msg)
+    return result
+
+
+def extract_text_and_blocks(image: DecodedImage) -> tuple[str, list]:
+    return _call(METHOD_OCR, image.rgb)
+
+
+def detect_objects(image: DecodedImage, conf_threshold: float) -> list[dict]:
+    return _call(METHOD_DETECTION, (image.rgb, conf_threshold))
+
+
+def classify_creative(ocr_text: str, detected_objects: list) -> tuple[str, float] | tuple[None, float]:
+    try:
+        return _call(METHOD_CLASSIFICATION, (ocr_text, detected_objects))
+    except InferenceServerError:
+        # Как и classifier.classify_creative: ошибка классификации не роняет задачу
+        logger.exception("Ошибка при классификации креатива через сервер инференса")
+        return None, 0.0
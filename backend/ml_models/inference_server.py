@@ -0,0 +1,175 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Connection
+from multiprocessing.connection import Listener
+
+import numpy as np
+from config import settings
+from ml_models import classifier
+from ml_models import ocr_model
+from ml_models import yolo_detector
+from ml_models.inference_client import METHOD_CLASSIFICATION
+from ml_models.inference_client import METHOD_DETECTION
+from ml_models.inference_client import METHOD_OCR
+from ml_models.inference_client import get_authkey
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+# Сокет доступен только владельцу: воркеры запускаются от того же пользователя
+SOCKET_UMASK = 0o177
+
+
+class InferenceRequest:
+    def __init__(self, payload):
+        self.payload = payload
+        self.result = None
+        self.error: str | None = None
+        self._done = threading.Event()
+
+    def set_result(self, result):
+        self.result = result
+        self._done.set()
+
+    def set_error(self, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+
+
+class DynamicBatcher:
+    """
+    Собирает запросы одного метода от всех воркеров в пачки.
+
+    Пачка уходит в модель, когда набралось max_batch_size запросов или прошло
+    max_wait_ms с момента первого запроса: одиночный запрос ждёт не дольше
+    max_wait_ms, а при нагрузке модель получает полные батчи.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[list], list], max_batch_size: int, max_wait_ms: int):
+        self.name = name
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue[InferenceRequest] = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload) -> InferenceRequest:
+        request = InferenceRequest(payload)
+        self._queue.put(request)
+        return request
+
+    def _collect(self) -> list[InferenceRequest]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, batch: list[InferenceRequest]):
+        try:
+            results = self._batch_fn([request.payload for request in batch])
+        except Exception as e:
+            logger.exception(f"Ошибка батча {self.name} из {len(batch)} запросов")
+            if len(batch) == 1:
+                batch[0].set_error(e)
+                return
+            # Один испорченный запрос не должен ронять соседей по пачке
+            for request in batch:
+                self._run([request])
+            return
+        for request, result in zip(batch, results, strict=True):
+            request.set_result(result)
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            logger.debug(f"Батч {self.name}: {len(batch)} запросов")
+            self._run(batch)
+
+
+def _ocr_batch(images: list[np.ndarray]) -> list[tuple[str, list]]:
+    return ocr_model.extract_text_and_blocks_batch([DecodedImage(rgb) for rgb in images])
+
+
+def _detection_batch(payloads: list[tuple[np.ndarray, float]]) -> list[list[dict]]:
+    # Порог уверенности у запросов обычно общий; разные пороги уходят в модель раздельно
+    results: list[list[dict] | None] = [None] * len(payloads)
+    for conf_threshold in {conf for _, conf in payloads}:
+        indices = [i for i, (_, conf) in enumerate(payloads) if conf == conf_threshold]
+        images = [DecodedImage(payloads[i][0]) for i in indices]
+        for i, detections in zip(indices, yolo_detector.detect_objects_batch(images, conf_threshold), strict=True):
+            results[i] = detections
+    return results
+
+
+def create_batchers() -> dict[str, DynamicBatcher]:
+    max_batch_size = settings.INFERENCE_MAX_BATCH_SIZE
+    max_wait_ms = settings.INFERENCE_MAX_WAIT_MS
+    return {
+        METHOD_OCR: DynamicBatcher(METHOD_OCR, _ocr_batch, max_batch_size, max_wait_ms),
+        METHOD_DETECTION: DynamicBatcher(METHOD_DETECTION, _detection_batch, max_batch_size, max_wait_ms),
+        METHOD_CLASSIFICATION: DynamicBatcher(
+            METHOD_CLASSIFICATION, classifier.classify_creatives, max_batch_size, max_wait_ms,
+        ),
+    }
+
+
+def serve_connection(connection: Connection, batchers: dict[str, DynamicBatcher]):
+    """Обслуживает соединение одного потока воркера: запрос, ответ, следующий запрос."""
+    with connection:
+        while True:
+            try:
+                method, payload = connection.recv()
+            except (EOFError, OSError):
+                return
+
+            batcher = batchers.get(method)
+            if batcher is None:
+                connection.send(("error", f"Неизвестный метод {method}"))
+                continue
+
+            request = batcher.submit(payload)
+            request.wait()
+            if request.error is not None:
+                connection.send(("error", request.error))
+            else:
+                connection.send(("ok", request.result))
+
+
+def create_listener(socket_path: str) -> Listener:
+    """Создаёт Listener с проверкой INFERENCE_AUTHKEY и правами 0600 на файл сокета."""
+    authkey = get_authkey()
+    previous_umask = os.umask(SOCKET_UMASK)
+    try:
+        return Listener(socket_path, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(previous_umask)
+
+
+def serve(listener: Listener, batchers: dict[str, DynamicBatcher]):
+    while True:
+        try:
+            connection = listener.accept()
+        except AuthenticationError:
+            logger.warning("Отклонено подключение к серверу инференса: неверный INFERENCE_AUTHKEY")
+            continue
+        except OSError:
+            # Listener закрыт: сервер останавливается
+            return
+        threading.Thread(target=serve_connection, args=(connection, batchers), daemon=True).start()
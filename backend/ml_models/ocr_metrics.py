@@ -0,0 +1,51 @@
+import redis
+from config import settings
+from utils.redis_counters import BufferedCounters
+
+
+OCR_STATS_KEY = "ocr_stats"
+STAT_FIELDS = ("images", "skipped")
+
+_redis_client = None
+
+
+def _get_redis_client():
+    global _redis_client  # noqa: PLW0603
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1,
+        )
+    return _redis_client
+
+
+# Счётчики уходят в Redis пачками, а не HINCRBY на каждое изображение
+_counters = BufferedCounters(OCR_STATS_KEY, STAT_FIELDS, _get_redis_client)
+
+
+def record_image(skipped: bool):
+    """Учитывает изображение после детекции текста; skipped - распознавание не понадобилось."""
+    _counters.increment(*(STAT_FIELDS if skipped else ("images",)))
+
+
+def flush_stats():
+    """Отправляет накопленные счётчики OCR в Redis."""
+    _counters.flush()
+
+
+def clear():
+    """Сбрасывает счётчики процесса. Общие счётчики в Redis не трогаются."""
+    _counters.clear()
+
+
+def _with_skip_rate(stats: dict) -> dict:
+    return {**stats, "skip_rate": stats["skipped"] / stats["images"] if stats["images"] else 0.0}
+
+
+def get_ocr_stats() -> dict:
+    """Счётчики текущего процесса."""
+    return _with_skip_rate(_counters.totals())
+
+
+def get_shared_ocr_stats() -> dict:
+    """Счётчики всех воркеров, накопленные в Redis."""
+    return _with_skip_rate(_counters.read_shared())
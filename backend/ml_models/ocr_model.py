@@ -1,13 +1,20 @@
 import logging
+import threading
 from pathlib import Path
 
 import easyocr
+import numpy as np
 from config import settings
+from ml_models import ocr_metrics
+from utils.image_utils import DecodedImage
 
 
 logger = logging.getLogger(__name__)
 
 _ocr_reader = None
+_ocr_lock = threading.Lock()
+# Reader не рассчитан на вызовы из нескольких потоков; один экземпляр на процесс
+_ocr_semaphore = threading.BoundedSemaphore(settings.OCR_MAX_CONCURRENCY)
 
 
 class EasyOCRModelDirNotFoundError(FileNotFoundError):
@@ -22,7 +29,11 @@ def _raise_model_dir_not_found(model_dir: str) -> None:
 
 def get_ocr_reader():
     global _ocr_reader  # noqa: PLW0603
-    if _ocr_reader is None:
+    if _ocr_reader is not None:
+        return _ocr_reader
+    with _ocr_lock:
+        if _ocr_reader is not None:
+            return _ocr_reader
         try:
             weights_dir = Path(settings.MODEL_CACHE_DIR) / settings.EASYOCR_WEIGHTS_DIR
             model_dir = weights_dir / "model"
@@ -50,34 +61,182 @@ def get_ocr_reader():
     return _ocr_reader
 
 
-def extract_text_and_blocks(image_path: str, creative) -> tuple[str, list]:
+def get_detection_scale(width: int, height: int) -> float:
+    """Масштаб изображения для детектора текста: длинная сторона не больше OCR_TARGET_SIDE."""
+    if settings.OCR_TARGET_SIDE <= 0:
+        return 1.0
+    return min(1.0, settings.OCR_TARGET_SIDE / max(width, height))
+
+
+def _detection_input(image: DecodedImage, scale: float) -> np.ndarray:
+    if scale >= 1:
+        return image.rgb
+    return image.resized((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+
+
+def _to_original_coords(image: DecodedImage, detected: np.ndarray, horizontal_list: list, free_list: list):
+    """Переводит боксы детектора из уменьшенного изображения в пиксели исходного."""
+    scale_x = image.width / detected.shape[1]
+    scale_y = image.height / detected.shape[0]
+    if scale_x == 1 and scale_y == 1:
+        return horizontal_list, free_list
+    # Распознаватель режет кропы срезами массива, поэтому координаты должны быть целыми
+    horizontal_list = [
+        [round(x_min * scale_x), round(x_max * scale_x), round(y_min * scale_y), round(y_max * scale_y)]
+        for x_min, x_max, y_min, y_max in horizontal_list
+    ]
+    free_list = [[[round(x * scale_x), round(y * scale_y)] for x, y in box] for box in free_list]
+    return horizontal_list, free_list
+
+
+def _detect_params() -> dict:
+    return {
+        "text_threshold": settings.OCR_TEXT_THRESHOLD,
+        "min_size": settings.OCR_MIN_REGION_SIZE,
+        "reformat": False,
+    }
+
+
+def _detect(reader, image: DecodedImage, scale: float) -> tuple[list, list]:
+    detected = _detection_input(image, scale)
+    horizontal_list, free_list = reader.detect(detected, **_detect_params())
+    return _to_original_coords(image, detected, horizontal_list[0], free_list[0])
+
+
+def _refine_detection(reader, image: DecodedImage, scale: float, horizontal_list: list, free_list: list):
+    """
+    Повторяет детекцию крупнее, если на уменьшенном изображении нашлись слишком низкие строки.
+
+    Высота текста оценивается по самому низкому найденному блоку: если на входе
+    детектора она меньше OCR_MIN_TEXT_HEIGHT, мелкие надписи рядом могли потеряться.
+    """
+    if scale >= 1:
+        return horizontal_list, free_list
+    heights = [y_max - y_min for _, _, y_min, y_max in horizontal_list]
+    if not heights or min(heights) * scale >= settings.OCR_MIN_TEXT_HEIGHT:
+        return horizontal_list, free_list
+    refined_scale = min(1.0, settings.OCR_MIN_TEXT_HEIGHT / max(1, min(heights)))
+    logger.debug(f"Мелкий текст на {image}: повторная детекция в масштабе {refined_scale:.2f}")
+    return _detect(reader, image, refined_scale)
+
+
+def _is_text_free(horizontal_list: list, free_list: list) -> bool:
+    return not horizontal_list and not free_list
+
+
+def _recognize(reader, image: DecodedImage, horizontal_list: list, free_list: list) -> list:
+    # Вторая фаза OCR: распознаются только найденные регионы. Баннеры без текста
+    # (только товар) на этом заканчиваются: распознаватель не запускается вовсе
+    if _is_text_free(horizontal_list, free_list):
+        return []
+    return reader.recognize(image.grey, horizontal_list, free_list, reformat=False)
+
+
+def _readtext(reader, image: DecodedImage) -> list:
+    # То же, что reader.readtext(path), но на уже декодированном изображении:
+    # детектор получает RGB (уменьшенный до OCR_TARGET_SIDE), распознаватель -
+    # оттенки серого в исходном разрешении, поэтому кропы строк не теряют чёткость
+    with _ocr_semaphore:
+        scale = get_detection_scale(image.width, image.height)
+        horizontal_list, free_list = _detect(reader, image, scale)
+        horizontal_list, free_list = _refine_detection(reader, image, scale, horizontal_list, free_list)
+        results = _recognize(reader, image, horizontal_list, free_list)
+    # Счётчики пишутся уже после освобождения семафора, чтобы не задерживать OCR
+    ocr_metrics.record_image(skipped=_is_text_free(horizontal_list, free_list))
+    return results
+
+
+def _readtext_batched(reader, images: list[DecodedImage]) -> list[list]:
+    # То же, что reader.readtext_batched: детектор CRAFT обрабатывает пачку изображений
+    # одного размера за один прогон, распознаватель - каждое изображение в оттенках серого
+    with _ocr_semaphore:
+        scale = get_detection_scale(images[0].width, images[0].height)
+        batch = np.stack([_detection_input(image, scale) for image in images])
+        horizontal_lists, free_lists = reader.detect(batch, **_detect_params())
+        results = []
+        skipped = []
+        for image, detected, horizontal_list, free_list in zip(
+                images, batch, horizontal_lists, free_lists, strict=True,
+        ):
+            boxes = _to_original_coords(image, detected, horizontal_list, free_list)
+            boxes = _refine_detection(reader, image, scale, *boxes)
+            skipped.append(_is_text_free(*boxes))
+            results.append(_recognize(reader, image, *boxes))
+    for image_skipped in skipped:
+        ocr_metrics.record_image(skipped=image_skipped)
+    return results
+
+
+def _group_by_shape(images: list[DecodedImage]) -> dict[tuple, list[int]]:
+    groups = {}
+    for index, image in enumerate(images):
+        groups.setdefault(image.rgb.shape, []).append(index)
+    return groups
+
+
+def _blocks_from_results(results: list, img_width: int, img_height: int) -> tuple[str, list]:
+    full_text_parts = []
+    ocr_blocks = []
+
+    for (bbox, text, conf) in results:
+        full_text_parts.append(text)
+
+        x1_norm = bbox[0][0] / img_width
+        y1_norm = bbox[0][1] / img_height
+        x3_norm = bbox[2][0] / img_width
+        y3_norm = bbox[2][1] / img_height
+
+        normalized_bbox = [x1_norm, y1_norm, x3_norm, y3_norm]
+
+        ocr_blocks.append({
+            "text": text,
+            "bbox": normalized_bbox,
+            "confidence": conf,
+        })
+
+    return " ".join(full_text_parts), ocr_blocks
+
+
+def extract_text_and_blocks(image: DecodedImage | str, creative=None) -> tuple[str, list]:
     reader = get_ocr_reader()
     try:
-        results = reader.readtext(image_path)
-
-        full_text_parts = []
-        ocr_blocks = []
-        img_width, img_height = creative.image_width, creative.image_height
-
-        for (bbox, text, conf) in results:
-            full_text_parts.append(text)
-
-            x1_norm = bbox[0][0] / img_width
-            y1_norm = bbox[0][1] / img_height
-            x3_norm = bbox[2][0] / img_width
-            y3_norm = bbox[2][1] / img_height
-
-            normalized_bbox = [x1_norm, y1_norm, x3_norm, y3_norm]
-
-            ocr_blocks.append({
-                "text": text,
-                "bbox": normalized_bbox,
-                "confidence": conf,
-            })
-
-        full_text = " ".join(full_text_parts)
+        if isinstance(image, DecodedImage):
+            results = _readtext(reader, image)
+            img_width, img_height = image.size
+        else:
+            with _ocr_semaphore:
+                results = reader.readtext(image)
+            img_width, img_height = creative.image_width, creative.image_height
+
+        full_text, ocr_blocks = _blocks_from_results(results, img_width, img_height)
     except Exception:
-        logger.exception(f"Ошибка при выполнении OCR для {image_path}.")
+        logger.exception(f"Ошибка при выполнении OCR для {image}.")
         raise
     else:
         return full_text, ocr_blocks
+
+
+def extract_text_and_blocks_batch(images: list[DecodedImage]) -> list[tuple[str, list]]:
+    """
+    OCR для списка изображений с батчевой детекцией текста.
+
+    Детектор принимает пачку только одинаковых по размеру изображений, поэтому
+    креативы группируются по размеру и идут пачками до OCR_BATCH_SIZE.
+    Результаты возвращаются в порядке images.
+    """
+    reader = get_ocr_reader()
+    results: list[tuple[str, list] | None] = [None] * len(images)
+    for indices in _group_by_shape(images).values():
+        for start in range(0, len(indices), settings.OCR_BATCH_SIZE):
+            chunk = indices[start:start + settings.OCR_BATCH_SIZE]
+            chunk_images = [images[index] for index in chunk]
+            try:
+                chunk_results = _readtext_batched(reader, chunk_images)
+            except Exception:
+                logger.exception(f"Ошибка при выполнении OCR для пачки {chunk_images}.")
+                raise
+            for index, image_results in zip(chunk, chunk_results, strict=True):
+                image = images[index]
+                results[index] = _blocks_from_results(image_results, image.width, image.height)
+    ocr_metrics.flush_stats()
+    return results
@@ -1,18 +1,32 @@
+import json
 import logging
+import threading
 from pathlib import Path
 
 import numpy as np
+from config import COCO_CLASSES
 from config import CONF_THRESHOLD
 from config import settings
+from ml_models.yolo_onnx import get_yolo_onnx_file
+from ml_models.yolo_onnx import load_yolo_onnx
 from PIL import Image
+from safetensors import safe_open
+from safetensors.torch import load_file as load_safetensors_file
 from ultralytics import YOLO
+from utils.image_utils import DecodedImage
 
 
 logger = logging.getLogger(__name__)
 
 _yolo_model = None
+_yolo_lock = threading.Lock()
+# Предиктор ultralytics хранит состояние между вызовами predict и не потокобезопасен
+_yolo_semaphore = threading.BoundedSemaphore(settings.YOLO_MAX_CONCURRENCY)
 
 NUM_COLOR_CHANNELS = 4
+SAFETENSORS_SUFFIX = ".safetensors"
+MAX_DETECTIONS = 3
+BACKEND_ONNX = "onnx"
 
 
 class YOLOModelNotFoundError(FileNotFoundError):
@@ -21,17 +35,52 @@ class YOLOModelNotFoundError(FileNotFoundError):
         super().__init__(message)
 
 
+def load_yolo_from_safetensors(model_path: Path) -> YOLO:
+    # Архитектура строится по yaml из метаданных, веса читаются через mmap
+    with safe_open(model_path, framework="pt") as f:
+        metadata = f.metadata() or {}
+    yaml_file = metadata.get("yaml_file", settings.YOLO_MODEL_CONFIG)
+    logger.info(f"Загрузка YOLO из safetensors {model_path}, архитектура {yaml_file}")
+
+    model = YOLO(yaml_file, task="detect")
+    state_dict = load_safetensors_file(model_path)
+    model.model.load_state_dict(state_dict, assign=True)
+    if "names" in metadata:
+        model.model.names = {int(k): v for k, v in json.loads(metadata["names"]).items()}
+    else:
+        model.model.names = dict(enumerate(COCO_CLASSES))
+    model.model.float().eval()
+    return model
+
+
+def load_yolo_torch_model(model_path: Path) -> YOLO:
+    """PyTorch-модель YOLO из .pt или .safetensors."""
+    if model_path.suffix == SAFETENSORS_SUFFIX:
+        return load_yolo_from_safetensors(model_path)
+    return YOLO(model_path)
+
+
 def get_yolo_model():
     global _yolo_model  # noqa: PLW0603
-    if _yolo_model is None:
-        model_path = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH
+    if _yolo_model is not None:
+        return _yolo_model
+    with _yolo_lock:
+        if _yolo_model is not None:
+            return _yolo_model
+        use_onnx = settings.YOLO_BACKEND == BACKEND_ONNX
+        model_file = get_yolo_onnx_file() if use_onnx else settings.YOLO_MODEL_PATH
+        model_path = Path(settings.MODEL_CACHE_DIR) / model_file
         if not model_path.exists():
             logger.error(f"Модель YOLO не найдена по пути {model_path}")
             raise YOLOModelNotFoundError(model_path)
         try:
             device = settings.DEVICE
-            logger.info(f"Загрузка модели YOLO на устройство: {device}")
-            _yolo_model = YOLO(model_path).to(device)
+            logger.info(f"Загрузка модели YOLO на устройство: {device}, бэкенд: {settings.YOLO_BACKEND}")
+            if use_onnx:
+                # Устройство ONNX Runtime выбирается в predict(device=...), .to() здесь неприменим
+                _yolo_model = load_yolo_onnx(model_path)
+            else:
+                _yolo_model = load_yolo_torch_model(model_path).to(device)
             logger.info("Модель YOLO успешно инициализирована.")
         except Exception:
             logger.exception("Ошибка при инициализации модели YOLO")
@@ -39,57 +88,70 @@ def get_yolo_model():
     return _yolo_model
 
 
-def detect_objects(image_path: str, conf_threshold: float = CONF_THRESHOLD) -> list[dict]:
+def _load_image_array(image_path: str) -> np.ndarray:
+    with Image.open(image_path) as image_pil:
+        logger.debug("[YOLO] Изображение открыто успешно")
+        image_array = np.array(image_pil)
+        logger.debug(f"[YOLO] Массив NumPy создан. Форма: {image_array.shape}")
+
+        if image_array.shape[-1] == NUM_COLOR_CHANNELS:
+            logger.debug("[YOLO] Удаление альфа-канала")
+            image_array = image_array[:, :, :3]
+    return image_array
+
+
+def _parse_detections(result, names: dict) -> list[dict]:
+    if result is None or getattr(result, "boxes", None) is None or len(result.boxes) == 0:
+        logger.info("[YOLO] Объекты не обнаружены или results пустой")
+        return []
+
+    # Одна выгрузка тензоров на изображение вместо .item()/.tolist() на каждый бокс;
+    # xyxyn уже нормирован по исходному размеру изображения
+    boxes = result.boxes
+    confidences = boxes.conf.cpu().numpy()
+    top = np.argsort(-confidences, kind="stable")[:MAX_DETECTIONS]
+    class_ids = boxes.cls.cpu().numpy()[top].astype(int).tolist()
+    bboxes = boxes.xyxyn.cpu().numpy()[top].tolist()
+    return [
+        {"class": names[class_id], "confidence": confidence, "bbox": bbox}
+        for class_id, confidence, bbox in zip(class_ids, confidences[top].tolist(), bboxes, strict=True)
+    ]
+
+
+def detect_objects(image: DecodedImage | str, conf_threshold: float = CONF_THRESHOLD) -> list[dict]:
     model = get_yolo_model()
     try:
-        with Image.open(image_path) as image_pil:
-            logger.debug("[YOLO] Изображение открыто успешно")
-            img_width, img_height = image_pil.size
-            image_array = np.array(image_pil)
-            logger.debug(f"[YOLO] Массив NumPy создан. Форма: {image_array.shape}")
-
-            if image_array.shape[-1] == NUM_COLOR_CHANNELS:
-                logger.debug("[YOLO] Удаление альфа-канала")
-                image_array = image_array[:, :, :3]
+        image_array = image.rgb if isinstance(image, DecodedImage) else _load_image_array(image)
 
         device = settings.DEVICE
         logger.debug(f"[YOLO] Параметры predict, conf={conf_threshold}")
 
-        results = model.predict(source=image_array, conf=conf_threshold, device=device)
-
-        detections = []
-        if results and hasattr(results[0], 'boxes') and results[0].boxes is not None:
-            boxes = results[0].boxes
-            box_index = 0
-            for box in boxes:
-                try:
-                    class_id = int(box.cls)
-                    class_name = model.names[class_id]
-                    confidence = float(box.conf.item())
-                    bbox_xyxy = box.xyxy.squeeze().tolist()
-
-                    x1_norm = bbox_xyxy[0] / img_width
-                    y1_norm = bbox_xyxy[1] / img_height
-                    x2_norm = bbox_xyxy[2] / img_width
-                    y2_norm = bbox_xyxy[3] / img_height
-
-                    detections.append({
-                        "class": class_name,
-                        "confidence": confidence,
-                        "bbox": [x1_norm, y1_norm, x2_norm, y2_norm],
-                    })
-                    box_index += 1
-                except Exception as box_e:
-                    logger.error(f"[YOLO] Ошибка при обработке бокса #{box_index}: {box_e}", exc_info=True)
-                    box_index += 1
-
-            detections.sort(key=lambda x: x['confidence'], reverse=True)
-            return detections[:3]
-
+        with _yolo_semaphore:
+            results = model.predict(source=image_array, conf=conf_threshold, device=device)
+        detections = _parse_detections(results[0] if results else None, model.names)
     except Exception:
-        logger.exception(f"Ошибка при выполнении детекции YOLO для {image_path}")
+        logger.exception(f"Ошибка при выполнении детекции YOLO для {image}")
         raise
-
     else:
-        logger.info("[YOLO] Объекты не обнаружены или results пустой")
+        return detections
+
+
+def detect_objects_batch(images: list[DecodedImage], conf_threshold: float = CONF_THRESHOLD) -> list[list[dict]]:
+    """Детекция для списка изображений одним вызовом predict."""
+    if not images:
         return []
+    model = get_yolo_model()
+    try:
+        logger.debug(f"[YOLO] Батчевый predict для {len(images)} изображений, conf={conf_threshold}")
+        with _yolo_semaphore:
+            results = model.predict(
+                source=[image.rgb for image in images],
+                conf=conf_threshold,
+                device=settings.DEVICE,
+            )
+        detections = [_parse_detections(result, model.names) for result in results]
+    except Exception:
+        logger.exception(f"Ошибка при батчевой детекции YOLO для {len(images)} изображений")
+        raise
+    else:
+        return detections
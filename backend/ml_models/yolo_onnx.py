@@ -0,0 +1,28 @@
+import logging
+from pathlib import Path
+
+from config import settings
+from ultralytics import YOLO
+
+
+logger = logging.getLogger(__name__)
+
+INT8_ONNX_SUFFIX = ".int8.onnx"
+
+
+def get_int8_onnx_path(onnx_path: str | Path) -> Path:
+    """Путь INT8-версии рядом с fp32: yolov8m.onnx -> yolov8m.int8.onnx."""
+    return Path(onnx_path).with_suffix(INT8_ONNX_SUFFIX)
+
+
+def get_yolo_onnx_file() -> str:
+    """Имя ONNX-модели YOLO в кэше и бакете с учётом YOLO_ONNX_INT8."""
+    if settings.YOLO_ONNX_INT8:
+        return get_int8_onnx_path(settings.YOLO_ONNX_PATH).as_posix()
+    return settings.YOLO_ONNX_PATH
+
+
+def load_yolo_onnx(model_path: str | Path) -> YOLO:
+    # Предиктор ultralytics сам выбирает ONNX Runtime по расширению файла
+    logger.info(f"Загрузка YOLO для ONNX Runtime из {model_path}")
+    return YOLO(str(model_path), task="detect")
@@ -0,0 +1,117 @@
+import logging
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+import onnx
+import torch
+from onnxruntime.quantization import QuantType
+from onnxruntime.quantization import quantize_dynamic
+from ultralytics import YOLO
+from ultralytics.nn.modules import Detect
+
+
+logger = logging.getLogger(__name__)
+
+ONNX_INPUT_NAMES = ["images"]
+ONNX_OUTPUT_NAMES = ["output0"]
+ONNX_OPSET_VERSION = 17
+YOLO_ONNX_IMGSZ = 640
+# Допуск расхождения уверенности и нормированных координат fp32-графа с PyTorch
+DETECTION_ATOL = 1e-3
+
+
+def export_yolo_to_onnx(
+        model: YOLO,
+        output_path: str | Path,
+        imgsz: int = YOLO_ONNX_IMGSZ,
+        opset_version: int = ONNX_OPSET_VERSION,
+) -> Path:
+    """
+    Экспорт детектора ultralytics в ONNX с динамическими батчем и размером входа.
+
+    Повторяет подготовку модели из model.export(format="onnx"), но через
+    TorchScript-экспортёр (dynamo=False), как и экспорт BERT. В метаданные
+    пишутся stride, imgsz и names: по ним YOLO(path.onnx) собирает тот же
+    предиктор ultralytics поверх ONNX Runtime.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Экспорт модели YOLO в ONNX: {output_path}")
+
+    torch_model = deepcopy(model.model).cpu().float().eval()
+    for parameter in torch_model.parameters():
+        parameter.requires_grad = False
+    torch_model = torch_model.fuse()
+    for module in torch_model.modules():
+        if isinstance(module, Detect):
+            # Голова отдаёт один тензор (batch, 4 + классы, якоря) и пересчитывает якоря под размер входа
+            module.export = True
+            module.format = "onnx"
+            module.dynamic = True
+
+    dummy_images = torch.zeros((1, 3, imgsz, imgsz), dtype=torch.float32)
+    with torch.no_grad():
+        torch_model(dummy_images)  # прогрев: фиксирует stride и якоря головы
+        torch.onnx.export(
+            torch_model,
+            dummy_images,
+            str(output_path),
+            input_names=ONNX_INPUT_NAMES,
+            output_names=ONNX_OUTPUT_NAMES,
+            dynamic_axes={
+                "images": {0: "batch", 2: "height", 3: "width"},
+                "output0": {0: "batch", 2: "anchors"},
+            },
+            opset_version=opset_version,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+
+    metadata = {
+        "stride": int(max(torch_model.stride)),
+        "task": "detect",
+        "batch": 1,
+        "imgsz": [imgsz, imgsz],
+        "names": dict(torch_model.names),
+        "channels": 3,
+    }
+    onnx_model = onnx.load(str(output_path))
+    for key, value in metadata.items():
+        entry = onnx_model.metadata_props.add()
+        entry.key, entry.value = key, str(value)
+    onnx.save(onnx_model, str(output_path))
+    logger.info(f"Модель YOLO экспортирована в ONNX: {output_path}")
+    return output_path
+
+
+def quantize_yolo_onnx(onnx_path: str | Path, output_path: str | Path) -> Path:
+    """Динамическое INT8-квантование весов ONNX-модели YOLO для CPU."""
+    output_path = Path(output_path)
+    if output_path.resolve() == Path(onnx_path).resolve():
+        msg = f"INT8-модель нужно сохранять отдельно от fp32: {output_path}"
+        raise ValueError(msg)
+    logger.info(f"INT8-квантование весов YOLO: {onnx_path} -> {output_path}")
+    quantize_dynamic(str(onnx_path), str(output_path), weight_type=QuantType.QUInt8)
+    # Без метаданных ultralytics не узнает имена классов; дописываем только недостающие ключи
+    quantized = onnx.load(str(output_path))
+    existing = {prop.key for prop in quantized.metadata_props}
+    missing = [prop for prop in onnx.load(str(onnx_path)).metadata_props if prop.key not in existing]
+    if missing:
+        for prop in missing:
+            entry = quantized.metadata_props.add()
+            entry.key, entry.value = prop.key, prop.value
+        onnx.save(quantized, str(output_path))
+    return output_path
+
+
+def detections_match(reference: list[dict], candidate: list[dict], atol: float = DETECTION_ATOL) -> bool:
+    """Результаты detect_objects совпадают: те же классы, уверенности и боксы в пределах atol."""
+    if len(reference) != len(candidate):
+        return False
+    return all(
+        ref["class"] == cand["class"]
+        and abs(ref["confidence"] - cand["confidence"]) <= atol
+        and np.allclose(ref["bbox"], cand["bbox"], atol=atol)
+        for ref, cand in zip(reference, candidate, strict=True)
+    )
@@ -45,6 +45,7 @@ class AnalysisBase(BaseModel):
     detected_objects: list[dict] | None = None
     main_topic: str | None = None
     topic_confidence: float | None = None
+    classification_path: str | None = None
 
     class Config:
         from_attributes = True
@@ -75,6 +76,7 @@ class CreativeDetail(CreativeBase):
     detected_objects: list[dict] | None = None
     main_topic: str | None = None
     topic_confidence: float | None = None
+    classification_path: str | None = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,8 @@
 from config import COLOR_CLASSES
 from config import COLOR_VISUAL_CLASSES
+from config import ML_STAGES
+from config import STAGE_STATUS_TIMEOUT
+from config import get_stage_timeouts
 from database_models.creative import Creative
 from database_models.creative import CreativeAnalysis
 from sqlalchemy.orm import Session
@@ -33,6 +36,27 @@ def calculate_group_processing_time(db: Session, group_id: str) -> tuple[float,
     return total_time, len(analyses)
 
 
+def get_timed_out_stages(analysis: CreativeAnalysis) -> list[str]:
+    """Этапы, прерванные по лимиту времени; результат креатива по ним неполный."""
+    return [stage["name"] for stage in ML_STAGES if getattr(analysis, stage["status"]) == STAGE_STATUS_TIMEOUT]
+
+
+def get_timeout_summary(analyses) -> dict:
+    """Сколько раз каждый этап упёрся в лимит времени и сколько креативов получили неполный результат."""
+    timeouts = {stage["name"]: 0 for stage in ML_STAGES}
+    degraded = 0
+    for analysis in analyses:
+        timed_out = get_timed_out_stages(analysis)
+        for stage in timed_out:
+            timeouts[stage] += 1
+        degraded += bool(timed_out)
+    return {
+        "stage_timeouts": timeouts,
+        "stage_timeout_limits": get_stage_timeouts(),
+        "degraded_creatives": degraded,
+    }
+
+
 def get_color_class_distribution(analyses):
     class_distribution = {}
 
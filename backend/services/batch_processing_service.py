@@ -0,0 +1,205 @@
+import logging
+from datetime import datetime
+
+from config import CLASSIFICATION_PATH_BERT
+from config import CLASSIFICATION_PATH_CASCADE
+from config import STAGE_CLASSIFICATION
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import settings
+from database import SessionLocal
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from ml_models import cascade
+from ml_models import classifier
+from ml_models import ocr_model
+from ml_models import yolo_detector
+from services.batch_queue import enqueue_creative
+from services.processing_service import STAGE_COLUMNS
+from services.processing_service import decode_image_buffer
+from services.processing_service import finalize_analysis_if_complete
+from services.processing_service import get_creative_and_analysis
+from services.processing_service import perform_color_analysis
+from services.stage_deadline import StageBusyError
+from sqlalchemy.orm import Session
+from utils.image_utils import DecodedImage
+from utils.minio_utils import download_file_to_buffer
+
+
+logger = logging.getLogger(__name__)
+
+DETECTION_CONF_THRESHOLD = 0.35
+
+
+class BatchItem:
+    def __init__(self, creative: Creative, analysis: CreativeAnalysis, image: DecodedImage):
+        self.creative_id = creative.creative_id
+        self.creative = creative
+        self.analysis = analysis
+        self.image = image
+
+
+def _start_stage(db: Session, items: list[BatchItem], stage: str):
+    columns = STAGE_COLUMNS[stage]
+    started = datetime.utcnow()
+    for item in items:
+        setattr(item.analysis, columns["status"], "PROCESSING")
+        setattr(item.analysis, columns["started"], started)
+    db.commit()
+
+
+def _complete_stage(analysis: CreativeAnalysis, stage: str, status: str, error_message: str | None = None):
+    columns = STAGE_COLUMNS[stage]
+    completed = datetime.utcnow()
+    setattr(analysis, columns["status"], status)
+    setattr(analysis, columns["completed"], completed)
+    setattr(analysis, columns["duration"], (completed - getattr(analysis, columns["started"])).total_seconds())
+    if error_message:
+        analysis.error_message = error_message
+
+
+def _run_batched(items: list[BatchItem], batch_fn, single_fn) -> list[tuple[object, Exception | None]]:
+    """Запускает модель на всей пачке; при ошибке повторяет по одному креативу."""
+    try:
+        return [(result, None) for result in batch_fn([item.image for item in items])]
+    except Exception:
+        logger.exception(f"Ошибка батчевого инференса для {len(items)} креативов, повтор по одному")
+
+    outcomes = []
+    for item in items:
+        try:
+            outcomes.append((single_fn(item.image), None))
+        except Exception as e:
+            logger.exception(f"[{item.creative_id}] Ошибка инференса")
+            outcomes.append((None, e))
+    return outcomes
+
+
+def load_batch_item(db: Session, creative_id: str) -> BatchItem | None:
+    """Скачивает и декодирует креатив; None, если обработка невозможна."""
+    try:
+        creative, analysis = get_creative_and_analysis(db, creative_id)
+    except Exception:
+        logger.exception(f"[{creative_id}] Креатив не найден")
+        return None
+
+    analysis.overall_status = "PROCESSING"
+    db.commit()
+    buffer = download_file_to_buffer(creative, analysis, db)
+    if buffer is None:
+        return None
+    with buffer:
+        image = decode_image_buffer(buffer, creative_id)
+    if image is None:
+        analysis.overall_status = "ERROR"
+        analysis.error_message = "Некорректное изображение"
+        db.commit()
+        return None
+
+    creative.image_width, creative.image_height = image.size
+    db.commit()
+    return BatchItem(creative, analysis, image)
+
+
+def load_batch_items(db: Session, creative_ids: list[str]) -> list[BatchItem]:
+    items = [load_batch_item(db, creative_id) for creative_id in creative_ids]
+    return [item for item in items if item is not None]
+
+
+def run_batch_ocr(db: Session, items: list[BatchItem]):
+    _start_stage(db, items, STAGE_OCR)
+    outcomes = _run_batched(items, ocr_model.extract_text_and_blocks_batch, ocr_model.extract_text_and_blocks)
+    for item, (result, error) in zip(items, outcomes, strict=True):
+        if error is not None:
+            _complete_stage(item.analysis, STAGE_OCR, "ERROR", f"OCR Error: {error!s}")
+            continue
+        item.analysis.ocr_text, item.analysis.ocr_blocks = result
+        _complete_stage(item.analysis, STAGE_OCR, "SUCCESS")
+    db.commit()
+    logger.info(f"OCR пачки из {len(items)} креативов завершен")
+
+
+def run_batch_detection(db: Session, items: list[BatchItem]):
+    _start_stage(db, items, STAGE_DETECTION)
+    outcomes = _run_batched(
+        items,
+        lambda images: yolo_detector.detect_objects_batch(images, conf_threshold=DETECTION_CONF_THRESHOLD),
+        lambda image: yolo_detector.detect_objects(image, conf_threshold=DETECTION_CONF_THRESHOLD),
+    )
+    for item, (result, error) in zip(items, outcomes, strict=True):
+        if error is not None:
+            _complete_stage(item.analysis, STAGE_DETECTION, "ERROR", f"Detection Error: {error!s}")
+            continue
+        item.analysis.detected_objects = result
+        _complete_stage(item.analysis, STAGE_DETECTION, "SUCCESS")
+    db.commit()
+    logger.info(f"Детекция пачки из {len(items)} креативов завершена")
+
+
+def run_batch_classification(db: Session, items: list[BatchItem]):
+    _start_stage(db, items, STAGE_CLASSIFICATION)
+    pending = []
+    for item in items:
+        decision = None
+        if settings.CLASSIFICATION_CASCADE:
+            decision = cascade.cascade_topic(item.analysis.ocr_text or "", item.analysis.detected_objects or [])
+        if decision is None:
+            pending.append(item)
+            continue
+        item.analysis.main_topic, item.analysis.topic_confidence = decision
+        item.analysis.classification_path = CLASSIFICATION_PATH_CASCADE
+        _complete_stage(item.analysis, STAGE_CLASSIFICATION, "SUCCESS")
+
+    # Один батчевый проход BERT для всех креативов, не решённых каскадом
+    predictions = classifier.classify_creatives(
+        [(item.analysis.ocr_text or "", item.analysis.detected_objects or []) for item in pending],
+    )
+    for item, (main_topic, topic_confidence) in zip(pending, predictions, strict=True):
+        item.analysis.classification_path = CLASSIFICATION_PATH_BERT
+        if main_topic is None:
+            _complete_stage(item.analysis, STAGE_CLASSIFICATION, "ERROR", "Classification returned None")
+            continue
+        item.analysis.main_topic = main_topic
+        item.analysis.topic_confidence = topic_confidence
+        _complete_stage(item.analysis, STAGE_CLASSIFICATION, "SUCCESS")
+    db.commit()
+    logger.info(f"Классификация пачки из {len(items)} креативов завершена, через BERT: {len(pending)}")
+
+
+def run_batch_color_analysis(db: Session, items: list[BatchItem]):
+    # KMeans считается по каждому изображению отдельно, батчевого выигрыша здесь нет
+    for item in items:
+        try:
+            perform_color_analysis(item.creative_id, item.analysis, db, item.image)
+        except StageBusyError as e:
+            # Этап не запускался: креатив вернётся в очередь и попадёт в одну из следующих пачек
+            logger.warning(f"[{item.creative_id}] {e} Креатив возвращён в очередь")
+            enqueue_creative(item.creative_id)
+        except Exception:
+            logger.exception(f"[{item.creative_id}] Ошибка анализа цветов в пачке")
+
+
+def process_creative_batch(creative_ids: list[str]):
+    """Обрабатывает пачку креативов: каждая модель вызывается один раз на всю пачку."""
+    logger.info(f"Начало обработки пачки из {len(creative_ids)} креативов")
+    db = SessionLocal()
+    try:
+        items = load_batch_items(db, creative_ids)
+        if not items:
+            return
+        run_batch_ocr(db, items)
+        run_batch_detection(db, items)
+        run_batch_classification(db, items)
+        run_batch_color_analysis(db, items)
+        for item in items:
+            finalize_analysis_if_complete(db, item.creative_id)
+    except Exception as exc:
+        logger.exception("Критическая ошибка при обработке пачки")
+        db.rollback()
+        for analysis in db.query(CreativeAnalysis).filter(CreativeAnalysis.creative_id.in_(creative_ids)):
+            if analysis.overall_status == "PROCESSING":
+                analysis.overall_status = "ERROR"
+                analysis.error_message = str(exc)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,101 @@
+import logging
+import socket
+import time
+
+import redis
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_QUEUE_KEY = "creatives:batch_queue"
+BATCH_PROCESSING_KEY_PREFIX = "creatives:batch_processing"
+# Сколько ждать первый креатив, прежде чем вернуть пустую пачку
+BATCH_IDLE_TIMEOUT = 5
+
+_redis_client = None
+
+
+def get_redis_client():
+    global _redis_client  # noqa: PLW0603
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def get_processing_key() -> str:
+    """Список креативов, взятых этим воркером и ещё не обработанных."""
+    worker_id = settings.BATCH_WORKER_ID or socket.gethostname()
+    return f"{BATCH_PROCESSING_KEY_PREFIX}:{worker_id}"
+
+
+def enqueue_creative(creative_id: str):
+    get_redis_client().lpush(BATCH_QUEUE_KEY, creative_id)
+    logger.info(f"[{creative_id}] Креатив добавлен в очередь батчевой обработки")
+
+
+def _move_to_processing(client, count: int) -> list[str]:
+    # LMOVE забирает по одному элементу, поэтому добор отправляется одним конвейером команд
+    pipeline = client.pipeline(transaction=False)
+    for _ in range(count):
+        pipeline.lmove(BATCH_QUEUE_KEY, get_processing_key(), "RIGHT", "LEFT")
+    return [value.decode() for value in pipeline.execute() if value is not None]
+
+
+def pop_batch(max_size: int, max_wait_ms: int, idle_timeout: float = BATCH_IDLE_TIMEOUT) -> list[str]:
+    """
+    Забирает из очереди до max_size креативов.
+
+    Блокируется до появления первого креатива (не дольше idle_timeout секунд),
+    затем добирает пачку не дольше max_wait_ms миллисекунд. Креативы не
+    удаляются, а переносятся в список обработки воркера: после сохранения
+    результата их нужно подтвердить через ack_creatives.
+    """
+    client = get_redis_client()
+    processing_key = get_processing_key()
+    item = client.blmove(BATCH_QUEUE_KEY, processing_key, idle_timeout, "RIGHT", "LEFT")
+    if item is None:
+        return []
+
+    batch = [item.decode()]
+    deadline = time.monotonic() + max_wait_ms / 1000
+    while len(batch) < max_size:
+        items = _move_to_processing(client, max_size - len(batch))
+        if items:
+            batch.extend(items)
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        item = client.blmove(BATCH_QUEUE_KEY, processing_key, remaining, "RIGHT", "LEFT")
+        if item is None:
+            break
+        batch.append(item.decode())
+    return batch
+
+
+def ack_creatives(creative_ids: list[str]):
+    """Удаляет обработанные креативы из списка обработки воркера."""
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for creative_id in creative_ids:
+        pipeline.lrem(get_processing_key(), 1, creative_id)
+    pipeline.execute()
+
+
+def requeue_unacked() -> int:
+    """
+    Возвращает в очередь креативы, оставшиеся в списке обработки воркера.
+
+    Вызывается при старте: если прошлый процесс упал, был убит OOM или SIGKILL
+    после взятия пачки, его креативы не потеряются и не останутся в PROCESSING.
+    """
+    client = get_redis_client()
+    processing_key = get_processing_key()
+    count = 0
+    # Возвращаются в голову очереди (правый край) в исходном порядке: их взяли раньше тех,
+    # что ждут сейчас. Последний взятый лежит слева в списке обработки и уходит первым
+    while client.lmove(processing_key, BATCH_QUEUE_KEY, "LEFT", "RIGHT") is not None:
+        count += 1
+    if count:
+        logger.warning(f"Возвращено в очередь {count} креативов, не обработанных прошлым запуском воркера")
+    return count
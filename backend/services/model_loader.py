@@ -1,10 +1,23 @@
 import logging
 from pathlib import Path
 
+import torch
+from config import ML_STAGES
+from config import STAGE_CLASSIFICATION
+from config import STAGE_DETECTION
+from config import STAGE_OCR
 from config import settings
 from icecream import ic
 from minio.error import MinioException
 from minio_client import minio_client
+from ml_models.bert_onnx import export_bert_to_onnx
+from ml_models.classifier import BACKEND_ONNX
+from ml_models.classifier import load_torch_bert_model
+from ml_models.yolo_detector import BACKEND_ONNX as YOLO_BACKEND_ONNX
+from ml_models.yolo_detector import load_yolo_torch_model
+from ml_models.yolo_onnx import get_yolo_onnx_file
+from ml_models.yolo_onnx_export import export_yolo_to_onnx
+from ml_models.yolo_onnx_export import quantize_yolo_onnx
 
 
 logger = logging.getLogger(__name__)
@@ -65,26 +78,122 @@ def ensure_easyocr_weights_exists_locally(local_weights_dir: str, minio_weights_
         return True
 
 
-def load_models():
-    success = True
+def ensure_bert_tokenizer_exists_locally(local_tokenizer_dir: str, minio_tokenizer_dir: str):
+    local_tokenizer_dir = Path(local_tokenizer_dir)
+    if local_tokenizer_dir.exists():
+        logger.info(f"Файлы токенизатора BERT уже существуют локально: {local_tokenizer_dir}")
+        return True
+
+    logger.info("Файлы токенизатора BERT не найдены локально. Загрузка из MinIO...")
+    try:
+        objects = list(minio_client.list_objects(
+            settings.MODEL_MINIO_BUCKET, prefix=f"{minio_tokenizer_dir}/", recursive=True,
+        ))
+        if not objects:
+            logger.warning(f"В бакете {settings.MODEL_MINIO_BUCKET} нет файлов токенизатора {minio_tokenizer_dir}")
+            return False
+
+        # Скачиваем во временный каталог, чтобы при обрыве не остался неполный токенизатор
+        partial_dir = local_tokenizer_dir.with_name(f"{local_tokenizer_dir.name}.partial")
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        for obj in objects:
+            file_name = Path(obj.object_name).relative_to(minio_tokenizer_dir)
+            local_file_path = partial_dir / file_name
+            local_file_path.parent.mkdir(parents=True, exist_ok=True)
+            minio_client.fget_object(settings.MODEL_MINIO_BUCKET, obj.object_name, str(local_file_path))
+            logger.info(f"Загружен файл токенизатора: {file_name}")
+        partial_dir.rename(local_tokenizer_dir)
+
+        logger.info(f"Токенизатор BERT успешно загружен в {local_tokenizer_dir}")
+    except MinioException:
+        logger.exception("Ошибка загрузки файлов токенизатора BERT из MinIO.")
+        return False
+    else:
+        return True
+
+
+def ensure_bert_onnx_exists_locally() -> bool:
+    onnx_local_path = Path(settings.MODEL_CACHE_DIR) / settings.BERT_ONNX_PATH
+    if ensure_model_exists_locally("Multimodal BERT ONNX", settings.BERT_ONNX_PATH, onnx_local_path):
+        return True
+
+    logger.info("ONNX-модель BERT не найдена в MinIO. Экспорт из PyTorch чекпойнта...")
+    try:
+        model = load_torch_bert_model(torch.device("cpu"))
+        export_bert_to_onnx(model, onnx_local_path)
+    except Exception:
+        logger.exception("Ошибка экспорта модели BERT в ONNX.")
+        return False
+    else:
+        return True
+
+
+def ensure_yolo_onnx_exists_locally() -> bool:
+    """
+    Готовит ONNX-модель YOLO нужной точности (YOLO_ONNX_INT8) в MODEL_CACHE_DIR.
+
+    fp32 и INT8 хранятся в разных файлах (yolov8m.onnx и yolov8m.int8.onnx),
+    поэтому по кэшу всегда видно, какая точность в нём лежит.
+    """
+    onnx_file = get_yolo_onnx_file()
+    onnx_local_path = Path(settings.MODEL_CACHE_DIR) / onnx_file
+    if ensure_model_exists_locally("YOLOv8 ONNX", onnx_file, onnx_local_path):
+        return True
+
+    fp32_local_path = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_ONNX_PATH
+    try:
+        fp32_ready = settings.YOLO_ONNX_INT8 and ensure_model_exists_locally(
+            "YOLOv8 ONNX fp32", settings.YOLO_ONNX_PATH, fp32_local_path,
+        )
+        if not fp32_ready:
+            logger.info("ONNX-модель YOLO не найдена в MinIO. Экспорт из PyTorch чекпойнта...")
+            model = load_yolo_torch_model(Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH)
+            export_yolo_to_onnx(model, fp32_local_path)
+        if settings.YOLO_ONNX_INT8:
+            quantize_yolo_onnx(fp32_local_path, onnx_local_path)
+    except Exception:
+        logger.exception("Ошибка экспорта модели YOLO в ONNX.")
+        return False
+    else:
+        return True
 
-    yolo_local_path = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH
-    if not ensure_model_exists_locally("YOLOv8", settings.YOLO_MODEL_PATH, yolo_local_path):
-        logger.error("Не удалось загрузить модель YOLOv8.")
-        success = False
 
-    easyocr_local_weights_dir = Path(settings.MODEL_CACHE_DIR) / settings.EASYOCR_WEIGHTS_DIR
-    if not ensure_easyocr_weights_exists_locally(easyocr_local_weights_dir, settings.EASYOCR_WEIGHTS_DIR):
-        logger.error("Не удалось загрузить веса EasyOCR.")
-        success = False
+def load_models(stages: list[str] | None = None):
+    """Копирует из MinIO модели для этапов stages (по умолчанию - для всех)."""
+    stages = stages if stages is not None else [stage["name"] for stage in ML_STAGES]
+    success = True
 
-    bert_local_path = Path(settings.MODEL_CACHE_DIR) / settings.BERT_MODEL_PATH
-    if not ensure_model_exists_locally("Multimodal BERT", settings.BERT_MODEL_PATH, bert_local_path):
-        logger.error("Не удалось загрузить модель Multimodal BERT.")
-        success = False
+    if STAGE_DETECTION in stages:
+        yolo_local_path = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH
+        if not ensure_model_exists_locally("YOLOv8", settings.YOLO_MODEL_PATH, yolo_local_path):
+            logger.error("Не удалось загрузить модель YOLOv8.")
+            success = False
+        elif settings.YOLO_BACKEND == YOLO_BACKEND_ONNX and not ensure_yolo_onnx_exists_locally():
+            logger.error("Не удалось подготовить ONNX-модель YOLOv8.")
+            success = False
+
+    if STAGE_OCR in stages:
+        easyocr_local_weights_dir = Path(settings.MODEL_CACHE_DIR) / settings.EASYOCR_WEIGHTS_DIR
+        if not ensure_easyocr_weights_exists_locally(easyocr_local_weights_dir, settings.EASYOCR_WEIGHTS_DIR):
+            logger.error("Не удалось загрузить веса EasyOCR.")
+            success = False
+
+    if STAGE_CLASSIFICATION in stages:
+        tokenizer_local_dir = Path(settings.MODEL_CACHE_DIR) / settings.BERT_TOKENIZER_DIR
+        if not ensure_bert_tokenizer_exists_locally(tokenizer_local_dir, settings.BERT_TOKENIZER_DIR):
+            # Не критично: токенизатор будет загружен с HF Hub при наличии сети
+            logger.warning("Не удалось загрузить токенизатор BERT из MinIO.")
+
+        bert_local_path = Path(settings.MODEL_CACHE_DIR) / settings.BERT_MODEL_PATH
+        if not ensure_model_exists_locally("Multimodal BERT", settings.BERT_MODEL_PATH, bert_local_path):
+            logger.error("Не удалось загрузить модель Multimodal BERT.")
+            success = False
+        elif settings.BERT_BACKEND == BACKEND_ONNX and not ensure_bert_onnx_exists_locally():
+            logger.error("Не удалось подготовить ONNX-модель Multimodal BERT.")
+            success = False
 
     if success:
-        logger.info("Все модели успешно загружены или уже существуют.")
+        logger.info(f"Модели для этапов {stages} успешно загружены или уже существуют.")
     else:
         logger.error("Не удалось загрузить одну или несколько моделей.")
     return success
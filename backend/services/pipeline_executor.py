@@ -0,0 +1,152 @@
+import logging
+import queue
+import threading
+
+from config import STAGE_CLASSIFICATION
+from config import STAGE_COLOR
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import settings
+from database import SessionLocal
+from services.batch_processing_service import load_batch_item
+from services.processing_service import finalize_analysis_if_complete
+from services.processing_service import get_creative_and_analysis
+from services.processing_service import perform_classification
+from services.processing_service import perform_color_analysis
+from services.processing_service import perform_detection
+from services.processing_service import perform_ocr
+from services.stage_deadline import StageBusyError
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+STAGE_LOAD = "load"
+# Порядок этапов конвейера; каждый этап работает в своём потоке
+PIPELINE_STAGES = (STAGE_LOAD, STAGE_OCR, STAGE_DETECTION, STAGE_CLASSIFICATION, STAGE_COLOR)
+MODEL_STAGES = PIPELINE_STAGES[1:]
+
+_STOP = object()
+
+
+class PipelineItem:
+    def __init__(self, creative_id: str):
+        self.creative_id = creative_id
+        self.image: DecodedImage | None = None
+
+
+def _mark_error(creative_id: str, exc: Exception):
+    db = SessionLocal()
+    try:
+        _, analysis = get_creative_and_analysis(db, creative_id)
+        analysis.overall_status = "ERROR"
+        analysis.error_message = str(exc)
+        db.commit()
+    except Exception:
+        logger.exception(f"[{creative_id}] Не удалось сохранить ошибку конвейера")
+    finally:
+        db.close()
+
+
+def _run_stage(stage: str, item: PipelineItem) -> bool:
+    """Выполняет этап для креатива; False - креатив дальше по конвейеру не идёт."""
+    db = SessionLocal()
+    try:
+        if stage == STAGE_LOAD:
+            loaded = load_batch_item(db, item.creative_id)
+            if loaded is None:
+                return False
+            item.image = loaded.image
+            return True
+
+        creative, analysis = get_creative_and_analysis(db, item.creative_id)
+        if stage == STAGE_OCR:
+            perform_ocr(item.creative_id, creative, analysis, db, item.image)
+        elif stage == STAGE_DETECTION:
+            perform_detection(item.creative_id, analysis, db, item.image)
+        elif stage == STAGE_CLASSIFICATION:
+            perform_classification(item.creative_id, analysis, db)
+        else:
+            perform_color_analysis(item.creative_id, analysis, db, item.image)
+            finalize_analysis_if_complete(db, item.creative_id)
+        return True
+    finally:
+        db.close()
+
+
+class PipelineExecutor:
+    """
+    Конвейер этапов внутри одного процесса воркера.
+
+    Пока креатив k проходит OCR, креатив k+1 скачивается и декодируется,
+    а k-1 классифицируется. Между этапами стоят очереди ограниченного размера,
+    поэтому быстрый этап не накапливает в памяти декодированные изображения.
+    """
+
+    def __init__(self, queue_size: int | None = None, on_done=None, on_retry=None):
+        queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+        # Вызывается с creative_id, когда креатив покинул конвейер и его результат сохранён
+        self._on_done = on_done
+        # Вызывается с creative_id, если этап не запускался (StageBusyError) и креатив нужно обработать заново
+        self._on_retry = on_retry
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in PIPELINE_STAGES]
+        self._threads = [
+            threading.Thread(target=self._stage_loop, args=(index,), name=f"pipeline-{stage}", daemon=True)
+            for index, stage in enumerate(PIPELINE_STAGES)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Конвейер запущен: этапы {PIPELINE_STAGES}, очередь {queue_size}")
+
+    def submit(self, creative_id: str):
+        """Ставит креатив в конвейер; блокируется, пока первая очередь заполнена."""
+        self._queues[0].put(PipelineItem(creative_id))
+
+    def shutdown(self):
+        """Дожидается обработки уже принятых креативов и останавливает потоки."""
+        self._queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _stage_loop(self, index: int):
+        stage = PIPELINE_STAGES[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(PIPELINE_STAGES) else None
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                if outbox is not None:
+                    outbox.put(_STOP)
+                return
+
+            try:
+                passed = _run_stage(stage, item)
+            except StageBusyError as exc:
+                self._retry(item.creative_id, exc)
+                passed = False
+            except Exception as exc:
+                logger.exception(f"[{item.creative_id}] Ошибка этапа {stage} в конвейере")
+                _mark_error(item.creative_id, exc)
+                passed = False
+
+            if passed and outbox is not None:
+                outbox.put(item)
+            elif self._on_done is not None:
+                self._notify_done(item.creative_id)
+
+    def _notify_done(self, creative_id: str):
+        try:
+            self._on_done(creative_id)
+        except Exception:
+            logger.exception(f"[{creative_id}] Не удалось подтвердить обработку креатива")
+
+    def _retry(self, creative_id: str, exc: StageBusyError):
+        if self._on_retry is None:
+            _mark_error(creative_id, exc)
+            return
+        logger.warning(f"[{creative_id}] {exc} Креатив будет обработан повторно")
+        try:
+            self._on_retry(creative_id)
+        except Exception:
+            logger.exception(f"[{creative_id}] Не удалось вернуть креатив на повторную обработку")
+            _mark_error(creative_id, exc)
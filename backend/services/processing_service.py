@@ -1,22 +1,44 @@
 import logging
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO
 
+from config import CLASSIFICATION_PATH_BERT
+from config import CLASSIFICATION_PATH_CASCADE
+from config import ML_STAGES
+from config import STAGE_CLASSIFICATION
+from config import STAGE_COLOR
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import STAGE_STATUS_TIMEOUT
+from config import settings
 from database import SessionLocal
 from database_models.creative import Creative
 from database_models.creative import CreativeAnalysis
+from ml_models import cascade
 from ml_models import classifier
+from ml_models import inference_client
 from ml_models import ocr_model
 from ml_models import yolo_detector
-from PIL import Image
+from services.analytics_service import get_timed_out_stages
+from services.progress_store import is_deferred
+from services.progress_store import save_progress
 from services.settings_service import get_setting
+from services.stage_deadline import StageBusyError
+from services.stage_deadline import StageTimeoutError
+from services.stage_deadline import run_with_deadline
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 from utils.color_utils import classify_colors_by_palette
 from utils.color_utils import get_top_colors
+from utils.image_utils import DecodedImage
 
 
 logger = logging.getLogger(__name__)
 
+UNFINISHED_STATUSES = {None, "PENDING", "PROCESSING"}
+STAGE_COLUMNS = {stage["name"]: stage for stage in ML_STAGES}
+
 
 class CreativeNotFoundError(Exception):
     def __init__(self, creative_id: str):
@@ -42,21 +64,109 @@ def get_creative_and_analysis(
     return creative, analysis
 
 
-def get_image_dimensions(temp_local_path: str) -> tuple[bool, tuple[int, int]]:
+def is_stage_completed(analysis: CreativeAnalysis, stage: str) -> bool:
+    """Этап уже успешно выполнен, например, до повтора задачи."""
+    return getattr(analysis, STAGE_COLUMNS[stage]["status"]) == "SUCCESS"
+
+
+def save_stage(db: Session, analysis: CreativeAnalysis, stage: str):
+    """Фиксирует состояние этапа: коммитом в Postgres или, при отложенной записи, в Redis."""
+    if not is_deferred(db):
+        db.commit()
+        return
+    columns = STAGE_COLUMNS[stage]
+    save_progress(
+        analysis.creative_id,
+        {columns[field]: getattr(analysis, columns[field]) for field in ("status", "started", "completed", "duration")},
+    )
+
+
+def snapshot_analysis(analysis: CreativeAnalysis) -> dict:
+    """Незаписанные значения колонок анализа, чтобы перенести их через rollback сессии."""
+    # Только уже загруженные атрибуты: обращение к истёкшим полезло бы в сломанную транзакцию
+    loaded = inspect(analysis).dict
+    return {
+        column.key: loaded[column.key]
+        for column in CreativeAnalysis.__table__.columns
+        if not column.primary_key and column.key in loaded
+    }
+
+
+def mark_stage_timeout(creative_id: str, analysis: CreativeAnalysis, error: StageTimeoutError):
+    """Отмечает этап как TIMEOUT: задача продолжает работу с неполным результатом."""
+    logger.warning(f"[{creative_id}] {error} Продолжаем без результата этапа")
+    columns = STAGE_COLUMNS[error.stage]
+    completed = datetime.utcnow()
+    setattr(analysis, columns["status"], STAGE_STATUS_TIMEOUT)
+    setattr(analysis, columns["completed"], completed)
+    started = getattr(analysis, columns["started"])
+    if started is not None:
+        setattr(analysis, columns["duration"], (completed - started).total_seconds())
+    analysis.error_message = str(error)
+
+
+def commit_unless_deferred(db: Session):
+    if not is_deferred(db):
+        db.commit()
+
+
+def finalize_analysis_if_complete(db: Session, creative_id: str) -> bool:
+    """
+    Завершает анализ, если все этапы уже отработали.
+
+    В режиме PIPELINE_MODE=stages этапы выполняются отдельными задачами, и итоговый
+    статус выставляет та из них, что закончила последней. Строка блокируется
+    (SELECT ... FOR UPDATE), чтобы две одновременно завершившиеся задачи не разошлись.
+    """
+    # При отложенной записи новая строка анализа ещё не отправлена в БД, а сессия
+    # без autoflush: без flush запрос её не найдёт, и анализ не будет завершён
+    db.flush()
+    analysis = (
+        db.query(CreativeAnalysis)
+        .filter(CreativeAnalysis.creative_id == creative_id)
+        .with_for_update()
+        .first()
+    )
+    statuses = [getattr(analysis, stage["status"]) for stage in ML_STAGES] if analysis else []
+    if not statuses or any(status in UNFINISHED_STATUSES for status in statuses):
+        db.commit()  # снимаем блокировку
+        return False
+
+    analysis.overall_status = "SUCCESS"
+    analysis.analysis_timestamp = datetime.utcnow()
+    started = [getattr(analysis, stage["started"]) for stage in ML_STAGES]
+    started = [value for value in started if value is not None]
+    if started:
+        analysis.total_duration = (analysis.analysis_timestamp - min(started)).total_seconds()
+    db.commit()
+    logger.info(f"[{creative_id}] Анализ завершен")
+    return True
+
+
+def decode_image(temp_local_path: str) -> DecodedImage | None:
+    """Декодирует скачанный файл один раз на задачу; повреждённый файл удаляется."""
     temp_local_path = Path(temp_local_path)
     try:
-        with Image.open(temp_local_path) as img:
-            return True, img.size
+        return DecodedImage.from_path(temp_local_path)
     except Exception:
-        logger.exception("Ошибка чтения изображения {temp_local_path}")
+        logger.exception(f"Ошибка чтения изображения {temp_local_path}")
 
     if temp_local_path.exists():
         try:
             temp_local_path.unlink()
             logger.info(f"Удален повреждённый временный файл {temp_local_path}")
         except Exception:
-            logger.exception("Ошибка при удалении временного файла {temp_local_path}")
-    return False, (0, 0)
+            logger.exception(f"Ошибка при удалении временного файла {temp_local_path}")
+    return None
+
+
+def decode_image_buffer(buffer: BinaryIO, creative_id: str) -> DecodedImage | None:
+    """Декодирует изображение, скачанное в память."""
+    try:
+        return DecodedImage.from_fileobj(buffer, source=f"minio:{creative_id}")
+    except Exception:
+        logger.exception(f"[{creative_id}] Ошибка чтения изображения из памяти")
+    return None
 
 
 def perform_ocr(
@@ -64,17 +174,20 @@ def perform_ocr(
         creative: Creative,
         analysis: CreativeAnalysis,
         db: Session,
-        temp_local_path: str,
+        image: DecodedImage,
 ):
     logger.info(f"[{creative_id}] Начало OCR...")
     analysis.ocr_status = "PROCESSING"
     analysis.ocr_started_at = datetime.utcnow()
-    db.commit()
+    save_stage(db, analysis, STAGE_OCR)
 
     try:
-        ocr_text, ocr_blocks = ocr_model.extract_text_and_blocks(
-            temp_local_path, creative=creative,
-        )
+        if settings.INFERENCE_SERVER:
+            ocr_text, ocr_blocks = run_with_deadline(STAGE_OCR, inference_client.extract_text_and_blocks, image)
+        else:
+            ocr_text, ocr_blocks = run_with_deadline(
+                STAGE_OCR, ocr_model.extract_text_and_blocks, image, creative=creative,
+            )
 
         analysis.ocr_text = ocr_text
         analysis.ocr_blocks = ocr_blocks
@@ -83,30 +196,41 @@ def perform_ocr(
         analysis.ocr_duration = (
                 analysis.ocr_completed_at - analysis.ocr_started_at
         ).total_seconds()
-        db.commit()
+        save_stage(db, analysis, STAGE_OCR)
         logger.info(f"[{creative_id}] OCR завершен успешно.")
+    except StageBusyError:
+        # Этап не запускался: задача или пачка повторит его, результат не деградирован
+        raise
+    except StageTimeoutError as e:
+        mark_stage_timeout(creative_id, analysis, e)
+        save_stage(db, analysis, STAGE_OCR)
     except Exception as e:
         logger.exception(f"[{creative_id}] Ошибка OCR")
         analysis.ocr_status = "ERROR"
         analysis.error_message = f"OCR Error: {e!s}"
-        db.commit()
+        save_stage(db, analysis, STAGE_OCR)
 
 
 def perform_detection(
         creative_id: str,
         analysis: CreativeAnalysis,
         db: Session,
-        temp_local_path: str,
+        image: DecodedImage,
 ):
     logger.info(f"[{creative_id}] Начало детекции...")
     analysis.detection_status = "PROCESSING"
     analysis.detection_started_at = datetime.utcnow()
-    db.commit()
+    save_stage(db, analysis, STAGE_DETECTION)
 
     try:
-        detected_objects = yolo_detector.detect_objects(
-            temp_local_path, conf_threshold=0.35,
-        )
+        if settings.INFERENCE_SERVER:
+            detected_objects = run_with_deadline(
+                STAGE_DETECTION, inference_client.detect_objects, image, conf_threshold=0.35,
+            )
+        else:
+            detected_objects = run_with_deadline(
+                STAGE_DETECTION, yolo_detector.detect_objects, image, conf_threshold=0.35,
+            )
 
         analysis.detected_objects = detected_objects
         analysis.detection_status = "SUCCESS"
@@ -114,20 +238,30 @@ def perform_detection(
         analysis.detection_duration = (
                 analysis.detection_completed_at - analysis.detection_started_at
         ).total_seconds()
-        db.commit()
+        save_stage(db, analysis, STAGE_DETECTION)
         logger.info(f"[{creative_id}] Детекция завершена успешно.")
+    except StageBusyError:
+        raise
+    except StageTimeoutError as e:
+        mark_stage_timeout(creative_id, analysis, e)
+        save_stage(db, analysis, STAGE_DETECTION)
     except Exception as e:
         logger.exception(f"[{creative_id}] Ошибка детекции")
         analysis.detection_status = "ERROR"
         analysis.error_message = f"Detection Error: {e!s}"
-        db.commit()
+        save_stage(db, analysis, STAGE_DETECTION)
 
 
 def perform_classification(creative_id: str, analysis: CreativeAnalysis, db: Session):
     logger.info(f"[{creative_id}] Начало классификации...")
     analysis.classification_status = "PROCESSING"
     analysis.classification_started_at = datetime.utcnow()
-    db.commit()
+    save_stage(db, analysis, STAGE_CLASSIFICATION)
+
+    timed_out = get_timed_out_stages(analysis)
+    if timed_out:
+        # Деградированный результат: тема определяется по тем входам, что успели посчитаться
+        logger.warning(f"[{creative_id}] Классификация без результатов этапов {timed_out}")
 
     try:
         ocr_text = analysis.ocr_text if analysis.ocr_text else ""
@@ -135,9 +269,23 @@ def perform_classification(creative_id: str, analysis: CreativeAnalysis, db: Ses
             analysis.detected_objects if analysis.detected_objects else []
         )
 
-        main_topic, topic_confidence = classifier.classify_creative(
-            ocr_text, detected_objects,
-        )
+        decision = None
+        if settings.CLASSIFICATION_CASCADE:
+            decision = cascade.cascade_topic(ocr_text, detected_objects)
+
+        if decision is not None:
+            main_topic, topic_confidence = decision
+            analysis.classification_path = CLASSIFICATION_PATH_CASCADE
+        elif settings.INFERENCE_SERVER:
+            main_topic, topic_confidence = run_with_deadline(
+                STAGE_CLASSIFICATION, inference_client.classify_creative, ocr_text, detected_objects,
+            )
+            analysis.classification_path = CLASSIFICATION_PATH_BERT
+        else:
+            main_topic, topic_confidence = run_with_deadline(
+                STAGE_CLASSIFICATION, classifier.classify_creative, ocr_text, detected_objects,
+            )
+            analysis.classification_path = CLASSIFICATION_PATH_BERT
 
         if main_topic is not None:
             analysis.main_topic = main_topic
@@ -151,22 +299,28 @@ def perform_classification(creative_id: str, analysis: CreativeAnalysis, db: Ses
         analysis.classification_duration = (
                 analysis.classification_completed_at - analysis.classification_started_at
         ).total_seconds()
-        db.commit()
+        save_stage(db, analysis, STAGE_CLASSIFICATION)
         logger.info(
-            f"[{creative_id}] Классификация завершена. Тема: {main_topic}, Уверенность: {topic_confidence:.4f}",
+            f"[{creative_id}] Классификация завершена ({analysis.classification_path}). "
+            f"Тема: {main_topic}, Уверенность: {topic_confidence:.4f}",
         )
+    except StageBusyError:
+        raise
+    except StageTimeoutError as e:
+        mark_stage_timeout(creative_id, analysis, e)
+        save_stage(db, analysis, STAGE_CLASSIFICATION)
     except Exception as e:
         logger.exception(f"[{creative_id}] Ошибка классификации")
         analysis.classification_status = "ERROR"
         analysis.error_message = f"Classification Error: {e!s}"
-        db.commit()
+        save_stage(db, analysis, STAGE_CLASSIFICATION)
 
 
 def perform_color_analysis(
         creative_id: str,
         analysis,
         db,
-        temp_local_path: str,
+        image: DecodedImage,
 ):
     db_session = SessionLocal()
     try:
@@ -178,11 +332,11 @@ def perform_color_analysis(
     logger.info(f"[{creative_id}] Начало анализа цветов...")
     analysis.color_analysis_status = "PROCESSING"
     analysis.color_analysis_started_at = datetime.utcnow()
-    db.commit()
+    save_stage(db, analysis, STAGE_COLOR)
 
     try:
-        colors_result = get_top_colors(
-            temp_local_path, n_dominant=n_dominant, n_secondary=n_secondary, n_coeff=1,
+        colors_result = run_with_deadline(
+            STAGE_COLOR, get_top_colors, image, n_dominant=n_dominant, n_secondary=n_secondary, n_coeff=1,
         )
         palette_result = classify_colors_by_palette(colors_result)
 
@@ -191,6 +345,10 @@ def perform_color_analysis(
         analysis.palette_colors = palette_result
 
         analysis.color_analysis_status = "SUCCESS"
+    except StageBusyError:
+        raise
+    except StageTimeoutError as e:
+        mark_stage_timeout(creative_id, analysis, e)
     except Exception:
         logger.exception(f"Ошибка при анализе цветов для {creative_id}")
         analysis.color_analysis_status = "ERROR"
@@ -202,4 +360,4 @@ def perform_color_analysis(
                     analysis.color_analysis_completed_at
                     - analysis.color_analysis_started_at
             ).total_seconds()
-        db.commit()
+        save_stage(db, analysis, STAGE_COLOR)
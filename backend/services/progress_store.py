@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime
+
+import redis
+from config import settings
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY_PREFIX = "creative_progress:"
+# Прогресс нужен только на время обработки; ключ забытой задачи истечёт сам
+PROGRESS_TTL = 24 * 60 * 60
+DEFER_COMMITS_KEY = "defer_commits"
+
+_redis_client = None
+
+
+def _get_redis_client():
+    global _redis_client  # noqa: PLW0603
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1, decode_responses=True,
+        )
+    return _redis_client
+
+
+def defer_commits(db: Session):
+    """
+    Переводит сессию в режим одной записи результата.
+
+    Этапы сохраняют промежуточные статусы и метки времени в Redis,
+    а строка CreativeAnalysis коммитится в Postgres один раз в конце обработки.
+    """
+    db.info[DEFER_COMMITS_KEY] = settings.PROGRESS_STORE
+
+
+def is_deferred(db: Session) -> bool:
+    return bool(db.info.get(DEFER_COMMITS_KEY))
+
+
+def _encode(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _decode(field: str, value: str):
+    if field.endswith("_at"):
+        return datetime.fromisoformat(value)
+    if field.endswith("_duration"):
+        return float(value)
+    return value
+
+
+def save_progress(creative_id: str, fields: dict):
+    """Сохраняет поля CreativeAnalysis (статусы, метки времени, длительности) в Redis."""
+    mapping = {field: _encode(value) for field, value in fields.items() if value is not None}
+    if not mapping:
+        return
+    key = PROGRESS_KEY_PREFIX + creative_id
+    try:
+        pipe = _get_redis_client().pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Прогресс лишь отображается в /status, итог всё равно будет записан в Postgres
+        logger.warning(f"[{creative_id}] Не удалось сохранить прогресс в Redis: {e}")
+
+
+def get_progress(creative_id: str) -> dict:
+    try:
+        raw = _get_redis_client().hgetall(PROGRESS_KEY_PREFIX + creative_id)
+    except redis.RedisError as e:
+        logger.warning(f"[{creative_id}] Не удалось прочитать прогресс из Redis: {e}")
+        return {}
+    return {field: _decode(field, value) for field, value in raw.items()}
+
+
+def clear_progress(creative_id: str):
+    try:
+        _get_redis_client().delete(PROGRESS_KEY_PREFIX + creative_id)
+    except redis.RedisError as e:
+        logger.warning(f"[{creative_id}] Не удалось удалить прогресс из Redis: {e}")
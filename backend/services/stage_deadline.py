@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+
+from config import get_stage_timeouts
+
+
+# Вызовы, брошенные по таймауту и ещё работающие в фоне, по этапам
+_abandoned_calls: dict[str, set[Future]] = defaultdict(set)
+_abandoned_lock = threading.Lock()
+
+
+class StageTimeoutError(Exception):
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(f"Этап {stage} не уложился в {timeout:g} сек.")
+
+
+class StageBusyError(Exception):
+    """Модель этапа весь лимит была занята брошенным вызовом; этап не запускался и будет повторён."""
+
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(
+            f"Этап {stage} не запущен: за {timeout:g} сек. не освободилась модель, "
+            f"занятая вызовом, не уложившимся в лимит.",
+        )
+
+
+def abandoned_calls(stage: str) -> int:
+    with _abandoned_lock:
+        return len(_abandoned_calls[stage])
+
+
+def _release_abandoned(stage: str, future: Future):
+    with _abandoned_lock:
+        _abandoned_calls[stage].discard(future)
+
+
+def _abandon(stage: str, future: Future):
+    with _abandoned_lock:
+        _abandoned_calls[stage].add(future)
+    # Если вызов успел завершиться, колбэк выполнится сразу
+    future.add_done_callback(lambda _: _release_abandoned(stage, future))
+
+
+def _wait_abandoned(stage: str, timeout: float) -> bool:
+    with _abandoned_lock:
+        pending = set(_abandoned_calls[stage])
+    if not pending:
+        return True
+    _, not_done = wait(pending, timeout=timeout)
+    return not not_done
+
+
+def _call_in_thread(future: Future, func, args, kwargs):
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:  # noqa: BLE001 - исключение пробрасывается в вызывающий поток через future
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+
+
+def run_with_deadline(stage: str, func, *args, **kwargs):
+    """
+    Вызывает модель этапа с мягким лимитом времени из STAGE_TIMEOUT/STAGE_TIMEOUTS.
+
+    Вызов выполняется в отдельном потоке-демоне; если он не уложился в лимит,
+    бросается StageTimeoutError, и задача продолжает работу без результата этапа.
+    Прервать EasyOCR или KMeans на середине нельзя, поэтому зависший вызов
+    доработает в фоне, а его результат будет отброшен. Пока он держит семафор
+    модели и ядра, следующий вызов этапа ждёт его завершения в пределах своего
+    лимита и получает оставшееся время. Если модель так и не освободилась,
+    бросается StageBusyError: этап не запускался, и креатив не считается
+    деградированным, а обрабатывается повторно.
+    """
+    timeout = get_stage_timeouts().get(stage)
+    if timeout is None:
+        return func(*args, **kwargs)
+    started = time.monotonic()
+    if not _wait_abandoned(stage, timeout):
+        raise StageBusyError(stage, timeout)
+    remaining = max(0.0, timeout - (time.monotonic() - started))
+
+    future = Future()
+    thread = threading.Thread(
+        target=_call_in_thread,
+        args=(future, func, args, kwargs),
+        name=f"deadline-{stage}",
+        daemon=True,
+    )
+    thread.start()
+    try:
+        return future.result(timeout=remaining)
+    except FutureTimeoutError:
+        _abandon(stage, future)
+        raise StageTimeoutError(stage, timeout) from None
@@ -0,0 +1,165 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from config import ML_STAGES
+from config import PIPELINE_MODE_STAGES
+from config import STAGE_CLASSIFICATION
+from config import STAGE_COLOR
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import settings
+from database import SessionLocal
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from services.processing_service import get_creative_and_analysis
+from services.processing_service import is_stage_completed
+from services.processing_service import perform_classification
+from services.processing_service import perform_color_analysis
+from services.processing_service import perform_detection
+from services.processing_service import perform_ocr
+from services.processing_service import snapshot_analysis
+from services.progress_store import is_deferred
+from sqlalchemy.orm import Session
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_STAGES = [stage["name"] for stage in ML_STAGES]
+# Этапы, не зависящие друг от друга; классификация ждёт OCR и детекцию
+PARALLEL_STAGES = (STAGE_OCR, STAGE_DETECTION, STAGE_COLOR)
+
+_stage_executor = None
+
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    # Пул создаётся лениво, уже в дочернем процессе воркера, а не до fork
+    global _stage_executor  # noqa: PLW0603
+    if _stage_executor is None:
+        _stage_executor = ThreadPoolExecutor(max_workers=len(PARALLEL_STAGES), thread_name_prefix="stage")
+    return _stage_executor
+
+
+def get_parallel_stage_count() -> int:
+    """Сколько этапов задачи работают в потоках одновременно: по нему делятся потоки OpenMP/BLAS процесса."""
+    if settings.PIPELINE_PARALLEL_STAGES and settings.PIPELINE_MODE != PIPELINE_MODE_STAGES:
+        return len(PARALLEL_STAGES)
+    return 1
+
+
+def perform_stage(
+        stage: str,
+        creative_id: str,
+        creative: Creative,
+        analysis: CreativeAnalysis,
+        db: Session,
+        image: DecodedImage | None,
+):
+    if stage == STAGE_OCR:
+        perform_ocr(creative_id, creative, analysis, db, image)
+    elif stage == STAGE_DETECTION:
+        perform_detection(creative_id, analysis, db, image)
+    elif stage == STAGE_CLASSIFICATION:
+        perform_classification(creative_id, analysis, db)
+    else:
+        perform_color_analysis(creative_id, analysis, db, image)
+
+
+def get_pending_stages(analysis: CreativeAnalysis) -> list[str]:
+    """Этапы, которые осталось выполнить; успешные при прошлой попытке задачи пропускаются."""
+    pending = [stage for stage in ANALYSIS_STAGES if not is_stage_completed(analysis, stage)]
+    # Классификация повторяется и тогда, когда заново считаются её входы - OCR или детекция
+    if STAGE_CLASSIFICATION not in pending and (STAGE_OCR in pending or STAGE_DETECTION in pending):
+        pending = [stage for stage in ANALYSIS_STAGES if stage in pending or stage == STAGE_CLASSIFICATION]
+    return pending
+
+
+def needs_image(stages: list[str]) -> bool:
+    # Классификация работает по результатам OCR и детекции из БД
+    return any(stage != STAGE_CLASSIFICATION for stage in stages)
+
+
+def _run_stage(stage: str, creative_id: str, image: DecodedImage):
+    # У каждого этапа своя сессия: коммит обновляет только изменённые этапом колонки
+    db = SessionLocal()
+    try:
+        creative, analysis = get_creative_and_analysis(db, creative_id)
+        perform_stage(stage, creative_id, creative, analysis, db, image)
+    finally:
+        db.close()
+
+
+def _run_shared_stage(
+        stage: str,
+        creative_id: str,
+        creative: Creative,
+        values: dict,
+        db: Session,
+        image: DecodedImage,
+) -> dict:
+    # При отложенной записи строка попадёт в Postgres одним коммитом после всех этапов.
+    # Сессия и её объекты не потокобезопасны, поэтому этап заполняет свою копию анализа
+    # вне сессии и возвращает изменённые колонки; в общий объект их переносит основной поток
+    stage_analysis = CreativeAnalysis(**values)
+    perform_stage(stage, creative_id, creative, stage_analysis, db, image)
+    return {
+        field: value
+        for field, value in snapshot_analysis(stage_analysis).items()
+        if field not in values or values[field] != value
+    }
+
+
+def _apply_stage_result(analysis: CreativeAnalysis, values: dict | None):
+    for field, value in (values or {}).items():
+        setattr(analysis, field, value)
+
+
+def run_analysis_stages(
+        creative_id: str,
+        creative: Creative,
+        analysis: CreativeAnalysis,
+        db: Session,
+        image: DecodedImage | None,
+        stages: list[str] | None = None,
+):
+    """Выполняет OCR, детекцию, классификацию и анализ цветов креатива (или только stages)."""
+    stages = get_pending_stages(analysis) if stages is None else stages
+    skipped = [stage for stage in ANALYSIS_STAGES if stage not in stages]
+    if skipped:
+        logger.info(f"[{creative_id}] Этапы {skipped} уже выполнены, пропускаем")
+
+    if not settings.PIPELINE_PARALLEL_STAGES:
+        for stage in stages:
+            perform_stage(stage, creative_id, creative, analysis, db, image)
+        return
+
+    parallel_stages = [stage for stage in PARALLEL_STAGES if stage in stages]
+    logger.info(f"[{creative_id}] Параллельный запуск этапов {parallel_stages}")
+    executor = get_stage_executor()
+    deferred = is_deferred(db)
+    values = snapshot_analysis(analysis) if deferred else None
+    futures = {
+        stage: (
+            executor.submit(_run_shared_stage, stage, creative_id, creative, values, db, image)
+            if deferred
+            else executor.submit(_run_stage, stage, creative_id, image)
+        )
+        for stage in parallel_stages
+    }
+    try:
+        for stage in (STAGE_OCR, STAGE_DETECTION):
+            if stage in futures:
+                _apply_stage_result(analysis, futures[stage].result())
+        if STAGE_CLASSIFICATION in stages:
+            if not deferred:
+                # Результаты OCR и детекции закоммичены в других сессиях
+                db.refresh(analysis)
+            perform_classification(creative_id, analysis, db)
+    finally:
+        wait(futures.values())
+
+    if STAGE_COLOR in futures:
+        _apply_stage_result(analysis, futures[STAGE_COLOR].result())
+    if not deferred:
+        db.refresh(analysis)
@@ -0,0 +1,119 @@
+import logging
+import os
+
+import cv2
+import torch
+from config import get_stage_thread_limits
+from config import settings
+from threadpoolctl import threadpool_info
+from threadpoolctl import threadpool_limits
+
+
+logger = logging.getLogger(__name__)
+
+# Одновременных задач воркера (--concurrency); задаётся в worker_init до fork
+_worker_concurrency = 1
+_budget = None
+
+
+class ThreadBudget:
+    """
+    Распределение ядер машины между задачами воркера.
+
+    Каждый процесс prefork (или поток пула threads) получает cores // concurrency
+    потоков; параллельные этапы одной задачи делят эту долю между собой.
+    """
+
+    def __init__(self, cpus: list[int], concurrency: int):
+        self.cpus = cpus
+        self.concurrency = max(1, concurrency)
+        self.task_threads = max(1, len(cpus) // self.concurrency)
+        self.intra_op_threads = settings.TORCH_INTRA_OP_THREADS or self.task_threads
+        self.inter_op_threads = max(1, settings.TORCH_INTER_OP_THREADS)
+        self.stage_limits = get_stage_thread_limits()
+
+    def stage_threads(self, stage: str | None = None, parallel_stages: int = 1) -> int:
+        if stage in self.stage_limits:
+            return self.stage_limits[stage]
+        if settings.PIPELINE_STAGE_THREADS > 0:
+            return settings.PIPELINE_STAGE_THREADS
+        return max(1, self.task_threads // parallel_stages)
+
+    def affinity(self, process_index: int) -> list[int]:
+        """Ядра дочернего процесса с номером process_index."""
+        if self.task_threads * self.concurrency > len(self.cpus):
+            return self.cpus
+        start = (process_index % self.concurrency) * self.task_threads
+        return self.cpus[start:start + self.task_threads]
+
+
+def get_available_cpus() -> list[int]:
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if settings.CPU_BUDGET_CORES > 0:
+        cpus = cpus[:settings.CPU_BUDGET_CORES]
+    return cpus
+
+
+def set_worker_concurrency(concurrency: int):
+    global _worker_concurrency, _budget  # noqa: PLW0603
+    _worker_concurrency = max(1, concurrency or 1)
+    _budget = None
+
+
+def get_thread_budget() -> ThreadBudget:
+    global _budget  # noqa: PLW0603
+    if _budget is None:
+        _budget = ThreadBudget(get_available_cpus(), _worker_concurrency)
+    return _budget
+
+
+def _set_torch_threads(budget: ThreadBudget):
+    torch.set_num_threads(budget.intra_op_threads)
+    if torch.get_num_interop_threads() == budget.inter_op_threads:
+        return
+    try:
+        torch.set_num_interop_threads(budget.inter_op_threads)
+    except RuntimeError:
+        # Число inter-op потоков можно задать только до первой параллельной операции torch
+        logger.warning(
+            f"Не удалось установить inter-op потоки torch, текущее значение: {torch.get_num_interop_threads()}",
+        )
+
+
+def configure_process(
+        process_index: int | None = None,
+        stages: list[str] | None = None,
+        parallel_stages: int = 1,
+) -> ThreadBudget:
+    """
+    Применяет бюджет потоков к текущему процессу воркера и логирует итоговые значения.
+
+    Лимиты threadpoolctl, torch и OpenCV общие для всего процесса, поэтому
+    задаются один раз при старте, а не на время этапа: вход и выход из
+    лимита в параллельных потоках этапов перезаписывали бы значения друг друга.
+    Лимит этапа из STAGE_THREAD_LIMITS применяется к процессу, который
+    выполняет только этот этап; если parallel_stages этапов работают в потоках
+    одновременно, каждый поток OpenMP/BLAS получает их общую долю поровну.
+    """
+    budget = get_thread_budget()
+    if settings.WORKER_CPU_AFFINITY and process_index is not None and hasattr(os, "sched_setaffinity"):
+        cpus = budget.affinity(process_index)
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Процесс {process_index} закреплён за ядрами {cpus}")
+
+    _set_torch_threads(budget)
+    single_stage = stages[0] if stages is not None and len(stages) == 1 else None
+    blas_threads = budget.stage_threads(single_stage, parallel_stages)
+    # BLAS и OpenMP (KMeans в анализе цветов) не создают пулы больше доли процесса
+    threadpool_limits(limits=blas_threads)
+    cv2.setNumThreads(budget.task_threads)
+
+    pools = ", ".join(
+        f"{pool['internal_api']}={pool['num_threads']}" for pool in threadpool_info()
+    )
+    logger.info(
+        f"Бюджет потоков: ядер {len(budget.cpus)}, задач {budget.concurrency}, "
+        f"torch intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}, "
+        f"OpenCV {cv2.getNumThreads()}, OpenMP/BLAS {blas_threads}, пулы: {pools or 'нет'}",
+    )
+    return budget
@@ -1,104 +1,224 @@
 import logging
-from datetime import datetime
 from pathlib import Path
 
+from billiard.process import current_process
 from celery import Celery
+from celery import chord
+from celery import group
+from celery.signals import worker_init
+from celery.signals import worker_process_init
+from celery.utils.time import get_exponential_backoff_interval
+from config import CELERY_POOL_PREFORK
+from config import DOWNLOAD_MODE_MEMORY
+from config import PIPELINE_MODE_BATCH
+from config import PIPELINE_MODE_PIPELINE
+from config import PIPELINE_MODE_STAGES
+from config import STAGE_CLASSIFICATION
+from config import STAGE_COLOR
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import STAGE_QUEUES
+from config import get_worker_stages
 from config import settings
 from database import SessionLocal
+from ml_models import classifier
+from ml_models import ocr_model
+from ml_models import yolo_detector
+from services.batch_queue import enqueue_creative
 from services.model_loader import load_models
+from services.processing_service import commit_unless_deferred
+from services.processing_service import decode_image
+from services.processing_service import decode_image_buffer
+from services.processing_service import finalize_analysis_if_complete
 from services.processing_service import get_creative_and_analysis
-from services.processing_service import get_image_dimensions
-from services.processing_service import perform_classification
-from services.processing_service import perform_color_analysis
-from services.processing_service import perform_detection
-from services.processing_service import perform_ocr
+from services.processing_service import is_stage_completed
+from services.processing_service import snapshot_analysis
+from services.progress_store import clear_progress
+from services.progress_store import defer_commits
+from services.progress_store import is_deferred
+from services.progress_store import save_progress
+from services.stage_scheduler import get_parallel_stage_count
+from services.stage_scheduler import get_pending_stages
+from services.stage_scheduler import needs_image
+from services.stage_scheduler import perform_stage
+from services.stage_scheduler import run_analysis_stages
+from services.thread_budget import configure_process
+from services.thread_budget import set_worker_concurrency
+from utils.image_utils import DecodedImage
 from utils.minio_utils import download_file_from_minio
+from utils.minio_utils import download_file_to_buffer
 
 
 logger = logging.getLogger(__name__)
 
 celery = Celery("tasks", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+# При пуле потоков все задачи делят одну копию моделей процесса
+celery.conf.worker_pool = settings.CELERY_POOL
 
-logger.info("Инициализация ML моделей...")
-if not load_models():
-    logger.error("Критическая ошибка при копировании моделей. Worker может работать некорректно.")
+WORKER_STAGES = get_worker_stages()
+
+if settings.INFERENCE_SERVER:
+    # Модели держит inference_server.py, воркеру они не нужны
+    logger.info(f"Инференс через сервер {settings.INFERENCE_SOCKET_PATH}")
 else:
-    logger.info("ML модели готовы к использованию.")
+    logger.info(f"Инициализация ML моделей для этапов {WORKER_STAGES}...")
+    if not load_models(WORKER_STAGES):
+        logger.error("Критическая ошибка при копировании моделей. Worker может работать некорректно.")
+    else:
+        logger.info("ML модели готовы к использованию.")
+
+
+def _warmup_stage_models():
+    if settings.INFERENCE_SERVER:
+        return
+    try:
+        if STAGE_OCR in WORKER_STAGES:
+            ocr_model.get_ocr_reader()
+        if STAGE_DETECTION in WORKER_STAGES:
+            yolo_detector.get_yolo_model()
+        if STAGE_CLASSIFICATION in WORKER_STAGES:
+            classifier.warmup_bert_model()
+            logger.info(f"Модель BERT готова, время загрузки: {classifier.get_bert_load_duration():.2f} сек.")
+    except Exception:
+        logger.exception("Не удалось загрузить и прогреть модели при старте воркера.")
+
+
+@worker_process_init.connect
+def warmup_models(**_kwargs):
+    # Номер дочернего процесса prefork; у пула solo его нет
+    configure_process(getattr(current_process(), "index", None), WORKER_STAGES, get_parallel_stage_count())
+    # Загружаем модели один раз на процесс воркера, а не на каждый креатив
+    if STAGE_CLASSIFICATION not in WORKER_STAGES or settings.INFERENCE_SERVER:
+        return
+    try:
+        classifier.warmup_bert_model()
+        logger.info(f"Модель BERT готова, время загрузки: {classifier.get_bert_load_duration():.2f} сек.")
+    except Exception:
+        logger.exception("Не удалось загрузить и прогреть модель BERT при старте воркера.")
+
+
+@worker_init.connect
+def warmup_shared_models(sender, **_kwargs):
+    # Дочерние процессы prefork унаследуют concurrency и поделят ядра по ней
+    set_worker_concurrency(sender.concurrency)
+    # worker_process_init срабатывает только в дочерних процессах prefork.
+    # В пуле потоков модели загружаются один раз до приёма задач, а не гонкой первых потоков
+    if settings.CELERY_POOL == CELERY_POOL_PREFORK:
+        return
+    configure_process(stages=WORKER_STAGES, parallel_stages=get_parallel_stage_count())
+    logger.info(f"Пул {settings.CELERY_POOL}: загрузка общих моделей для этапов {WORKER_STAGES}")
+    _warmup_stage_models()
+
+
+def get_retry_countdown(retries: int) -> int:
+    """Задержка перед повтором: экспоненциальный рост со случайной добавкой (full jitter)."""
+    jitter = get_exponential_backoff_interval(
+        factor=settings.RETRY_BACKOFF_BASE,
+        retries=retries,
+        maximum=settings.RETRY_BACKOFF_MAX,
+        full_jitter=True,
+    )
+    # Случайная добавка разводит повторы задач, упавших одновременно на общем сбое MinIO или БД;
+    # вместе с базой задержка не превышает RETRY_BACKOFF_MAX
+    return min(settings.RETRY_BACKOFF_BASE + jitter, settings.RETRY_BACKOFF_MAX)
+
+
+def download_creative_image(creative, analysis, db) -> tuple[bool, DecodedImage | None, str | None]:
+    """Скачивает и декодирует изображение: (скачано, изображение, путь временного файла)."""
+    if settings.MINIO_DOWNLOAD_MODE == DOWNLOAD_MODE_MEMORY:
+        buffer = download_file_to_buffer(creative, analysis, db)
+        if buffer is None:
+            return False, None, None
+        with buffer:
+            return True, decode_image_buffer(buffer, creative.creative_id), None
+
+    # Скачиваем изображение из MinIO в локальную папку на период обработки
+    temp_local_path = f"/tmp/{creative.creative_id}.{creative.file_format}"
+    if not download_file_from_minio(creative, analysis, db, temp_local_path):
+        return False, None, temp_local_path
+    return True, decode_image(temp_local_path), temp_local_path
+
+
+def load_creative_image(creative, analysis, db) -> tuple[DecodedImage | None, str | None]:
+    """Скачивает и декодирует изображение; при ошибке она уже записана в анализ, изображение - None."""
+    downloaded, image, temp_local_path = download_creative_image(creative, analysis, db)
+    if not downloaded:
+        return None, temp_local_path
+    if image is None:
+        logger.error(f"[{creative.creative_id}] Ошибка чтения изображения")
+        analysis.overall_status = "ERROR"
+        analysis.error_message = "Некорректное изображение"
+        db.commit()
+        return None, temp_local_path
+
+    creative.image_width, creative.image_height = image.size
+    db.add(creative)
+    commit_unless_deferred(db)
+    return image, temp_local_path
+
+
+def save_task_error(db, creative_id: str, analysis, exc: Exception):
+    """Откатывает транзакцию задачи и записывает ошибку в анализ."""
+    # Результаты этапов, ещё не записанные в Postgres при отложенной записи,
+    # сохраняются вместе с ошибкой: повтор задачи продолжит с них
+    snapshot = snapshot_analysis(analysis) if analysis is not None and is_deferred(db) else {}
+    db.rollback()
+    _, analysis = get_creative_and_analysis(db, creative_id)
+    if analysis:
+        for field, value in snapshot.items():
+            setattr(analysis, field, value)
+        analysis.overall_status = "ERROR"
+        analysis.error_message = str(exc)
+        db.commit()
 
 
 @celery.task(bind=True, max_retries=3)
 def process_creative(self, creative_id: str):
     db = None
+    analysis = None
     temp_local_path = None
     try:
         db = SessionLocal()
+        # При PROGRESS_STORE статусы этапов идут в Redis, а строка анализа пишется один раз
+        defer_commits(db)
         logger.info(f"Начало обработки задачи {creative_id}")
 
         # Получаем креатив и его анализ
         creative, analysis = get_creative_and_analysis(db, creative_id)
 
         analysis.overall_status = "PROCESSING"
-        db.commit()
-
-        # Скачиваем изображение из MinIO в локальную папку на период обработки
-        temp_local_path = f"/tmp/{creative_id}.{creative.file_format}"
-        if not download_file_from_minio(creative, analysis, db, temp_local_path):
-            return {"status": "error", "creative_id": creative_id}
-
-        # Получаем размеры изображения
-        success, dimensions = get_image_dimensions(temp_local_path)
-        if not success:
-            logger.error(f"Ошибка чтения изображения {temp_local_path}: {dimensions}")
-            analysis.overall_status = "ERROR"
-            analysis.error_message = "Некорректное изображение"
+        if is_deferred(db):
+            save_progress(creative_id, {"overall_status": analysis.overall_status})
+        else:
             db.commit()
-            return {"status": "error", "creative_id": creative_id}
-
-        creative.image_width, creative.image_height = dimensions
-        db.add(creative)
-        db.commit()
-
-        # OCR
-        perform_ocr(creative_id, creative, analysis, db, temp_local_path)
-
-        # Детекция объектов
-        perform_detection(creative_id, analysis, db, temp_local_path)
 
-        # Классификация
-        perform_classification(creative_id, analysis, db)
+        # При повторе задачи этапы, успешные в прошлой попытке, не пересчитываются
+        stages = get_pending_stages(analysis)
+        image = None
+        if needs_image(stages):
+            # Скачиваем и декодируем изображение один раз: все этапы работают с одним массивом
+            image, temp_local_path = load_creative_image(creative, analysis, db)
+            if image is None:
+                return {"status": "error", "creative_id": creative_id}
 
-        # Анализ цветов
-        perform_color_analysis(
-            creative_id,
-            analysis,
-            db,
-            temp_local_path,
-        )
+        # OCR, детекция и анализ цветов параллельно, классификация после OCR и детекции
+        run_analysis_stages(creative_id, creative, analysis, db, image, stages)
 
         # Завершение
-        analysis.overall_status = "SUCCESS"
-        analysis.analysis_timestamp = datetime.utcnow()
-        analysis.total_duration = (
-                analysis.analysis_timestamp - analysis.ocr_started_at
-        ).total_seconds()
-        db.commit()
-        logger.info(f"[{creative_id}] Анализ завершен")
+        finalize_analysis_if_complete(db, creative_id)
 
     except Exception as exc:
         logger.error(f"[{creative_id}] Критическая ошибка: {exc}", exc_info=True)
         if db:
-            db.rollback()
-            _, analysis = get_creative_and_analysis(creative_id, db)
-            if analysis:
-                analysis.overall_status = "ERROR"
-                analysis.error_message = str(exc)
-                db.commit()
-            raise self.retry(exc=exc, countdown=5) from exc
+            save_task_error(db, creative_id, analysis, exc)
+            raise self.retry(exc=exc, countdown=get_retry_countdown(self.request.retries)) from exc
     else:
         return {"status": "success", "creative_id": creative_id}
 
     finally:
         if db:
+            if is_deferred(db):
+                clear_progress(creative_id)
             db.close()
         # Удаляем временный файл
         if temp_local_path and Path(temp_local_path).exists():
@@ -107,3 +227,110 @@ def process_creative(self, creative_id: str):
                 logger.debug(f"[{creative_id}] Удален временный файл {temp_local_path}")
             except OSError as e:
                 logger.warning(f"[{creative_id}] Не удалось удалить временный файл {temp_local_path}: {e}")
+
+
+def _process_stage(task, stage: str, creative_id: str):
+    """Выполняет один этап в режиме PIPELINE_MODE=stages."""
+    db = None
+    temp_local_path = None
+    try:
+        db = SessionLocal()
+        logger.info(f"[{creative_id}] Начало задачи этапа {stage}")
+        creative, analysis = get_creative_and_analysis(db, creative_id)
+        if is_stage_completed(analysis, stage):
+            # Повтор задачи после успешного этапа, например при сбое на finalize
+            logger.info(f"[{creative_id}] Этап {stage} уже выполнен, пропускаем")
+            finalize_analysis_if_complete(db, creative_id)
+            return {"status": "skipped", "creative_id": creative_id, "stage": stage}
+
+        image = None
+        # Классификации нужны только результаты OCR и детекции из БД
+        if needs_image([stage]):
+            image, temp_local_path = load_creative_image(creative, analysis, db)
+            if image is None:
+                return {"status": "error", "creative_id": creative_id, "stage": stage}
+
+        perform_stage(stage, creative_id, creative, analysis, db, image)
+        finalize_analysis_if_complete(db, creative_id)
+
+    except Exception as exc:
+        logger.error(f"[{creative_id}] Критическая ошибка на этапе {stage}: {exc}", exc_info=True)
+        if db:
+            save_task_error(db, creative_id, None, exc)
+            raise task.retry(exc=exc, countdown=get_retry_countdown(task.request.retries)) from exc
+    else:
+        return {"status": "success", "creative_id": creative_id, "stage": stage}
+
+    finally:
+        if db:
+            db.close()
+        if temp_local_path and Path(temp_local_path).exists():
+            try:
+                Path(temp_local_path).unlink()
+            except OSError as e:
+                logger.warning(f"[{creative_id}] Не удалось удалить временный файл {temp_local_path}: {e}")
+
+
+@celery.task(bind=True, max_retries=3)
+def ocr_stage(self, creative_id: str):
+    return _process_stage(self, STAGE_OCR, creative_id)
+
+
+@celery.task(bind=True, max_retries=3)
+def detection_stage(self, creative_id: str):
+    return _process_stage(self, STAGE_DETECTION, creative_id)
+
+
+@celery.task(bind=True, max_retries=3)
+def classification_stage(self, creative_id: str):
+    return _process_stage(self, STAGE_CLASSIFICATION, creative_id)
+
+
+@celery.task(bind=True, max_retries=3)
+def color_stage(self, creative_id: str):
+    return _process_stage(self, STAGE_COLOR, creative_id)
+
+
+STAGE_TASKS = {
+    STAGE_OCR: ocr_stage,
+    STAGE_DETECTION: detection_stage,
+    STAGE_CLASSIFICATION: classification_stage,
+    STAGE_COLOR: color_stage,
+}
+
+
+def build_stage_workflow(creative_id: str):
+    """Граф этапов: chord(OCR, детекция) -> классификация, параллельно с ним анализ цветов."""
+
+    def stage_signature(stage: str):
+        return STAGE_TASKS[stage].si(creative_id).set(queue=STAGE_QUEUES[stage])
+
+    return group(
+        chord(
+            [stage_signature(STAGE_OCR), stage_signature(STAGE_DETECTION)],
+            stage_signature(STAGE_CLASSIFICATION),
+        ),
+        stage_signature(STAGE_COLOR),
+    )
+
+
+def _prepare_analysis(creative_id: str):
+    # Строка анализа создаётся до запуска этапов, чтобы параллельные задачи не создали дубликаты
+    db = SessionLocal()
+    try:
+        _, analysis = get_creative_and_analysis(db, creative_id)
+        analysis.overall_status = "PROCESSING"
+        db.commit()
+    finally:
+        db.close()
+
+
+def dispatch_creative(creative_id: str):
+    """Ставит креатив в обработку согласно PIPELINE_MODE."""
+    if settings.PIPELINE_MODE == PIPELINE_MODE_STAGES:
+        _prepare_analysis(creative_id)
+        return build_stage_workflow(creative_id).apply_async()
+    if settings.PIPELINE_MODE in (PIPELINE_MODE_BATCH, PIPELINE_MODE_PIPELINE):
+        _prepare_analysis(creative_id)
+        return enqueue_creative(creative_id)
+    return process_creative.delay(creative_id)
@@ -0,0 +1,148 @@
+import tempfile
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import numpy as np
+from config import STAGE_COLOR
+from database import Base
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from services import batch_processing_service
+from services.stage_deadline import StageBusyError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from utils.image_utils import DecodedImage
+
+
+CREATIVE_IDS = ["creative-1", "creative-2"]
+IMAGE_WIDTH = 40
+IMAGE_HEIGHT = 20
+TOPIC_CONFIDENCE = 0.9
+BUSY_TIMEOUT = 10.0
+
+
+class TestProcessCreativeBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'test.db'}")
+        Base.metadata.create_all(engine)
+        self.session_factory = sessionmaker(bind=engine)
+
+        db = self.session_factory()
+        for creative_id in CREATIVE_IDS:
+            db.add(Creative(creative_id=creative_id, file_format="png"))
+            db.add(CreativeAnalysis(creative_id=creative_id, overall_status="PROCESSING"))
+        db.commit()
+        db.close()
+
+        self.image = DecodedImage(np.zeros((IMAGE_HEIGHT, IMAGE_WIDTH, 3), dtype=np.uint8))
+        self.classify_calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _fake_classify(self, items):
+        self.classify_calls.append(items)
+        return [(f"topic-{text}", TOPIC_CONFIDENCE) for text, _ in items]
+
+    @staticmethod
+    def _fake_color(_creative_id, analysis, db, _image):
+        analysis.color_analysis_status = "SUCCESS"
+        db.commit()
+
+    def _patch_models(self, ocr_batch, detection_batch) -> ExitStack:
+        module = batch_processing_service
+        stack = ExitStack()
+        stack.enter_context(patch.object(module, "SessionLocal", self.session_factory))
+        stack.enter_context(patch.object(module, "download_file_to_buffer", return_value=MagicMock()))
+        stack.enter_context(patch.object(module, "decode_image_buffer", return_value=self.image))
+        stack.enter_context(patch.object(module.ocr_model, "extract_text_and_blocks_batch", side_effect=ocr_batch))
+        stack.enter_context(patch.object(
+            module.ocr_model, "extract_text_and_blocks", return_value=("single", []),
+        ))
+        stack.enter_context(patch.object(
+            module.yolo_detector, "detect_objects_batch", side_effect=detection_batch,
+        ))
+        stack.enter_context(patch.object(module.yolo_detector, "detect_objects", return_value=[]))
+        stack.enter_context(patch.object(module.classifier, "classify_creatives", side_effect=self._fake_classify))
+        stack.enter_context(patch.object(module, "perform_color_analysis", side_effect=self._fake_color))
+        stack.enter_context(patch.object(module.settings, "CLASSIFICATION_CASCADE", False))
+        return stack
+
+    def _analyses(self) -> dict[str, CreativeAnalysis]:
+        db = self.session_factory()
+        self.addCleanup(db.close)
+        return {analysis.creative_id: analysis for analysis in db.query(CreativeAnalysis)}
+
+    def test_results_written_per_creative(self):
+        def ocr_batch(images):
+            return [(f"text{i}", []) for i in range(len(images))]
+
+        def detection_batch(images, **_kwargs):
+            return [[{"class": "clock", "confidence": 0.5, "bbox": [0, 0, 1, 1]}] for _ in images]
+
+        with self._patch_models(ocr_batch, detection_batch):
+            batch_processing_service.process_creative_batch(CREATIVE_IDS)
+
+        # BERT вызывается один раз на всю пачку
+        assert len(self.classify_calls) == 1
+        assert len(self.classify_calls[0]) == len(CREATIVE_IDS)
+
+        analyses = self._analyses()
+        for i, creative_id in enumerate(CREATIVE_IDS):
+            analysis = analyses[creative_id]
+            assert analysis.overall_status == "SUCCESS"
+            assert analysis.ocr_text == f"text{i}"
+            assert analysis.main_topic == f"topic-text{i}"
+            assert analysis.detected_objects[0]["class"] == "clock"
+            assert analysis.ocr_duration is not None
+
+        db = self.session_factory()
+        self.addCleanup(db.close)
+        creative = db.query(Creative).first()
+        assert (creative.image_width, creative.image_height) == (IMAGE_WIDTH, IMAGE_HEIGHT)
+
+    def test_falls_back_to_single_calls(self):
+        def failing_batch(_images, **_kwargs):
+            msg = "batch failed"
+            raise RuntimeError(msg)
+
+        with self._patch_models(failing_batch, failing_batch):
+            batch_processing_service.process_creative_batch(CREATIVE_IDS)
+
+        for analysis in self._analyses().values():
+            assert analysis.ocr_status == "SUCCESS"
+            assert analysis.ocr_text == "single"
+            assert analysis.detection_status == "SUCCESS"
+            assert analysis.overall_status == "SUCCESS"
+
+
+    def test_busy_color_stage_requeues_creative(self):
+        def ocr_batch(images):
+            return [("text", []) for _ in images]
+
+        def detection_batch(images, **_kwargs):
+            return [[] for _ in images]
+
+        def color(creative_id, analysis, db, image):
+            if creative_id == CREATIVE_IDS[0]:
+                raise StageBusyError(STAGE_COLOR, BUSY_TIMEOUT)
+            self._fake_color(creative_id, analysis, db, image)
+
+        with self._patch_models(ocr_batch, detection_batch) as stack:
+            stack.enter_context(patch.object(batch_processing_service, "perform_color_analysis", side_effect=color))
+            enqueue = stack.enter_context(patch.object(batch_processing_service, "enqueue_creative"))
+            batch_processing_service.process_creative_batch(CREATIVE_IDS)
+
+        # Креатив без анализа цветов возвращается в очередь, а не завершается с неполным результатом
+        enqueue.assert_called_once_with(CREATIVE_IDS[0])
+        analyses = self._analyses()
+        assert analyses[CREATIVE_IDS[0]].overall_status == "PROCESSING"
+        assert analyses[CREATIVE_IDS[1]].overall_status == "SUCCESS"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from services.batch_queue import BATCH_QUEUE_KEY
+from services.batch_queue import ack_creatives
+from services.batch_queue import pop_batch
+from services.batch_queue import requeue_unacked
+
+
+MAX_SIZE = 4
+MAX_WAIT_MS = 200
+WORKER_ID = "worker-1"
+PROCESSING_KEY = f"creatives:batch_processing:{WORKER_ID}"
+LEFTOVER_COUNT = 2
+
+
+class TestPopBatch(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("services.batch_queue.get_redis_client")
+        self.client = MagicMock()
+        patcher.start().return_value = self.client
+        self.addCleanup(patcher.stop)
+        worker_patcher = patch("services.batch_queue.settings.BATCH_WORKER_ID", WORKER_ID)
+        worker_patcher.start()
+        self.addCleanup(worker_patcher.stop)
+        self.pipeline = self.client.pipeline.return_value
+
+    def test_empty_queue(self):
+        self.client.blmove.return_value = None
+
+        assert pop_batch(MAX_SIZE, MAX_WAIT_MS) == []
+        self.client.pipeline.assert_not_called()
+
+    def test_fills_batch_up_to_max_size(self):
+        self.client.blmove.return_value = b"c1"
+        self.pipeline.execute.return_value = [b"c2", b"c3", b"c4"]
+
+        assert pop_batch(MAX_SIZE, MAX_WAIT_MS) == ["c1", "c2", "c3", "c4"]
+        # Креативы не удаляются, а переносятся в список обработки воркера
+        self.client.blmove.assert_called_once_with(BATCH_QUEUE_KEY, PROCESSING_KEY, 5, "RIGHT", "LEFT")
+        assert self.pipeline.lmove.call_count == MAX_SIZE - 1
+        self.pipeline.lmove.assert_called_with(BATCH_QUEUE_KEY, PROCESSING_KEY, "RIGHT", "LEFT")
+
+    def test_waits_for_more_items_until_deadline(self):
+        self.client.blmove.side_effect = [b"c1", b"c2", None]
+        self.pipeline.execute.return_value = [None, None]
+
+        assert pop_batch(MAX_SIZE, MAX_WAIT_MS) == ["c1", "c2"]
+        # Добор ждёт не дольше окна max_wait_ms
+        for call in self.client.blmove.call_args_list[1:]:
+            assert 0 < call.args[2] <= MAX_WAIT_MS / 1000
+
+    def test_returns_partial_batch_after_deadline(self):
+        self.client.blmove.return_value = b"c1"
+        self.pipeline.execute.return_value = [None, None, None]
+
+        assert pop_batch(MAX_SIZE, 0) == ["c1"]
+        assert self.client.blmove.call_count == 1
+
+    def test_ack_removes_creatives_from_processing_list(self):
+        ack_creatives(["c1", "c2"])
+
+        assert [call.args for call in self.pipeline.lrem.call_args_list] == [
+            (PROCESSING_KEY, 1, "c1"),
+            (PROCESSING_KEY, 1, "c2"),
+        ]
+        self.pipeline.execute.assert_called_once()
+
+    def test_requeue_returns_unacked_creatives(self):
+        # Очередь пополняется слева и читается справа; взятые кладутся в список обработки слева
+        lists = {BATCH_QUEUE_KEY: ["c4", "c3"], PROCESSING_KEY: ["c2", "c1"]}
+
+        def lmove(source, destination, source_side, destination_side):
+            if not lists[source]:
+                return None
+            item = lists[source].pop(0 if source_side == "LEFT" else -1)
+            if destination_side == "LEFT":
+                lists[destination].insert(0, item)
+            else:
+                lists[destination].append(item)
+            return item
+
+        self.client.lmove.side_effect = lmove
+
+        assert requeue_unacked() == LEFTOVER_COUNT
+        # Незавершённые креативы заберут первыми и в том же порядке, в каком их брали
+        assert lists[BATCH_QUEUE_KEY] == ["c4", "c3", "c2", "c1"]
+        assert lists[PROCESSING_KEY] == []
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from config import NUM_LABELS
+from ml_models.classifier import MultiModalBertClassifier
+from ml_models.preprocessing import NUM_COCO
+from transformers import BertConfig
+from transformers import BertModel
+
+
+ort = pytest.importorskip("onnxruntime")
+
+from ml_models.bert_onnx import OnnxBertClassifier  # noqa: E402
+from ml_models.bert_onnx import export_bert_to_onnx  # noqa: E402
+
+
+LOGITS_ATOL = 1e-4
+VOCAB_SIZE = 100
+
+
+def _build_tiny_classifier(model_dir: Path) -> MultiModalBertClassifier:
+    config = BertConfig(
+        vocab_size=VOCAB_SIZE,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+    )
+    BertModel(config).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    model = MultiModalBertClassifier(
+        model_name=str(model_dir),
+        num_numeric_features=NUM_COCO,
+        num_labels=NUM_LABELS,
+        hidden_dim=16,
+    )
+    model.eval()
+    return model
+
+
+class TestBertOnnx(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.model = _build_tiny_classifier(self.tmp_path / "tiny_bert")
+        self.onnx_path = export_bert_to_onnx(self.model, self.tmp_path / "tiny_bert.onnx")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_onnx_logits_match_pytorch(self):
+        onnx_model = OnnxBertClassifier(self.onnx_path)
+        generator = torch.Generator().manual_seed(42)
+
+        # Разные размеры батча и длины последовательностей (динамические оси)
+        for batch_size, seq_len in [(1, 5), (3, 12), (4, 40)]:
+            input_ids = torch.randint(1, VOCAB_SIZE, (batch_size, seq_len), generator=generator)
+            attention_mask = torch.ones((batch_size, seq_len), dtype=torch.long)
+            attention_mask[0, seq_len // 2:] = 0
+            yolo_vec = torch.rand((batch_size, NUM_COCO), generator=generator)
+
+            with torch.no_grad():
+                torch_logits = self.model(input_ids, attention_mask, yolo_vec)['logits']
+            onnx_logits = onnx_model.forward(input_ids, attention_mask, yolo_vec)['logits']
+
+            assert onnx_logits.shape == (batch_size, NUM_LABELS)
+            np.testing.assert_allclose(onnx_logits.numpy(), torch_logits.numpy(), atol=LOGITS_ATOL)
+
+
+if __name__ == "__main__":
+    unittest.main()
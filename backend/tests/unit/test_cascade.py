@@ -0,0 +1,56 @@
+import unittest
+
+from ml_models.cascade import cascade_topic
+from ml_models.cascade import text_topics
+
+
+CONF_THRESHOLD = 0.8
+CLOCK_CONF = 0.92
+LOW_CONF = 0.5
+PERSON_CONF = 0.7
+
+
+class TestCascade(unittest.TestCase):
+    def test_text_topics(self):
+        assert text_topics("НАРУЧНЫЕ ЧАСЫ со скидкой") == {'clocks'}
+        assert text_topics("Кружка и часы") == {'cups', 'clocks'}
+        assert text_topics("") == set()
+
+    def test_decisive_detection_without_text(self):
+        detected = [{'class': 'clock', 'confidence': CLOCK_CONF}]
+        assert cascade_topic("", detected, CONF_THRESHOLD) == ('clocks', CLOCK_CONF)
+
+    def test_decisive_detection_with_agreeing_text(self):
+        detected = [
+            {'class': 'clock', 'confidence': CLOCK_CONF},
+            {'class': 'person', 'confidence': PERSON_CONF},
+        ]
+        assert cascade_topic("Часы в подарок", detected, CONF_THRESHOLD) == ('clocks', CLOCK_CONF)
+
+    def test_disagreeing_text_falls_back(self):
+        detected = [{'class': 'clock', 'confidence': CLOCK_CONF}]
+        assert cascade_topic("Кружка с логотипом", detected, CONF_THRESHOLD) is None
+
+    def test_neutral_text_falls_back(self):
+        detected = [{'class': 'clock', 'confidence': CLOCK_CONF}]
+        assert cascade_topic("Скидки до конца недели", detected, CONF_THRESHOLD) is None
+
+    def test_ambiguous_detections_fall_back(self):
+        detected = [
+            {'class': 'clock', 'confidence': CLOCK_CONF},
+            {'class': 'cup', 'confidence': LOW_CONF},
+        ]
+        assert cascade_topic("", detected, CONF_THRESHOLD) is None
+
+    def test_low_confidence_falls_back(self):
+        detected = [{'class': 'clock', 'confidence': LOW_CONF}]
+        assert cascade_topic("", detected, CONF_THRESHOLD) is None
+
+    def test_no_topic_detection_falls_back(self):
+        assert cascade_topic("", [], CONF_THRESHOLD) is None
+        detected = [{'class': 'person', 'confidence': CLOCK_CONF}]
+        assert cascade_topic("", detected, CONF_THRESHOLD) is None
+
+
+if __name__ == '__main__':
+    unittest.main()
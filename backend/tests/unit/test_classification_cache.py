@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import numpy as np
+from ml_models import classification_cache
+from ml_models.preprocessing import NUM_COCO
+
+
+CACHE_SIZE = 2
+CACHE_TTL = 60
+CUP_CONF = 0.9
+
+
+class TestClassificationCache(unittest.TestCase):
+    def setUp(self):
+        classification_cache.clear()
+        self.settings_patcher = patch("ml_models.classification_cache.settings")
+        self.mock_settings = self.settings_patcher.start()
+        self.mock_settings.CLASSIFICATION_CACHE_SIZE = CACHE_SIZE
+        self.mock_settings.CLASSIFICATION_CACHE_TTL = CACHE_TTL
+        self.mock_settings.CLASSIFICATION_CACHE_REDIS = False
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+        classification_cache.clear()
+
+    def test_make_cache_key_quantizes_vector(self):
+        vector = np.zeros(NUM_COCO)
+        vector[0] = 0.901
+        similar = vector.copy()
+        similar[0] = 0.899
+        other = vector.copy()
+        other[0] = 0.5
+
+        key = classification_cache.make_cache_key("кружка", vector, "v1")
+        assert key == classification_cache.make_cache_key("кружка", similar, "v1")
+        assert key != classification_cache.make_cache_key("кружка", other, "v1")
+        assert key != classification_cache.make_cache_key("кружка", vector, "v2")
+        assert key != classification_cache.make_cache_key("часы", vector, "v1")
+
+    def test_lru_eviction_and_stats(self):
+        classification_cache.put("a", ("cups", CUP_CONF))
+        classification_cache.put("b", ("ties", CUP_CONF))
+        assert classification_cache.get("a") == ("cups", CUP_CONF)
+        classification_cache.put("c", ("bags", CUP_CONF))  # вытесняет "b"
+
+        assert classification_cache.get("b") is None
+        assert classification_cache.get("c") == ("bags", CUP_CONF)
+        stats = classification_cache.get_cache_stats()
+        assert stats["local_hits"] == CACHE_SIZE
+        assert stats["misses"] == 1
+        assert stats["size"] == CACHE_SIZE
+
+    @patch("ml_models.classification_cache.time.monotonic")
+    def test_ttl_expiration(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        classification_cache.put("a", ("cups", CUP_CONF))
+        mock_monotonic.return_value = CACHE_TTL + 1.0
+        assert classification_cache.get("a") is None
+
+    def test_disabled_cache(self):
+        self.mock_settings.CLASSIFICATION_CACHE_SIZE = 0
+        classification_cache.put("a", ("cups", CUP_CONF))
+        assert classification_cache.get("a") is None
+        assert classification_cache.get_cache_stats()["misses"] == 0
+
+    @patch("ml_models.classification_cache._redis_client", new_callable=MagicMock)
+    def test_redis_tier(self, client):
+        self.mock_settings.CLASSIFICATION_CACHE_REDIS = True
+        client.get.return_value = b'["clocks", 0.9]'
+
+        assert classification_cache.get("a") == ("clocks", CUP_CONF)
+        # Повторный запрос обслуживается из памяти процесса
+        assert classification_cache.get("a") == ("clocks", CUP_CONF)
+        client.get.assert_called_once_with(classification_cache.CACHE_KEY_PREFIX + "a")
+
+        classification_cache.put("b", ("cups", CUP_CONF))
+        client.set.assert_called_once()
+        stats = classification_cache.get_cache_stats()
+        assert stats["redis_hits"] == 1
+        assert stats["local_hits"] == 1
+        # Счётчики не отправляются в Redis на каждый запрос, а копятся до flush_stats
+        client.hincrby.assert_not_called()
+        client.pipeline.assert_not_called()
+        classification_cache.flush_stats()
+        pipeline = client.pipeline.return_value
+        assert sorted(call.args for call in pipeline.hincrby.call_args_list) == [
+            (classification_cache.CACHE_STATS_KEY, "local_hits", 1),
+            (classification_cache.CACHE_STATS_KEY, "redis_hits", 1),
+        ]
+
+
+if __name__ == "__main__":
+    unittest.main()
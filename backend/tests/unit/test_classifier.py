@@ -1,17 +1,46 @@
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import numpy as np
 import torch
 from config import NUM_LABELS
+from ml_models import classification_cache
+from ml_models.classifier import MultiModalBertClassifier
 from ml_models.classifier import classify_creative
+from ml_models.classifier import classify_creatives
+from ml_models.classifier import get_bert_load_duration
 from ml_models.classifier import get_bert_model_and_tokenizer
+from ml_models.classifier import load_bert_config
+from ml_models.classifier import load_torch_bert_model
+from ml_models.classifier import predict_topic
+from ml_models.classifier import quantize_bert_model
+from ml_models.classifier import reload_bert_model_and_tokenizer
+from ml_models.classifier import unload_bert_model_and_tokenizer
 from ml_models.preprocessing import NUM_COCO
+from safetensors.torch import save_file
+from transformers import BertConfig
 
 
+EXPECTED_LOAD_CALLS = 2
+EXPECTED_BATCH_CALLS = 2
+QUANTIZED_ATOL = 0.05
+RUBERT_HIDDEN_SIZE = 768
+EXPECTED_CACHE_HITS = 2
+EXPECTED_CACHE_MISSES = 2
+
 class TestClassifier(unittest.TestCase):
+    def setUp(self):
+        unload_bert_model_and_tokenizer()
+        classification_cache.clear()
+
+    def tearDown(self):
+        unload_bert_model_and_tokenizer()
+
     @patch("ml_models.classifier.settings")
+    @patch("ml_models.classifier.load_bert_config")
     @patch("ml_models.classifier.AutoTokenizer")
     @patch("ml_models.classifier.torch.load")
     @patch("ml_models.classifier.pathlib.Path.exists")
@@ -22,13 +51,17 @@ class TestClassifier(unittest.TestCase):
         mock_path_exists,
         mock_torch_load,
         mock_auto_tokenizer,
+        mock_load_bert_config,
         mock_settings,
     ):
         # Настройка моков
         mock_settings.MODEL_CACHE_DIR = "/fake/cache/dir"
         mock_settings.BERT_MODEL_PATH = "fake_model.pt"
         mock_settings.BERT_TOKENIZER_NAME = "fake-tokenizer"
+        mock_settings.BERT_TOKENIZER_DIR = "bert_tokenizer"
         mock_settings.DEVICE = "cpu"
+        mock_settings.BERT_BACKEND = "torch"
+        mock_settings.BERT_QUANTIZE = False
         mock_settings.NUM_COCO = NUM_COCO
         mock_settings.NUM_LABELS = NUM_LABELS
 
@@ -37,6 +70,9 @@ class TestClassifier(unittest.TestCase):
         mock_tokenizer = MagicMock()
         mock_auto_tokenizer.from_pretrained.return_value = mock_tokenizer
 
+        mock_bert_config = MagicMock(name="BertConfig")
+        mock_load_bert_config.return_value = mock_bert_config
+
         # Имитация загрузки state_dict
         mock_state_dict = {"fake_key": "fake_value"}
         mock_torch_load.return_value = mock_state_dict
@@ -48,15 +84,19 @@ class TestClassifier(unittest.TestCase):
         model, tokenizer = get_bert_model_and_tokenizer()
 
         # Проверяем вызовы
-        mock_auto_tokenizer.from_pretrained.assert_called_once_with("fake-tokenizer")
-        mock_path_exists.assert_called_once()
+        # Токенизатор берётся из локального каталога без обращения к HF Hub
+        mock_auto_tokenizer.from_pretrained.assert_called_once_with(
+            Path("/fake/cache/dir/bert_tokenizer"), local_files_only=True,
+        )
+        mock_path_exists.assert_called()
         mock_torch_load.assert_called_once()
+        # Модель собирается из конфига, без from_pretrained базовых весов
         mock_model_class.assert_called_once_with(
-            model_name="fake-tokenizer",
             num_numeric_features=NUM_COCO,
             num_labels=NUM_LABELS,
             dropout=0.3,
             hidden_dim=256,
+            bert_config=mock_bert_config,
         )
         mock_model_instance.load_state_dict.assert_called_once_with(mock_state_dict)
         mock_model_instance.to.assert_called()
@@ -65,6 +105,80 @@ class TestClassifier(unittest.TestCase):
         assert model == mock_model_instance
         assert tokenizer == mock_tokenizer
 
+    @patch("ml_models.classifier.get_bert_tokenizer_dir")
+    def test_load_bert_config_bundled(self, mock_tokenizer_dir):
+        mock_tokenizer_dir.return_value = Path("/nonexistent/bert_tokenizer")
+
+        config = load_bert_config()
+
+        assert config.model_type == "bert"
+        assert config.hidden_size == RUBERT_HIDDEN_SIZE
+
+    @patch("ml_models.classifier.settings")
+    @patch("ml_models.classifier.load_bert_config")
+    def test_load_torch_bert_model_from_safetensors(self, mock_load_bert_config, mock_settings):
+        tiny_config = BertConfig(
+            vocab_size=50, hidden_size=16, num_hidden_layers=1, num_attention_heads=2, intermediate_size=32,
+        )
+        mock_load_bert_config.return_value = tiny_config
+        torch.manual_seed(0)
+        reference = MultiModalBertClassifier(bert_config=tiny_config).eval()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_file(reference.state_dict(), Path(tmp_dir) / "tiny.safetensors")
+            mock_settings.MODEL_CACHE_DIR = tmp_dir
+            mock_settings.BERT_MODEL_PATH = "tiny.safetensors"
+            model = load_torch_bert_model(torch.device("cpu"))
+
+            input_ids = torch.randint(1, 50, (2, 6))
+            attention_mask = torch.ones((2, 6), dtype=torch.long)
+            yolo_vec = torch.rand((2, NUM_COCO))
+            with torch.no_grad():
+                expected = reference(input_ids, attention_mask, yolo_vec)['logits']
+                actual = model(input_ids, attention_mask, yolo_vec)['logits']
+
+        torch.testing.assert_close(actual, expected)
+
+    @patch("ml_models.classifier.load_bert_model_and_tokenizer")
+    def test_get_bert_model_and_tokenizer_cached(self, mock_load):
+        mock_model = MagicMock(name="MockModel")
+        mock_tokenizer = MagicMock(name="MockTokenizer")
+        mock_load.return_value = (mock_model, mock_tokenizer)
+
+        first = get_bert_model_and_tokenizer()
+        second = get_bert_model_and_tokenizer()
+
+        # Модель грузится один раз на процесс
+        mock_load.assert_called_once()
+        assert first == (mock_model, mock_tokenizer)
+        assert second == first
+        assert get_bert_load_duration() is not None
+
+    @patch("ml_models.classifier.load_bert_model_and_tokenizer")
+    def test_reload_bert_model_and_tokenizer(self, mock_load):
+        old_pair = (MagicMock(name="OldModel"), MagicMock(name="OldTokenizer"))
+        new_pair = (MagicMock(name="NewModel"), MagicMock(name="NewTokenizer"))
+        mock_load.side_effect = [old_pair, new_pair]
+
+        assert get_bert_model_and_tokenizer() == old_pair
+        assert reload_bert_model_and_tokenizer() == new_pair
+        assert get_bert_model_and_tokenizer() == new_pair
+        assert mock_load.call_count == EXPECTED_LOAD_CALLS
+
+    def test_quantize_bert_model(self):
+        torch.manual_seed(0)
+        model = torch.nn.Sequential(torch.nn.Linear(NUM_COCO, 16), torch.nn.ReLU(), torch.nn.Linear(16, NUM_LABELS))
+        model.eval()
+        inputs = torch.rand((4, NUM_COCO))
+
+        quantized = quantize_bert_model(model)
+
+        # Linear-слои заменены на динамически квантованные
+        assert "quantized" in type(quantized[0]).__module__
+        assert "quantized" in type(quantized[2]).__module__
+        with torch.no_grad():
+            np.testing.assert_allclose(quantized(inputs).numpy(), model(inputs).numpy(), atol=QUANTIZED_ATOL)
+
     @patch("ml_models.classifier.get_bert_model_and_tokenizer")  # Мокаем методы
     @patch("ml_models.classifier.clean_text_for_bert")
     @patch("ml_models.classifier.yolo_to_vector_for_bert")
@@ -128,6 +242,88 @@ class TestClassifier(unittest.TestCase):
         assert confidence == 0.0
         mock_get_model_tokenizer.assert_called_once()
 
+    @patch("ml_models.classifier.get_bert_model_and_tokenizer")
+    def test_classify_creatives_batch(self, mock_get_model_tokenizer):
+        mock_model = MagicMock(name="MockModel")
+        mock_tokenizer = MagicMock(name="MockTokenizer")
+        mock_get_model_tokenizer.return_value = (mock_model, mock_tokenizer)
+
+        def fake_tokenize(texts, **_kwargs):
+            return {
+                "input_ids": torch.ones((len(texts), 4), dtype=torch.long),
+                "attention_mask": torch.ones((len(texts), 4), dtype=torch.long),
+            }
+
+        def fake_forward(input_ids, attention_mask, yolo_vec):  # noqa: ARG001
+            # Логиты повторяют первые 5 координат вектора YOLO
+            return {"logits": yolo_vec[:, :NUM_LABELS]}
+
+        mock_tokenizer.side_effect = fake_tokenize
+        mock_model.forward.side_effect = fake_forward
+
+        batch = [
+            ("галстук шелковый классика подарок", [{"class": "person", "confidence": 0.9}]),
+            ("", [{"class": "bicycle", "confidence": 0.8}]),
+            ("очень длинный текст про керамическую кружку", [{"class": "car", "confidence": 0.7}]),
+        ]
+        results = classify_creatives(batch, batch_size=2)
+
+        # Порядок результатов совпадает с порядком входа, несмотря на сортировку по длине
+        assert [topic for topic, _ in results] == ["ties", "cups", "cutlery"]
+        assert all(0.0 <= conf <= 1.0 for _, conf in results)
+        assert mock_model.forward.call_count == EXPECTED_BATCH_CALLS
+        for call in mock_tokenizer.call_args_list:
+            assert call.kwargs["padding"] == "longest"
+
+    @patch("ml_models.classifier.get_bert_model_and_tokenizer")
+    def test_classify_creative_uses_cache(self, mock_get_model_tokenizer):
+        mock_model = MagicMock(name="MockModel")
+        mock_tokenizer = MagicMock(name="MockTokenizer")
+        mock_tokenizer.return_value = {
+            "input_ids": torch.ones((1, 4), dtype=torch.long),
+            "attention_mask": torch.ones((1, 4), dtype=torch.long),
+        }
+        mock_model.forward.return_value = {"logits": torch.tensor([[0.1, 0.9, 0.2, 0.3, 0.4]])}
+        mock_get_model_tokenizer.return_value = (mock_model, mock_tokenizer)
+
+        detected_objects = [{"class": "cup", "confidence": 0.9}]
+        first = classify_creative("Кружка в подарок!", detected_objects)
+        # Тот же текст после очистки и тот же вектор YOLO с точностью до сотых
+        second = classify_creative("кружка   в подарок", [{"class": "cup", "confidence": 0.901}])
+        classify_creatives([("кружка в подарок", detected_objects), ("другой текст", [])])
+
+        assert first == second
+        assert mock_model.forward.call_count == EXPECTED_BATCH_CALLS
+        stats = classification_cache.get_cache_stats()
+        assert stats["local_hits"] == EXPECTED_CACHE_HITS
+        assert stats["misses"] == EXPECTED_CACHE_MISSES
+
+    @patch("ml_models.classifier.get_bert_model_and_tokenizer")
+    def test_predict_topic_uses_given_model(self, mock_get_model_tokenizer):
+        mock_model = MagicMock(name="MockModel")
+        mock_tokenizer = MagicMock(name="MockTokenizer")
+        mock_tokenizer.return_value = {
+            "input_ids": torch.ones((1, 4), dtype=torch.long),
+            "attention_mask": torch.ones((1, 4), dtype=torch.long),
+        }
+        mock_model.forward.return_value = {"logits": torch.tensor([[0.1, 0.9, 0.2, 0.3, 0.4]])}
+
+        topic, confidence = predict_topic(mock_model, mock_tokenizer, "Кружка в подарок!", [])
+
+        assert topic == "cups"
+        assert 0.0 < confidence <= 1.0
+        mock_get_model_tokenizer.assert_not_called()
+        assert classification_cache.get_cache_stats()["misses"] == 0
+
+    @patch("ml_models.classifier.get_bert_model_and_tokenizer")
+    def test_classify_creatives_model_exception(self, mock_get_model_tokenizer):
+        mock_get_model_tokenizer.side_effect = Exception("Model Load Error")
+
+        results = classify_creatives([("test", []), ("", [])])
+
+        assert results == [(None, 0.0), (None, 0.0)]
+        assert classify_creatives([]) == []
+
 
 if __name__ == "__main__":
     unittest.main()
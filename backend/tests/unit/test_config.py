@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+
+from config import STAGE_CLASSIFICATION
+from config import STAGE_COLOR
+from config import STAGE_DETECTION
+from config import STAGE_OCR
+from config import get_stage_thread_limits
+from config import get_stage_timeouts
+from config import get_worker_stages
+
+
+ALL_STAGES_COUNT = 4
+DEFAULT_TIMEOUT = 30.0
+OCR_TIMEOUT = 60.0
+
+
+class TestWorkerStages(unittest.TestCase):
+    @patch("config.settings")
+    def test_all_stages_by_default(self, mock_settings):
+        mock_settings.WORKER_STAGES = ""
+        assert len(get_worker_stages()) == ALL_STAGES_COUNT
+
+    @patch("config.settings")
+    def test_selected_stages_in_pipeline_order(self, mock_settings):
+        mock_settings.WORKER_STAGES = " classification, ocr ,unknown"
+        assert get_worker_stages() == [STAGE_OCR, STAGE_CLASSIFICATION]
+
+
+
+class TestStageThreadLimits(unittest.TestCase):
+    @patch("config.settings")
+    def test_parsed_and_invalid_items_skipped(self, mock_settings):
+        mock_settings.STAGE_THREAD_LIMITS = "ocr=2, color = 1,unknown=3,detection=many,"
+        assert get_stage_thread_limits() == {STAGE_OCR: 2, STAGE_COLOR: 1}
+
+
+class TestStageTimeouts(unittest.TestCase):
+    @patch("config.settings")
+    def test_no_limits_by_default(self, mock_settings):
+        mock_settings.STAGE_TIMEOUT = 0
+        mock_settings.STAGE_TIMEOUTS = ""
+        assert get_stage_timeouts() == {}
+
+    @patch("config.settings")
+    def test_stage_overrides_default(self, mock_settings):
+        mock_settings.STAGE_TIMEOUT = DEFAULT_TIMEOUT
+        mock_settings.STAGE_TIMEOUTS = "ocr=60,color=0,detection=fast"
+        assert get_stage_timeouts() == {
+            STAGE_OCR: OCR_TIMEOUT,
+            STAGE_DETECTION: DEFAULT_TIMEOUT,
+            STAGE_CLASSIFICATION: DEFAULT_TIMEOUT,
+        }
+
+
+if __name__ == "__main__":
+    unittest.main()
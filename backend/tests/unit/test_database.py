@@ -0,0 +1,32 @@
+import unittest
+
+from database import add_missing_columns
+from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy import text
+
+
+class TestAddMissingColumns(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.addCleanup(self.engine.dispose)
+
+    def _columns(self) -> set[str]:
+        return {column["name"] for column in inspect(self.engine).get_columns("creative_analysis")}
+
+    def test_column_added_to_existing_table(self):
+        # Таблица из БД, созданной до появления classification_path
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE creative_analysis (id INTEGER PRIMARY KEY, main_topic VARCHAR)"))
+
+        assert add_missing_columns(self.engine) == ["creative_analysis.classification_path"]
+        assert "classification_path" in self._columns()
+        # Повторный запуск ничего не меняет
+        assert add_missing_columns(self.engine) == []
+
+    def test_missing_table_skipped(self):
+        assert add_missing_columns(self.engine) == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+from utils.image_utils import DecodedImage
+
+
+IMAGE_WIDTH = 400
+IMAGE_HEIGHT = 200
+MAX_SIDE = 100
+
+
+class TestDecodedImage(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGBA", (IMAGE_WIDTH, IMAGE_HEIGHT), (255, 0, 0, 128)).save(buffer, format="PNG")
+        self.png_bytes = buffer.getvalue()
+
+    def test_from_bytes_converts_to_rgb(self):
+        image = DecodedImage.from_bytes(self.png_bytes)
+        assert image.size == (IMAGE_WIDTH, IMAGE_HEIGHT)
+        assert image.rgb.shape == (IMAGE_HEIGHT, IMAGE_WIDTH, 3)
+        assert image.grey.shape == (IMAGE_HEIGHT, IMAGE_WIDTH)
+
+    def test_resized_is_cached(self):
+        image = DecodedImage.from_bytes(self.png_bytes)
+        variant = image.resized((MAX_SIDE, MAX_SIDE))
+        assert variant.shape == (MAX_SIDE, MAX_SIDE, 3)
+        assert image.resized((MAX_SIDE, MAX_SIDE)) is variant
+
+    def test_resized_matches_pil(self):
+        image = DecodedImage.from_bytes(self.png_bytes)
+        with Image.open(io.BytesIO(self.png_bytes)) as pil_image:
+            expected = np.array(pil_image.convert("RGB").resize((MAX_SIDE, MAX_SIDE)))
+        np.testing.assert_array_equal(image.resized((MAX_SIDE, MAX_SIDE)), expected)
+
+    def test_downscaled_keeps_aspect_ratio(self):
+        image = DecodedImage.from_bytes(self.png_bytes)
+        assert image.downscaled(MAX_SIDE).shape == (MAX_SIDE * IMAGE_HEIGHT // IMAGE_WIDTH, MAX_SIDE, 3)
+        assert image.downscaled(IMAGE_WIDTH * 2) is image.rgb
+
+
+if __name__ == "__main__":
+    unittest.main()
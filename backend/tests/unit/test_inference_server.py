@@ -0,0 +1,126 @@
+import stat
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from ml_models import inference_client
+from ml_models.inference_server import DynamicBatcher
+from ml_models.inference_server import create_listener
+from ml_models.inference_server import serve
+from utils.image_utils import DecodedImage
+
+
+MAX_BATCH_SIZE = 3
+LONG_WAIT_MS = 5000
+SHORT_WAIT_MS = 10
+BAD_PAYLOAD = -1
+CONF_THRESHOLD = 0.35
+AUTHKEY = "test-authkey"
+OWNER_ONLY_MODE = 0o600
+
+
+class TestDynamicBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def _double(self, payloads):
+        self.batches.append(list(payloads))
+        if BAD_PAYLOAD in payloads:
+            msg = "bad payload"
+            raise ValueError(msg)
+        return [payload * 2 for payload in payloads]
+
+    def _submit_all(self, payloads, max_wait_ms):
+        batcher = DynamicBatcher("test", self._double, MAX_BATCH_SIZE, max_wait_ms)
+        requests = [batcher.submit(payload) for payload in payloads]
+        for request in requests:
+            request.wait()
+        return requests
+
+    def test_full_batch_sent_without_waiting_deadline(self):
+        requests = self._submit_all([1, 2, 3], LONG_WAIT_MS)
+
+        assert [request.result for request in requests] == [2, 4, 6]
+        assert self.batches == [[1, 2, 3]]
+
+    def test_partial_batch_sent_after_deadline(self):
+        requests = self._submit_all([1], SHORT_WAIT_MS)
+
+        assert [request.result for request in requests] == [2]
+        assert self.batches == [[1]]
+
+    def test_failed_batch_retried_per_request(self):
+        requests = self._submit_all([1, BAD_PAYLOAD, 3], LONG_WAIT_MS)
+
+        assert [request.result for request in requests] == [2, None, 6]
+        assert "bad payload" in requests[1].error
+
+
+class TestInferenceClient(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.socket_path = str(Path(tmp_dir.name) / "inference.sock")
+        self.received = []
+
+        def detect_batch(payloads):
+            self.received.extend(payloads)
+            return [[{"class": "clock", "shape": list(rgb.shape)}] for rgb, _ in payloads]
+
+        batchers = {
+            inference_client.METHOD_DETECTION: DynamicBatcher("detection", detect_batch, MAX_BATCH_SIZE, SHORT_WAIT_MS),
+        }
+        for name, value in (("INFERENCE_SOCKET_PATH", self.socket_path), ("INFERENCE_AUTHKEY", AUTHKEY)):
+            patcher = patch.object(inference_client.settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        listener = create_listener(self.socket_path)
+        self.addCleanup(listener.close)
+        threading.Thread(target=serve, args=(listener, batchers), daemon=True).start()
+        self.addCleanup(inference_client._drop_connection)  # noqa: SLF001
+
+    def test_detect_objects_round_trip(self):
+        image = DecodedImage(np.zeros((20, 40, 3), dtype=np.uint8))
+
+        detections = inference_client.detect_objects(image, conf_threshold=CONF_THRESHOLD)
+
+        assert detections == [{"class": "clock", "shape": [20, 40, 3]}]
+        assert self.received[0][1] == CONF_THRESHOLD
+
+    def test_unknown_method_raises(self):
+        with pytest.raises(inference_client.InferenceServerError, match="Неизвестный метод"):
+            inference_client.extract_text_and_blocks(DecodedImage(np.zeros((2, 2, 3), dtype=np.uint8)))
+
+    def test_classification_falls_back_when_server_unavailable(self):
+        with patch.object(inference_client.settings, "INFERENCE_SOCKET_PATH", self.socket_path + ".missing"):
+            assert inference_client.classify_creative("текст", []) == (None, 0.0)
+
+    def test_socket_restricted_to_owner(self):
+        assert stat.S_IMODE(Path(self.socket_path).stat().st_mode) == OWNER_ONLY_MODE
+
+    def test_wrong_authkey_rejected(self):
+        with patch.object(inference_client.settings, "INFERENCE_AUTHKEY", "wrong-key"):
+            with pytest.raises(inference_client.InferenceServerError, match="недоступен"):
+                inference_client.detect_objects(DecodedImage(np.zeros((2, 2, 3), dtype=np.uint8)), CONF_THRESHOLD)
+            inference_client._drop_connection()  # noqa: SLF001
+
+        # Сервер не падает на чужом подключении и продолжает отвечать своим воркерам
+        image = DecodedImage(np.zeros((2, 4, 3), dtype=np.uint8))
+        detections = inference_client.detect_objects(image, CONF_THRESHOLD)
+        assert detections == [{"class": "clock", "shape": [2, 4, 3]}]
+
+    def test_missing_authkey_raises(self):
+        with (
+            patch.object(inference_client.settings, "INFERENCE_AUTHKEY", ""),
+            pytest.raises(inference_client.InferenceServerError, match="INFERENCE_AUTHKEY"),
+        ):
+            inference_client.get_authkey()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from utils.minio_utils import download_file_to_buffer
+
+
+SPOOL_MAX_SIZE = 8
+SMALL_PAYLOAD = b"1234"
+LARGE_PAYLOAD = b"0123456789abcdef"
+
+
+class TestDownloadFileToBuffer(unittest.TestCase):
+    def setUp(self):
+        self.creative = MagicMock(creative_id="abc", file_format="png")
+        self.analysis = MagicMock()
+        self.db = MagicMock()
+
+    def _mock_response(self, mock_client, payload: bytes):
+        response = MagicMock()
+        response.stream.return_value = iter([payload[:4], payload[4:]])
+        mock_client.get_object.return_value = response
+        return response
+
+    @patch("utils.minio_utils.settings")
+    @patch("utils.minio_utils.minio_client")
+    def test_small_object_stays_in_memory(self, mock_client, mock_settings):
+        mock_settings.MINIO_SPOOL_MAX_SIZE = SPOOL_MAX_SIZE
+        response = self._mock_response(mock_client, SMALL_PAYLOAD)
+
+        buffer = download_file_to_buffer(self.creative, self.analysis, self.db)
+        self.addCleanup(buffer.close)
+
+        assert buffer.read() == SMALL_PAYLOAD
+        assert not buffer._rolled  # noqa: SLF001
+        mock_client.get_object.assert_called_once_with(mock_settings.MINIO_BUCKET, "abc.png")
+        response.close.assert_called_once()
+        response.release_conn.assert_called_once()
+
+    @patch("utils.minio_utils.settings")
+    @patch("utils.minio_utils.minio_client")
+    def test_large_object_spools_to_disk(self, mock_client, mock_settings):
+        mock_settings.MINIO_SPOOL_MAX_SIZE = SPOOL_MAX_SIZE
+        self._mock_response(mock_client, LARGE_PAYLOAD)
+
+        buffer = download_file_to_buffer(self.creative, self.analysis, self.db)
+        self.addCleanup(buffer.close)
+
+        assert buffer._rolled  # noqa: SLF001
+        assert buffer.read() == LARGE_PAYLOAD
+
+    @patch("utils.minio_utils.settings")
+    @patch("utils.minio_utils.minio_client")
+    def test_stream_error_releases_connection(self, mock_client, mock_settings):
+        mock_settings.MINIO_SPOOL_MAX_SIZE = SPOOL_MAX_SIZE
+        response = MagicMock()
+        response.stream.side_effect = OSError("connection reset")
+        mock_client.get_object.return_value = response
+
+        buffer = download_file_to_buffer(self.creative, self.analysis, self.db)
+
+        assert buffer is None
+        response.release_conn.assert_called_once()
+        assert self.analysis.overall_status == "ERROR"
+        self.db.commit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import redis
+from ml_models import ocr_metrics
+
+
+SKIP_RATE = 0.25
+RECORDED_IMAGES = 4
+SHARED_IMAGES = 8
+
+
+class TestOcrMetrics(unittest.TestCase):
+    def setUp(self):
+        ocr_metrics.clear()
+        self.addCleanup(ocr_metrics.clear)
+        self.client = MagicMock()
+        patcher = patch.object(ocr_metrics, "_redis_client", self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_skip_rate(self):
+        ocr_metrics.record_image(skipped=True)
+        for _ in range(RECORDED_IMAGES - 1):
+            ocr_metrics.record_image(skipped=False)
+
+        stats = ocr_metrics.get_ocr_stats()
+        assert stats["images"] == RECORDED_IMAGES
+        assert stats["skip_rate"] == SKIP_RATE
+        # До flush_stats счётчики копятся в процессе
+        self.client.pipeline.assert_not_called()
+        ocr_metrics.flush_stats()
+        pipeline = self.client.pipeline.return_value
+        pipeline.hincrby.assert_any_call(ocr_metrics.OCR_STATS_KEY, "images", RECORDED_IMAGES)
+        pipeline.hincrby.assert_any_call(ocr_metrics.OCR_STATS_KEY, "skipped", 1)
+
+    def test_shared_stats(self):
+        self.client.hgetall.return_value = {b"images": b"8", b"skipped": b"2"}
+        stats = ocr_metrics.get_shared_ocr_stats()
+        assert stats["images"] == SHARED_IMAGES
+        assert stats["skip_rate"] == SKIP_RATE
+
+    def test_redis_errors_do_not_break_ocr(self):
+        self.client.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+        ocr_metrics.record_image(skipped=True)
+        ocr_metrics.flush_stats()
+        assert ocr_metrics.get_ocr_stats()["skipped"] == 1
+
+    def test_empty_stats(self):
+        assert ocr_metrics.get_ocr_stats()["skip_rate"] == 0.0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,28 @@
+import tempfile
+import threading
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+import numpy as np
 import pytest
+from ml_models import ocr_model
 from ml_models.ocr_model import extract_text_and_blocks
+from ml_models.ocr_model import extract_text_and_blocks_batch
+from utils.image_utils import DecodedImage
 
 
 TEST_NUM_BLOCKS = 2
 CONF_SMALL_THRESHOLD = 0.6
 CONF_BIG_THRESHOLD = 0.9
+NUM_THREADS = 4
+LOAD_DELAY = 0.05
+BATCH_BBOX = [[10, 10], [50, 10], [50, 30], [10, 30]]
+TARGET_SIDE = 400
+HALF_SCALE = 0.5
+QUARTER_SCALE = 0.25
 
 class TestOcrModel(unittest.TestCase):
     @patch("ml_models.ocr_model.get_ocr_reader")
@@ -42,6 +56,27 @@ class TestOcrModel(unittest.TestCase):
         assert blocks[0]["bbox"][2] == exp_bbox_0_norm[2]
         assert blocks[0]["bbox"][3] == exp_bbox_0_norm[3]
 
+    @patch("ml_models.ocr_model.get_ocr_reader")
+    def test_extract_text_and_blocks_decoded_image(self, mock_get_reader):
+        image = DecodedImage(np.zeros((300, 400, 3), dtype=np.uint8))
+
+        mock_reader = MagicMock()
+        mock_get_reader.return_value = mock_reader
+        mock_reader.detect.return_value = ([["horizontal"]], [["free"]])
+        mock_reader.recognize.return_value = [
+            ([[10, 10], [50, 10], [50, 30], [10, 30]], "Papa", CONF_BIG_THRESHOLD),
+        ]
+
+        text, blocks = extract_text_and_blocks(image)
+
+        mock_reader.readtext.assert_not_called()
+        assert mock_reader.detect.call_args.args[0] is image.rgb
+        recognize_args = mock_reader.recognize.call_args.args
+        assert recognize_args[0] is image.grey
+        assert recognize_args[1:] == (["horizontal"], ["free"])
+        assert text == "Papa"
+        assert blocks[0]["bbox"] == [10 / 400, 10 / 300, 50 / 400, 30 / 300]
+
     @patch("ml_models.ocr_model.get_ocr_reader")
     def test_extract_text_and_blocks_empty_result(self, mock_get_reader):
         mock_creative = MagicMock()
@@ -76,5 +111,189 @@ class TestOcrModel(unittest.TestCase):
         assert "Mock OCR Error" in str(exc.value)
 
 
+class TestOcrBatch(unittest.TestCase):
+    def setUp(self):
+        self.reader = MagicMock()
+        # detect возвращает по списку регионов на изображение пачки
+        self.reader.detect.side_effect = lambda batch, **_kwargs: (
+            [[f"horizontal-{i}"] for i in range(len(batch))],
+            [[f"free-{i}"] for i in range(len(batch))],
+        )
+        self.reader.recognize.side_effect = lambda grey, *_args, **_kwargs: [
+            (BATCH_BBOX, f"{grey.shape[1]}x{grey.shape[0]}", CONF_BIG_THRESHOLD),
+        ]
+        patcher = patch("ml_models.ocr_model.get_ocr_reader", return_value=self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.images = [
+            DecodedImage(np.zeros((300, 400, 3), dtype=np.uint8)),
+            DecodedImage(np.zeros((200, 200, 3), dtype=np.uint8)),
+            DecodedImage(np.zeros((300, 400, 3), dtype=np.uint8)),
+        ]
+
+    def test_images_grouped_by_size(self):
+        results = extract_text_and_blocks_batch(self.images)
+
+        detect_batches = [call.args[0].shape for call in self.reader.detect.call_args_list]
+        assert detect_batches == [(2, 300, 400, 3), (1, 200, 200, 3)]
+        self.reader.readtext.assert_not_called()
+        # Порядок результатов совпадает с порядком изображений, bbox нормированы на размер каждого
+        assert [text for text, _ in results] == ["400x300", "200x200", "400x300"]
+        assert results[1][1][0]["bbox"] == [10 / 200, 10 / 200, 50 / 200, 30 / 200]
+        assert results[2][1][0]["bbox"] == [10 / 400, 10 / 300, 50 / 400, 30 / 300]
+
+    def test_group_split_by_batch_size(self):
+        with patch.object(ocr_model.settings, "OCR_BATCH_SIZE", 1):
+            results = extract_text_and_blocks_batch(self.images)
+
+        assert self.reader.detect.call_count == len(self.images)
+        assert len(results) == len(self.images)
+
+    def test_batch_error_raised(self):
+        self.reader.detect.side_effect = RuntimeError("detector failed")
+        with pytest.raises(RuntimeError, match="detector failed"):
+            extract_text_and_blocks_batch(self.images)
+
+class TestAdaptiveResolution(unittest.TestCase):
+    def setUp(self):
+        self.reader = MagicMock()
+        self.reader.recognize.return_value = [([[20, 40], [100, 40], [100, 80], [20, 80]], "Papa", CONF_BIG_THRESHOLD)]
+        patchers = [
+            patch("ml_models.ocr_model.get_ocr_reader", return_value=self.reader),
+            patch.object(ocr_model.settings, "OCR_TARGET_SIDE", TARGET_SIDE),
+            patch.object(ocr_model.settings, "OCR_MIN_TEXT_HEIGHT", 12),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.image = DecodedImage(np.zeros((400, 800, 3), dtype=np.uint8))
+
+    def test_detection_scale(self):
+        assert ocr_model.get_detection_scale(1600, 800) == QUARTER_SCALE
+        assert ocr_model.get_detection_scale(300, 200) == 1
+        with patch.object(ocr_model.settings, "OCR_TARGET_SIDE", 0):
+            assert ocr_model.get_detection_scale(4000, 3000) == 1
+
+    def test_boxes_mapped_to_original_size(self):
+        self.reader.detect.return_value = ([[[10, 50, 20, 40]]], [[[[5, 5], [15, 5], [15, 25], [5, 25]]]])
+
+        text, blocks = extract_text_and_blocks(self.image)
+
+        assert self.reader.detect.call_args.args[0].shape == (200, 400, 3)
+        recognize_args = self.reader.recognize.call_args.args
+        # Распознаватель получает исходное изображение и боксы в его координатах
+        assert recognize_args[0] is self.image.grey
+        assert recognize_args[1] == [[20, 100, 40, 80]]
+        assert recognize_args[2] == [[[10, 10], [30, 10], [30, 50], [10, 50]]]
+        assert text == "Papa"
+        assert blocks[0]["bbox"] == [20 / 800, 40 / 400, 100 / 800, 80 / 400]
+
+    def test_small_text_detected_at_higher_resolution(self):
+        # Строка высотой 4 пикселя на входе детектора - ниже OCR_MIN_TEXT_HEIGHT
+        self.reader.detect.side_effect = [
+            ([[[10, 50, 20, 24]]], [[]]),
+            ([[[20, 100, 40, 48]]], [[]]),
+        ]
+
+        extract_text_and_blocks(self.image)
+
+        detect_inputs = [call.args[0] for call in self.reader.detect.call_args_list]
+        assert detect_inputs[0].shape[1] == self.image.width * HALF_SCALE
+        assert detect_inputs[1] is self.image.rgb
+        assert self.reader.recognize.call_args.args[1] == [[20, 100, 40, 48]]
+
+
+class TestTwoPhaseOcr(unittest.TestCase):
+    def setUp(self):
+        self.reader = MagicMock()
+        self.reader.recognize.return_value = [(BATCH_BBOX, "Papa", CONF_BIG_THRESHOLD)]
+        patchers = [
+            patch("ml_models.ocr_model.get_ocr_reader", return_value=self.reader),
+            patch.object(ocr_model.ocr_metrics, "record_image"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.image = DecodedImage(np.zeros((300, 400, 3), dtype=np.uint8))
+
+    def test_recognition_skipped_without_regions(self):
+        self.reader.detect.return_value = ([[]], [[]])
+
+        text, blocks = extract_text_and_blocks(self.image)
+
+        assert (text, blocks) == ("", [])
+        self.reader.recognize.assert_not_called()
+        ocr_model.ocr_metrics.record_image.assert_called_once_with(skipped=True)
+
+    def test_detection_threshold_from_settings(self):
+        self.reader.detect.return_value = ([[[10, 50, 10, 30]]], [[]])
+        with patch.object(ocr_model.settings, "OCR_TEXT_THRESHOLD", CONF_BIG_THRESHOLD):
+            text, _ = extract_text_and_blocks(self.image)
+
+        assert self.reader.detect.call_args.kwargs["text_threshold"] == CONF_BIG_THRESHOLD
+        assert text == "Papa"
+        ocr_model.ocr_metrics.record_image.assert_called_once_with(skipped=False)
+
+    def test_batch_recognizes_only_images_with_text(self):
+        self.reader.detect.return_value = ([[[10, 50, 10, 30]], []], [[], []])
+
+        results = extract_text_and_blocks_batch([self.image, DecodedImage(np.zeros((300, 400, 3), dtype=np.uint8))])
+
+        assert [text for text, _ in results] == ["Papa", ""]
+        self.reader.recognize.assert_called_once()
+        skipped = [call.kwargs["skipped"] for call in ocr_model.ocr_metrics.record_image.call_args_list]
+        assert skipped == [False, True]
+
+    def test_metrics_recorded_outside_semaphore(self):
+        self.reader.detect.return_value = ([[]], [[]])
+        semaphore = threading.BoundedSemaphore(1)
+        semaphore_free = []
+
+        def record_image(**_kwargs):
+            acquired = semaphore.acquire(blocking=False)
+            semaphore_free.append(acquired)
+            if acquired:
+                semaphore.release()
+
+        ocr_model.ocr_metrics.record_image.side_effect = record_image
+        with patch.object(ocr_model, "_ocr_semaphore", semaphore):
+            extract_text_and_blocks(self.image)
+            extract_text_and_blocks_batch([self.image])
+
+        assert semaphore_free == [True, True]
+
+
+class TestOcrReaderThreadSafety(unittest.TestCase):
+    def test_reader_created_once_across_threads(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        (Path(tmp_dir.name) / ocr_model.settings.EASYOCR_WEIGHTS_DIR / "model").mkdir(parents=True)
+
+        def slow_reader(*_args, **_kwargs):
+            time.sleep(LOAD_DELAY)
+            return MagicMock()
+
+        barrier = threading.Barrier(NUM_THREADS)
+        readers = []
+
+        def worker():
+            barrier.wait()
+            readers.append(ocr_model.get_ocr_reader())
+
+        with (
+            patch.object(ocr_model, "_ocr_reader", None),
+            patch.object(ocr_model.settings, "MODEL_CACHE_DIR", tmp_dir.name),
+            patch.object(ocr_model.easyocr, "Reader", side_effect=slow_reader) as mock_reader,
+        ):
+            threads = [threading.Thread(target=worker) for _ in range(NUM_THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_reader.assert_called_once()
+        assert all(reader is readers[0] for reader in readers)
+
+
 if __name__ == "__main__":
     unittest.main()
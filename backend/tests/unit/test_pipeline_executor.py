@@ -0,0 +1,147 @@
+import tempfile
+import threading
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import numpy as np
+from config import STAGE_DETECTION
+from database import Base
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from services import pipeline_executor
+from services.stage_deadline import StageBusyError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from utils.image_utils import DecodedImage
+
+
+CREATIVE_IDS = ["creative-1", "creative-2", "creative-3"]
+EVENT_TIMEOUT = 5
+BUSY_TIMEOUT = 10.0
+
+
+class TestPipelineExecutor(unittest.TestCase):
+    def setUp(self):
+        # Файловая SQLite: этапы конвейера работают из разных потоков
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'test.db'}")
+        Base.metadata.create_all(engine)
+        self.session_factory = sessionmaker(bind=engine)
+
+        db = self.session_factory()
+        for creative_id in CREATIVE_IDS:
+            db.add(Creative(creative_id=creative_id, file_format="png"))
+            db.add(CreativeAnalysis(creative_id=creative_id, overall_status="PROCESSING"))
+        db.commit()
+        db.close()
+
+        self.image = DecodedImage(np.zeros((8, 8, 3), dtype=np.uint8))
+        self.ocr_started = {creative_id: threading.Event() for creative_id in CREATIVE_IDS}
+        self.overlapped = False
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _fake_ocr(self, creative_id, _creative, analysis, db, image):
+        assert image is self.image
+        self.ocr_started[creative_id].set()
+        analysis.ocr_status = "SUCCESS"
+        db.commit()
+
+    @staticmethod
+    def _fake_detection(_creative_id, analysis, db, _image):
+        analysis.detection_status = "SUCCESS"
+        db.commit()
+
+    def _fake_classification(self, creative_id, analysis, db):
+        # Пока первый креатив классифицируется, следующий уже проходит OCR
+        if creative_id == CREATIVE_IDS[0]:
+            self.overlapped = self.ocr_started[CREATIVE_IDS[1]].wait(EVENT_TIMEOUT)
+        analysis.classification_status = "SUCCESS"
+        db.commit()
+
+    @staticmethod
+    def _fake_color(_creative_id, analysis, db, _image):
+        analysis.color_analysis_status = "SUCCESS"
+        db.commit()
+
+    def _patch_stages(self, detection=None) -> ExitStack:
+        module = pipeline_executor
+        stack = ExitStack()
+        stack.enter_context(patch.object(module, "SessionLocal", self.session_factory))
+        stack.enter_context(patch.object(module, "load_batch_item", return_value=MagicMock(image=self.image)))
+        stack.enter_context(patch.object(module, "perform_ocr", side_effect=self._fake_ocr))
+        stack.enter_context(patch.object(
+            module, "perform_detection", side_effect=detection or self._fake_detection,
+        ))
+        stack.enter_context(patch.object(module, "perform_classification", side_effect=self._fake_classification))
+        stack.enter_context(patch.object(module, "perform_color_analysis", side_effect=self._fake_color))
+        return stack
+
+    def _run(self, on_done=None, on_retry=None, **kwargs):
+        with self._patch_stages(**kwargs):
+            executor = pipeline_executor.PipelineExecutor(queue_size=1, on_done=on_done, on_retry=on_retry)
+            for creative_id in CREATIVE_IDS:
+                executor.submit(creative_id)
+            executor.shutdown()
+
+        db = self.session_factory()
+        self.addCleanup(db.close)
+        return {analysis.creative_id: analysis for analysis in db.query(CreativeAnalysis)}
+
+    def test_stages_overlap_across_creatives(self):
+        analyses = self._run()
+
+        assert self.overlapped
+        assert all(analysis.overall_status == "SUCCESS" for analysis in analyses.values())
+
+    def test_failed_stage_does_not_stop_pipeline(self):
+        def detection(creative_id, analysis, db, image):
+            if creative_id == CREATIVE_IDS[0]:
+                msg = "db is gone"
+                raise RuntimeError(msg)
+            self._fake_detection(creative_id, analysis, db, image)
+
+        analyses = self._run(detection=detection)
+
+        assert analyses[CREATIVE_IDS[0]].overall_status == "ERROR"
+        assert analyses[CREATIVE_IDS[0]].error_message == "db is gone"
+        assert analyses[CREATIVE_IDS[0]].classification_status == "PENDING"
+        assert analyses[CREATIVE_IDS[1]].overall_status == "SUCCESS"
+
+    def test_on_done_called_once_per_creative(self):
+        done = []
+
+        def detection(creative_id, analysis, db, image):
+            if creative_id == CREATIVE_IDS[0]:
+                msg = "db is gone"
+                raise RuntimeError(msg)
+            self._fake_detection(creative_id, analysis, db, image)
+
+        self._run(on_done=done.append, detection=detection)
+
+        # Креатив подтверждается и после полного прохода, и после ошибки этапа
+        assert sorted(done) == sorted(CREATIVE_IDS)
+
+
+    def test_busy_stage_sends_creative_to_retry(self):
+        done, retried = [], []
+
+        def detection(creative_id, analysis, db, image):
+            if creative_id == CREATIVE_IDS[0]:
+                raise StageBusyError(STAGE_DETECTION, BUSY_TIMEOUT)
+            self._fake_detection(creative_id, analysis, db, image)
+
+        analyses = self._run(on_done=done.append, on_retry=retried.append, detection=detection)
+
+        # Креатив возвращается на повтор, а не помечается ошибкой; подтверждение - после возврата
+        assert retried == [CREATIVE_IDS[0]]
+        assert analyses[CREATIVE_IDS[0]].overall_status != "ERROR"
+        assert sorted(done) == sorted(CREATIVE_IDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from config import CLASSIFICATION_PATH_BERT
+from config import STAGE_DETECTION
+from config import STAGE_STATUS_TIMEOUT
+from database import Base
+from database_models.creative import CreativeAnalysis
+from services import processing_service
+from services.analytics_service import get_timeout_summary
+from services.processing_service import finalize_analysis_if_complete
+from services.stage_deadline import StageBusyError
+from services.stage_deadline import StageTimeoutError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+CREATIVE_ID = "creative-1"
+COLOR_STARTED_SECONDS = 1
+TOTAL_SECONDS = 5
+DETECTION_TIMEOUT = 10.0
+TOPIC_CONFIDENCE = 0.9
+
+
+class TestFinalizeAnalysis(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.started = datetime.utcnow() - timedelta(seconds=TOTAL_SECONDS)
+        self.analysis = CreativeAnalysis(
+            creative_id=CREATIVE_ID,
+            overall_status="PROCESSING",
+            ocr_status="SUCCESS",
+            detection_status="SUCCESS",
+            classification_status="SUCCESS",
+            color_analysis_status="PROCESSING",
+            ocr_started_at=self.started + timedelta(seconds=COLOR_STARTED_SECONDS),
+            color_analysis_started_at=self.started,
+        )
+        self.db.add(self.analysis)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_not_finalized_while_stage_running(self):
+        assert not finalize_analysis_if_complete(self.db, CREATIVE_ID)
+        assert self.analysis.overall_status == "PROCESSING"
+
+    def test_finalized_by_last_stage(self):
+        self.analysis.color_analysis_status = "SUCCESS"
+        self.db.commit()
+
+        assert finalize_analysis_if_complete(self.db, CREATIVE_ID)
+        assert self.analysis.overall_status == "SUCCESS"
+        # Отсчёт от самого раннего этапа: анализ цветов мог стартовать раньше OCR
+        assert self.analysis.total_duration >= TOTAL_SECONDS
+
+    def test_missing_analysis(self):
+        assert not finalize_analysis_if_complete(self.db, "unknown")
+
+
+class TestStageTimeout(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+        self.analysis = CreativeAnalysis(creative_id=CREATIVE_ID, overall_status="PROCESSING", ocr_text="скидки")
+        self.db.add(self.analysis)
+        self.db.commit()
+
+    def test_detection_timeout_degrades_classification(self):
+        timeout = StageTimeoutError(STAGE_DETECTION, DETECTION_TIMEOUT)
+        with patch.object(processing_service, "run_with_deadline", side_effect=timeout):
+            processing_service.perform_detection(CREATIVE_ID, self.analysis, self.db, MagicMock())
+
+        assert self.analysis.detection_status == STAGE_STATUS_TIMEOUT
+        assert self.analysis.detection_duration is not None
+        assert self.analysis.detected_objects is None
+
+        with (
+            patch.object(processing_service.settings, "CLASSIFICATION_CASCADE", False),
+            patch.object(processing_service.settings, "INFERENCE_SERVER", False),
+            patch.object(processing_service.classifier, "classify_creative",
+                         return_value=("finance", TOPIC_CONFIDENCE)) as mock_classify,
+        ):
+            processing_service.perform_classification(CREATIVE_ID, self.analysis, self.db)
+
+        # Классификация идёт только по тексту OCR
+        mock_classify.assert_called_once_with("скидки", [])
+        assert self.analysis.classification_status == "SUCCESS"
+
+    def test_busy_stage_not_marked_timeout(self):
+        busy = StageBusyError(STAGE_DETECTION, DETECTION_TIMEOUT)
+        with (
+            patch.object(processing_service, "run_with_deadline", side_effect=busy),
+            pytest.raises(StageBusyError),
+        ):
+            processing_service.perform_detection(CREATIVE_ID, self.analysis, self.db, MagicMock())
+
+        # Этап не запускался: он остаётся незавершённым, повтор задачи выполнит его заново
+        assert self.analysis.detection_status != STAGE_STATUS_TIMEOUT
+        assert not processing_service.is_stage_completed(self.analysis, STAGE_DETECTION)
+        assert get_timeout_summary([self.analysis])["degraded_creatives"] == 0
+
+    def test_timed_out_creative_finalized_and_counted(self):
+        self.analysis.ocr_status = "SUCCESS"
+        self.analysis.detection_status = STAGE_STATUS_TIMEOUT
+        self.analysis.classification_status = "SUCCESS"
+        self.analysis.color_analysis_status = STAGE_STATUS_TIMEOUT
+        self.db.commit()
+
+        assert finalize_analysis_if_complete(self.db, CREATIVE_ID)
+        summary = get_timeout_summary([self.analysis])
+        assert summary["degraded_creatives"] == 1
+        assert summary["stage_timeouts"] == {"ocr": 0, "detection": 1, "classification": 0, "color": 1}
+
+
+class TestInferenceServerClassification(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+        # Значение прошлой попытки задачи не должно остаться в строке
+        self.analysis = CreativeAnalysis(
+            creative_id=CREATIVE_ID, overall_status="PROCESSING", ocr_text="скидки", classification_path="cascade",
+        )
+        self.db.add(self.analysis)
+        self.db.commit()
+
+    def test_classification_path_set(self):
+        with (
+            patch.object(processing_service.settings, "CLASSIFICATION_CASCADE", False),
+            patch.object(processing_service.settings, "INFERENCE_SERVER", True),
+            patch.object(processing_service.inference_client, "classify_creative",
+                         return_value=("finance", TOPIC_CONFIDENCE)),
+        ):
+            processing_service.perform_classification(CREATIVE_ID, self.analysis, self.db)
+
+        assert self.analysis.classification_status == "SUCCESS"
+        assert self.analysis.classification_path == CLASSIFICATION_PATH_BERT
+
+
+if __name__ == "__main__":
+    unittest.main()
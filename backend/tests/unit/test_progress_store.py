@@ -0,0 +1,132 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import redis
+from config import STAGE_OCR
+from database import Base
+from database_models.creative import CreativeAnalysis
+from services import processing_service
+from services import progress_store
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+CREATIVE_ID = "creative-1"
+OCR_DURATION = 1.5
+# Статус PROCESSING в начале этапа и результат в конце
+STAGE_COMMITS = 2
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def pipeline(self):
+        return self
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, _key, _ttl):
+        pass
+
+    def execute(self):
+        pass
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+class TestProgressStore(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        patcher = patch.object(progress_store, "_get_redis_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip_restores_types(self):
+        started = datetime(2025, 1, 1, 12, 0, 0)
+        progress_store.save_progress(CREATIVE_ID, {
+            "ocr_status": "SUCCESS",
+            "ocr_started_at": started,
+            "ocr_duration": OCR_DURATION,
+            "ocr_completed_at": None,
+        })
+
+        progress = progress_store.get_progress(CREATIVE_ID)
+
+        assert progress == {"ocr_status": "SUCCESS", "ocr_started_at": started, "ocr_duration": OCR_DURATION}
+
+    def test_clear_progress(self):
+        progress_store.save_progress(CREATIVE_ID, {"overall_status": "PROCESSING"})
+        progress_store.clear_progress(CREATIVE_ID)
+
+        assert progress_store.get_progress(CREATIVE_ID) == {}
+
+    def test_redis_errors_do_not_break_processing(self):
+        broken = MagicMock()
+        broken.pipeline.side_effect = redis.ConnectionError("down")
+        broken.hgetall.side_effect = redis.ConnectionError("down")
+        with patch.object(progress_store, "_get_redis_client", return_value=broken):
+            progress_store.save_progress(CREATIVE_ID, {"overall_status": "PROCESSING"})
+            assert progress_store.get_progress(CREATIVE_ID) == {}
+
+
+class TestDeferredStageCommits(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.db = self.session_factory()
+        self.addCleanup(self.db.close)
+        self.db.add(CreativeAnalysis(creative_id=CREATIVE_ID, overall_status="PROCESSING"))
+        self.db.commit()
+        self.analysis = self.db.query(CreativeAnalysis).one()
+
+    def _run_ocr(self, progress_enabled: bool) -> tuple[MagicMock, MagicMock]:
+        with (
+            patch.object(progress_store.settings, "PROGRESS_STORE", progress_enabled),
+            patch.object(processing_service.ocr_model, "extract_text_and_blocks", return_value=("текст", [])),
+            patch.object(processing_service, "save_progress") as mock_save,
+            patch.object(self.db, "commit", wraps=self.db.commit) as mock_commit,
+        ):
+            progress_store.defer_commits(self.db)
+            processing_service.perform_ocr(CREATIVE_ID, MagicMock(), self.analysis, self.db, MagicMock())
+        return mock_save, mock_commit
+
+    def test_stage_progress_goes_to_redis(self):
+        mock_save, mock_commit = self._run_ocr(progress_enabled=True)
+
+        mock_commit.assert_not_called()
+        saved = mock_save.call_args.args[1]
+        assert saved["ocr_status"] == "SUCCESS"
+        assert saved["ocr_duration"] is not None
+        assert self.analysis.ocr_text == "текст"
+
+    def test_stage_commits_without_progress_store(self):
+        mock_save, mock_commit = self._run_ocr(progress_enabled=False)
+
+        mock_save.assert_not_called()
+        assert mock_commit.call_count == STAGE_COMMITS
+
+    def test_snapshot_survives_rollback(self):
+        progress_store.defer_commits(self.db)
+        self.analysis.ocr_status = "SUCCESS"
+        self.analysis.ocr_text = "текст"
+
+        snapshot = processing_service.snapshot_analysis(self.analysis)
+        self.db.rollback()
+
+        assert self.analysis.ocr_status != "SUCCESS"
+        assert snapshot["ocr_status"] == "SUCCESS"
+        assert snapshot["ocr_text"] == "текст"
+        assert STAGE_OCR in processing_service.STAGE_COLUMNS
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import redis
+from utils.redis_counters import BufferedCounters
+
+
+STATS_KEY = "test_stats"
+FIELDS = ("hits", "misses")
+FLUSH_EVERY = 3
+LONG_INTERVAL = 3600
+HITS = 2
+
+
+class TestBufferedCounters(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.pipeline = self.client.pipeline.return_value
+        self.counters = BufferedCounters(
+            STATS_KEY, FIELDS, lambda: self.client, flush_every=FLUSH_EVERY, flush_interval=LONG_INTERVAL,
+        )
+
+    def test_increments_buffered_until_threshold(self):
+        self.counters.increment("hits")
+        self.counters.increment("hits")
+        self.client.pipeline.assert_not_called()
+
+        self.counters.increment("misses")
+
+        # Одна отправка на flush_every приращений, по HINCRBY на поле
+        self.client.pipeline.assert_called_once()
+        assert sorted(call.args for call in self.pipeline.hincrby.call_args_list) == [
+            (STATS_KEY, "hits", HITS),
+            (STATS_KEY, "misses", 1),
+        ]
+        assert self.counters.totals() == {"hits": HITS, "misses": 1}
+
+    def test_flush_after_interval(self):
+        counters = BufferedCounters(STATS_KEY, FIELDS, lambda: self.client, flush_every=FLUSH_EVERY, flush_interval=0)
+
+        counters.increment("hits")
+
+        self.pipeline.hincrby.assert_called_once_with(STATS_KEY, "hits", 1)
+
+    def test_redis_error_keeps_pending(self):
+        self.pipeline.execute.side_effect = [redis.ConnectionError("redis is down"), None]
+        self.counters.increment("hits")
+        self.counters.flush()
+
+        # Следующая отправка повторяет несохранённые приращения
+        self.counters.increment("hits")
+        self.counters.flush()
+        self.pipeline.hincrby.assert_called_with(STATS_KEY, "hits", HITS)
+
+    def test_no_client_no_requests(self):
+        counters = BufferedCounters(STATS_KEY, FIELDS, lambda: None, flush_every=1)
+
+        counters.increment("hits")
+
+        assert counters.totals()["hits"] == 1
+        assert counters.read_shared() is None
+
+    def test_read_shared(self):
+        self.client.hgetall.return_value = {b"hits": b"5"}
+
+        assert self.counters.read_shared() == {"hits": 5, "misses": 0}
+
+    def test_clear_drops_pending(self):
+        self.counters.increment("hits")
+        self.counters.clear()
+        with patch.object(self.counters, "_get_client") as get_client:
+            self.counters.flush()
+        get_client.assert_not_called()
+        assert self.counters.totals() == {"hits": 0, "misses": 0}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from config import STAGE_OCR
+from services.stage_deadline import StageBusyError
+from services.stage_deadline import StageTimeoutError
+from services.stage_deadline import abandoned_calls
+from services.stage_deadline import run_with_deadline
+
+
+SHORT_TIMEOUT = 0.05
+RELEASE_WAIT = 2
+
+
+class TestRunWithDeadline(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        # Отпускаем «зависший» вызов, чтобы фоновый поток не пережил тест
+        self.addCleanup(self._release_abandoned)
+
+    def _release_abandoned(self):
+        self.release.set()
+        deadline = time.monotonic() + RELEASE_WAIT
+        while abandoned_calls(STAGE_OCR) and time.monotonic() < deadline:
+            time.sleep(SHORT_TIMEOUT / 10)
+
+    def test_called_directly_without_limit(self):
+        with patch("services.stage_deadline.get_stage_timeouts", return_value={}):
+            thread = run_with_deadline(STAGE_OCR, threading.current_thread)
+        assert thread is threading.current_thread()
+
+    def test_result_within_limit(self):
+        with patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: 1}):
+            assert run_with_deadline(STAGE_OCR, sorted, [2, 1], reverse=True) == [2, 1]
+
+    def test_timeout_raised(self):
+        with (
+            patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: SHORT_TIMEOUT}),
+            pytest.raises(StageTimeoutError) as error,
+        ):
+            run_with_deadline(STAGE_OCR, self.release.wait)
+        assert error.value.stage == STAGE_OCR
+        assert error.value.timeout == SHORT_TIMEOUT
+
+    def test_busy_while_abandoned_call_runs(self):
+        next_call = MagicMock(return_value="ok")
+        with patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: SHORT_TIMEOUT}):
+            with pytest.raises(StageTimeoutError):
+                run_with_deadline(STAGE_OCR, self.release.wait)
+            with pytest.raises(StageBusyError) as error:
+                run_with_deadline(STAGE_OCR, next_call)
+
+            # Брошенный вызов держал модель весь лимит: следующий не запускался и не считается таймаутом
+            assert not isinstance(error.value, StageTimeoutError)
+            next_call.assert_not_called()
+
+            self._release_abandoned()
+            assert abandoned_calls(STAGE_OCR) == 0
+            assert run_with_deadline(STAGE_OCR, next_call) == "ok"
+
+    def test_waits_for_abandoned_call_within_limit(self):
+        with (
+            patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: SHORT_TIMEOUT}),
+            pytest.raises(StageTimeoutError),
+        ):
+            run_with_deadline(STAGE_OCR, self.release.wait)
+
+        # Брошенный вызов освобождает модель раньше, чем истечёт лимит следующего креатива
+        threading.Timer(SHORT_TIMEOUT / 2, self.release.set).start()
+        with patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: RELEASE_WAIT}):
+            assert run_with_deadline(STAGE_OCR, sorted, [2, 1]) == [1, 2]
+        assert abandoned_calls(STAGE_OCR) == 0
+
+    def test_model_error_propagated(self):
+        def fail():
+            msg = "сбой модели"
+            raise RuntimeError(msg)
+
+        with (
+            patch("services.stage_deadline.get_stage_timeouts", return_value={STAGE_OCR: 1}),
+            pytest.raises(RuntimeError, match="сбой модели"),
+        ):
+            run_with_deadline(STAGE_OCR, fail)
+
+
+if __name__ == "__main__":
+    unittest.main()
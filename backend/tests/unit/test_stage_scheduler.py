@@ -0,0 +1,223 @@
+import tempfile
+import threading
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from config import STAGE_CLASSIFICATION
+from config import STAGE_OCR
+from database import Base
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from services import stage_scheduler
+from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
+from utils.image_utils import DecodedImage
+
+
+CREATIVE_ID = "creative-1"
+BARRIER_TIMEOUT = 5
+
+
+class TestStageScheduler(unittest.TestCase):
+    def setUp(self):
+        # Файловая SQLite: сессии этапов работают из разных потоков
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'test.db'}")
+        Base.metadata.create_all(engine)
+        self.session_factory = sessionmaker(bind=engine)
+
+        db = self.session_factory()
+        db.add(Creative(creative_id=CREATIVE_ID, file_format="png"))
+        db.add(CreativeAnalysis(creative_id=CREATIVE_ID, overall_status="PROCESSING"))
+        db.commit()
+        db.close()
+
+        self.db = self.session_factory()
+        self.creative = self.db.query(Creative).one()
+        self.analysis = self.db.query(CreativeAnalysis).one()
+        self.image = DecodedImage(np.zeros((8, 8, 3), dtype=np.uint8))
+        # Все три этапа должны одновременно дойти до барьера
+        self.barrier = threading.Barrier(len(stage_scheduler.PARALLEL_STAGES), timeout=BARRIER_TIMEOUT)
+        self.stage_threads = {}
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def _fake_ocr(self, _creative_id, _creative, analysis, db, image):
+        assert image is self.image
+        self.barrier.wait()
+        self.stage_threads["ocr"] = threading.current_thread().name
+        analysis.ocr_text = "часы"
+        analysis.ocr_status = "SUCCESS"
+        db.commit()
+
+    def _fake_detection(self, _creative_id, analysis, db, _image):
+        self.barrier.wait()
+        self.stage_threads["detection"] = threading.current_thread().name
+        analysis.detected_objects = [{"class": "clock", "confidence": 0.9}]
+        analysis.detection_status = "SUCCESS"
+        db.commit()
+
+    def _fake_color(self, _creative_id, analysis, db, _image):
+        self.barrier.wait()
+        self.stage_threads["color"] = threading.current_thread().name
+        analysis.color_analysis_status = "SUCCESS"
+        db.commit()
+
+    def _fake_classification(self, _creative_id, analysis, db):
+        # Классификация видит результаты этапов, закоммиченные в других сессиях
+        assert analysis.ocr_text == "часы"
+        assert analysis.detected_objects[0]["class"] == "clock"
+        analysis.main_topic = "clocks"
+        analysis.classification_status = "SUCCESS"
+        db.commit()
+
+    def _patch_stages(self, color_stage) -> ExitStack:
+        stack = ExitStack()
+        stack.enter_context(patch.object(stage_scheduler, "SessionLocal", self.session_factory))
+        stack.enter_context(patch.object(stage_scheduler, "perform_ocr", self._fake_ocr))
+        stack.enter_context(patch.object(stage_scheduler, "perform_detection", self._fake_detection))
+        stack.enter_context(patch.object(stage_scheduler, "perform_color_analysis", color_stage))
+        stack.enter_context(patch.object(stage_scheduler, "perform_classification", self._fake_classification))
+        stack.enter_context(patch.object(stage_scheduler.settings, "PIPELINE_PARALLEL_STAGES", True))
+        return stack
+
+    def test_parallel_stages(self):
+        with self._patch_stages(self._fake_color):
+            stage_scheduler.run_analysis_stages(CREATIVE_ID, self.creative, self.analysis, self.db, self.image)
+
+        assert len(set(self.stage_threads.values())) == len(stage_scheduler.PARALLEL_STAGES)
+        assert self.analysis.main_topic == "clocks"
+        assert self.analysis.ocr_status == "SUCCESS"
+        assert self.analysis.detection_status == "SUCCESS"
+        assert self.analysis.color_analysis_status == "SUCCESS"
+
+    def test_stage_error_is_raised_after_all_stages(self):
+        def failing_color(*_args):
+            self.barrier.wait()
+            message = "color failed"
+            raise RuntimeError(message)
+
+        with self._patch_stages(failing_color), pytest.raises(RuntimeError, match="color failed"):
+            stage_scheduler.run_analysis_stages(CREATIVE_ID, self.creative, self.analysis, self.db, self.image)
+
+        self.db.refresh(self.analysis)
+        assert self.analysis.main_topic == "clocks"
+
+    def test_retry_skips_completed_stages(self):
+        # Прошлая попытка: OCR, детекция и классификация успешны, анализ цветов упал
+        self.analysis.ocr_status = "SUCCESS"
+        self.analysis.ocr_text = "часы"
+        self.analysis.detection_status = "SUCCESS"
+        self.analysis.classification_status = "SUCCESS"
+        self.analysis.color_analysis_status = "ERROR"
+        self.db.commit()
+
+        def not_expected(*_args):
+            message = "completed stage rerun"
+            raise AssertionError(message)
+
+        def color_only(_creative_id, analysis, db, _image):
+            analysis.color_analysis_status = "SUCCESS"
+            db.commit()
+
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(stage_scheduler, "SessionLocal", self.session_factory))
+            for name in ("perform_ocr", "perform_detection", "perform_classification"):
+                stack.enter_context(patch.object(stage_scheduler, name, not_expected))
+            stack.enter_context(patch.object(stage_scheduler, "perform_color_analysis", color_only))
+            stack.enter_context(patch.object(stage_scheduler.settings, "PIPELINE_PARALLEL_STAGES", True))
+            stage_scheduler.run_analysis_stages(CREATIVE_ID, self.creative, self.analysis, self.db, self.image)
+
+        assert self.analysis.color_analysis_status == "SUCCESS"
+
+    def test_deferred_stages_work_on_own_copies(self):
+        stage_analyses = []
+
+        def deferred_stage(status_field: str, **results):
+            def stage(*args):
+                analysis = args[-3]
+                self.barrier.wait()
+                # Этап не трогает общий объект сессии основного потока
+                assert analysis is not self.analysis
+                assert inspect(analysis).session is None
+                stage_analyses.append(analysis)
+                for field, value in results.items():
+                    setattr(analysis, field, value)
+                setattr(analysis, status_field, "SUCCESS")
+            return stage
+
+        def classification(_creative_id, analysis, _db):
+            # Результаты этапов перенесены в общий объект до классификации
+            assert analysis is self.analysis
+            assert analysis.ocr_text == "часы"
+            analysis.classification_status = "SUCCESS"
+
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(stage_scheduler, "is_deferred", return_value=True))
+            stack.enter_context(patch.object(
+                stage_scheduler, "perform_ocr", deferred_stage("ocr_status", ocr_text="часы"),
+            ))
+            stack.enter_context(patch.object(
+                stage_scheduler, "perform_detection", deferred_stage("detection_status", error_message="detection"),
+            ))
+            stack.enter_context(patch.object(
+                stage_scheduler, "perform_color_analysis", deferred_stage("color_analysis_status", palette_colors=[]),
+            ))
+            stack.enter_context(patch.object(stage_scheduler, "perform_classification", classification))
+            stack.enter_context(patch.object(stage_scheduler.settings, "PIPELINE_PARALLEL_STAGES", True))
+            stage_scheduler.run_analysis_stages(CREATIVE_ID, self.creative, self.analysis, self.db, self.image)
+
+        assert len({id(analysis) for analysis in stage_analyses}) == len(stage_scheduler.PARALLEL_STAGES)
+        assert self.analysis.ocr_status == "SUCCESS"
+        assert self.analysis.detection_status == "SUCCESS"
+        assert self.analysis.color_analysis_status == "SUCCESS"
+        assert self.analysis.palette_colors == []
+        # Этапы, не менявшие колонку, не затирают её значение от других этапов
+        assert self.analysis.error_message == "detection"
+        assert self.analysis.main_topic is None
+
+
+class TestPendingStages(unittest.TestCase):
+    def test_all_stages_for_new_analysis(self):
+        analysis = CreativeAnalysis(creative_id=CREATIVE_ID)
+
+        assert stage_scheduler.get_pending_stages(analysis) == stage_scheduler.ANALYSIS_STAGES
+
+    def test_classification_rerun_when_inputs_recomputed(self):
+        analysis = CreativeAnalysis(
+            creative_id=CREATIVE_ID,
+            ocr_status="ERROR",
+            detection_status="SUCCESS",
+            classification_status="SUCCESS",
+            color_analysis_status="SUCCESS",
+        )
+
+        pending = stage_scheduler.get_pending_stages(analysis)
+
+        assert pending == [STAGE_OCR, STAGE_CLASSIFICATION]
+        assert stage_scheduler.needs_image(pending)
+
+    def test_classification_only_needs_no_image(self):
+        analysis = CreativeAnalysis(
+            creative_id=CREATIVE_ID,
+            ocr_status="SUCCESS",
+            detection_status="SUCCESS",
+            classification_status="ERROR",
+            color_analysis_status="SUCCESS",
+        )
+
+        pending = stage_scheduler.get_pending_stages(analysis)
+
+        assert pending == [STAGE_CLASSIFICATION]
+        assert not stage_scheduler.needs_image(pending)
+
+
+if __name__ == "__main__":
+    unittest.main()
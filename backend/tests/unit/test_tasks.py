@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from config import ML_STAGES
+from database import Base
+from database_models.creative import Creative
+from database_models.creative import CreativeAnalysis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+# tasks загружает модели при импорте; для проверки расчёта задержек они не нужны
+with patch("services.model_loader.load_models", return_value=True):
+    import tasks
+
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 5
+BACKOFF_MAX = 30
+CREATIVE_ID = "creative-1"
+
+
+class TestRetryCountdown(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(tasks.settings, "RETRY_BACKOFF_BASE", BACKOFF_BASE),
+            patch.object(tasks.settings, "RETRY_BACKOFF_MAX", BACKOFF_MAX),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_countdown_capped_at_highest_retry(self):
+        # Случайная добавка на последней попытке доходит до RETRY_BACKOFF_MAX,
+        # но вместе с базой задержка всё равно не должна его превышать
+        with patch.object(tasks, "get_exponential_backoff_interval", return_value=BACKOFF_MAX):
+            assert tasks.get_retry_countdown(MAX_RETRIES) == BACKOFF_MAX
+
+    def test_countdown_within_bounds(self):
+        for retries in range(MAX_RETRIES + 1):
+            countdown = tasks.get_retry_countdown(retries)
+            assert BACKOFF_BASE <= countdown <= BACKOFF_MAX
+
+
+
+class TestProcessCreativeDeferred(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        # Как у SessionLocal: без autoflush новая строка анализа до коммита не видна запросам
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = self.session_factory()
+        db.add(Creative(creative_id=CREATIVE_ID, file_format="png"))
+        db.commit()
+        db.close()
+
+        patchers = [
+            patch.object(tasks, "SessionLocal", self.session_factory),
+            patch.object(tasks.settings, "PROGRESS_STORE", True),
+            patch.object(tasks, "save_progress"),
+            patch.object(tasks, "clear_progress"),
+            patch.object(tasks, "load_creative_image", return_value=(MagicMock(), None)),
+            patch.object(tasks, "run_analysis_stages", side_effect=self._complete_stages),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _complete_stages(_creative_id, _creative, analysis, _db, _image, _stages):
+        for stage in ML_STAGES:
+            setattr(analysis, stage["status"], "SUCCESS")
+            setattr(analysis, stage["started"], datetime.utcnow())
+
+    def test_new_analysis_finalized(self):
+        assert tasks.process_creative.run(CREATIVE_ID)["status"] == "success"
+
+        db = self.session_factory()
+        self.addCleanup(db.close)
+        analysis = db.query(CreativeAnalysis).filter(CreativeAnalysis.creative_id == CREATIVE_ID).one()
+        assert analysis.overall_status == "SUCCESS"
+        assert analysis.total_duration is not None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import patch
+
+from config import STAGE_COLOR
+from config import STAGE_OCR
+from services import thread_budget
+from services.thread_budget import ThreadBudget
+
+
+CPUS = list(range(8))
+CONCURRENCY = 2
+TASK_THREADS = 4
+PARALLEL_STAGES = 3
+COLOR_THREADS = 3
+
+
+class TestThreadBudget(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(thread_budget, "settings")
+        self.settings = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.settings.TORCH_INTRA_OP_THREADS = 0
+        self.settings.TORCH_INTER_OP_THREADS = 1
+        self.settings.PIPELINE_STAGE_THREADS = 0
+
+    def _budget(self, cpus=CPUS, concurrency=CONCURRENCY, stage_limits=None) -> ThreadBudget:
+        with patch.object(thread_budget, "get_stage_thread_limits", return_value=stage_limits or {}):
+            return ThreadBudget(cpus, concurrency)
+
+    def test_cores_split_between_tasks(self):
+        budget = self._budget()
+
+        assert budget.task_threads == TASK_THREADS
+        assert budget.intra_op_threads == TASK_THREADS
+        # Параллельные этапы задачи делят её долю ядер
+        assert budget.stage_threads(STAGE_OCR, PARALLEL_STAGES) == 1
+        assert budget.stage_threads(STAGE_OCR) == TASK_THREADS
+
+    def test_stage_limit_overrides_split(self):
+        budget = self._budget(stage_limits={STAGE_COLOR: COLOR_THREADS})
+
+        assert budget.stage_threads(STAGE_COLOR, PARALLEL_STAGES) == COLOR_THREADS
+
+    def test_more_tasks_than_cores(self):
+        budget = self._budget(cpus=[0, 1], concurrency=TASK_THREADS)
+
+        assert budget.task_threads == 1
+        # Лишние процессы делят все ядра, а не остаются без них
+        assert budget.affinity(TASK_THREADS - 1) == [0, 1]
+
+    def test_affinity_slices_per_process(self):
+        budget = self._budget()
+
+        assert budget.affinity(0) == [0, 1, 2, 3]
+        assert budget.affinity(1) == [4, 5, 6, 7]
+        assert budget.affinity(CONCURRENCY) == budget.affinity(0)
+
+
+class TestConfigureProcess(unittest.TestCase):
+    def setUp(self):
+        self.budget = ThreadBudget.__new__(ThreadBudget)
+        self.budget.cpus = CPUS
+        self.budget.concurrency = CONCURRENCY
+        self.budget.task_threads = TASK_THREADS
+        self.budget.intra_op_threads = TASK_THREADS
+        self.budget.inter_op_threads = 1
+        self.budget.stage_limits = {STAGE_COLOR: COLOR_THREADS}
+
+    def _configure(self, **kwargs):
+        with (
+            patch.object(thread_budget, "get_thread_budget", return_value=self.budget),
+            patch.object(thread_budget.settings, "WORKER_CPU_AFFINITY", True),
+            patch.object(thread_budget.settings, "PIPELINE_STAGE_THREADS", 0),
+            patch.object(thread_budget.os, "sched_setaffinity", create=True) as mock_affinity,
+            patch.object(thread_budget, "torch") as mock_torch,
+            patch.object(thread_budget, "threadpool_limits") as mock_limits,
+            patch.object(thread_budget, "cv2") as mock_cv2,
+        ):
+            mock_torch.get_num_interop_threads.return_value = 1
+            thread_budget.configure_process(**kwargs)
+        return mock_affinity, mock_torch, mock_limits, mock_cv2
+
+    def test_applies_budget_and_affinity(self):
+        mock_affinity, mock_torch, mock_limits, mock_cv2 = self._configure(process_index=1)
+
+        mock_affinity.assert_called_once_with(0, [4, 5, 6, 7])
+        mock_torch.set_num_threads.assert_called_once_with(TASK_THREADS)
+        mock_limits.assert_called_once_with(limits=TASK_THREADS)
+        mock_cv2.setNumThreads.assert_called_once_with(TASK_THREADS)
+
+    def test_parallel_stages_share_process_limit(self):
+        _, _, mock_limits, _ = self._configure(stages=[STAGE_OCR, STAGE_COLOR], parallel_stages=PARALLEL_STAGES)
+
+        # Один лимит на процесс: этапы в потоках не переключают его друг у друга
+        mock_limits.assert_called_once_with(limits=1)
+
+    def test_single_stage_process_uses_stage_limit(self):
+        _, _, mock_limits, _ = self._configure(stages=[STAGE_COLOR])
+
+        mock_limits.assert_called_once_with(limits=COLOR_THREADS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,35 @@
+import tempfile
+import threading
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import numpy as np
 import pytest
 import torch
+from ml_models import yolo_detector
 from ml_models.yolo_detector import detect_objects
+from ml_models.yolo_detector import detect_objects_batch
+from ultralytics.engine.results import Boxes
+from utils.image_utils import DecodedImage
 
 
 CLOCK_THRESHOLD = 0.85
 PERSON_THRESHOLD = 0.75
 TEST_NUM_DETECTIONS = 2
+NUM_THREADS = 4
+LOAD_DELAY = 0.05
+LOW_CONFIDENCES = (0.4, 0.5, 0.6)
+
+
+def make_result(rows: list[list[float]], orig_shape: tuple[int, int]) -> MagicMock:
+    """Результат predict с настоящими ultralytics Boxes: строки x1, y1, x2, y2, conf, cls."""
+    result = MagicMock()
+    result.boxes = Boxes(torch.tensor(rows, dtype=torch.float32).reshape(-1, 6), orig_shape)
+    return result
+
 
 class TestYoloDetector(unittest.TestCase):
     @patch("ml_models.yolo_detector.get_yolo_model")
@@ -24,28 +43,14 @@ class TestYoloDetector(unittest.TestCase):
         mock_get_model.return_value = mock_model
         mock_model.names = {0: "person", 74: "clock"}
 
-        # Mock для clock
-        mock_box1 = MagicMock()
-        mock_box1.cls = torch.tensor([74])
-        mock_box1.conf = torch.tensor([CLOCK_THRESHOLD])
-        mock_box1.xyxy = torch.tensor([[50.0, 50.0, 150.0, 150.0]])
-
-        # Mock для person
-        mock_box2 = MagicMock()
-        mock_box2.cls = torch.tensor([0])
-        mock_box2.conf = torch.tensor([PERSON_THRESHOLD])
-        mock_box2.xyxy = torch.tensor([[200.0, 200.0, 300.0, 300.0]])
-
-        # Имитация results[0].boxes
-        mock_boxes_iterator = iter([mock_box1, mock_box2])
-        mock_boxes_obj = MagicMock()
-        mock_boxes_obj.__iter__ = lambda _: mock_boxes_iterator
-
-        mock_results_obj = MagicMock()
-        mock_results_obj.boxes = mock_boxes_obj
-
-        # mock_model.predict для возврата results
-        mock_model.predict.return_value = [mock_results_obj]
+        # Боксы clock и person в том порядке, в каком их отдаёт NMS
+        mock_model.predict.return_value = [make_result(
+            [
+                [50.0, 50.0, 150.0, 150.0, CLOCK_THRESHOLD, 74],
+                [200.0, 200.0, 300.0, 300.0, PERSON_THRESHOLD, 0],
+            ],
+            orig_shape=(400, 400),
+        )]
 
         temp_path = "temp_path.jpg"
         detections = detect_objects(temp_path, conf_threshold=0.35)
@@ -87,6 +92,69 @@ class TestYoloDetector(unittest.TestCase):
         mock_model.predict.assert_called_once()
         assert detections == []
 
+    @patch("ml_models.yolo_detector.get_yolo_model")
+    @patch("PIL.Image.open")
+    def test_detect_objects_decoded_image(self, mock_pil_open, mock_get_model):
+        image = DecodedImage(np.zeros((200, 400, 3), dtype=np.uint8))
+
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.names = {74: "clock"}
+
+        mock_model.predict.return_value = [
+            make_result([[40.0, 20.0, 200.0, 100.0, CLOCK_THRESHOLD, 74]], orig_shape=(200, 400)),
+        ]
+
+        detections = detect_objects(image, conf_threshold=0.35)
+
+        # Файл не открывается повторно, модель получает уже декодированный массив
+        mock_pil_open.assert_not_called()
+        assert mock_model.predict.call_args.kwargs["source"] is image.rgb
+        np.testing.assert_allclose(detections[0]["bbox"], [0.1, 0.1, 0.5, 0.5], atol=1e-5)
+
+    @patch("ml_models.yolo_detector.get_yolo_model")
+    def test_detect_objects_batch(self, mock_get_model):
+        images = [
+            DecodedImage(np.zeros((200, 400, 3), dtype=np.uint8)),
+            DecodedImage(np.zeros((100, 100, 3), dtype=np.uint8)),
+        ]
+
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.names = {74: "clock"}
+
+        with_box = make_result([[40.0, 20.0, 200.0, 100.0, CLOCK_THRESHOLD, 74]], orig_shape=(200, 400))
+        empty = make_result([], orig_shape=(100, 100))
+        mock_model.predict.return_value = [with_box, empty]
+
+        detections = detect_objects_batch(images, conf_threshold=0.35)
+
+        # Одна пачка на все изображения, боксы нормируются по размеру своего изображения
+        mock_model.predict.assert_called_once()
+        assert len(mock_model.predict.call_args.kwargs["source"]) == len(images)
+        np.testing.assert_allclose(detections[0][0]["bbox"], [0.1, 0.1, 0.5, 0.5], atol=1e-5)
+        assert detections[1] == []
+
+    @patch("ml_models.yolo_detector.get_yolo_model")
+    def test_detect_objects_keeps_top_confidences(self, mock_get_model):
+        image = DecodedImage(np.zeros((100, 100, 3), dtype=np.uint8))
+        mock_model = MagicMock()
+        mock_get_model.return_value = mock_model
+        mock_model.names = {0: "person", 41: "cup", 74: "clock"}
+        rows = [[0.0, 0.0, 10.0, 10.0, confidence, 41] for confidence in LOW_CONFIDENCES]
+        rows.insert(1, [10.0, 20.0, 30.0, 40.0, CLOCK_THRESHOLD, 74])
+        mock_model.predict.return_value = [make_result(rows, orig_shape=(100, 100))]
+
+        detections = detect_objects(image)
+
+        assert [d["class"] for d in detections] == ["clock", "cup", "cup"]
+        np.testing.assert_allclose(
+            [d["confidence"] for d in detections], [CLOCK_THRESHOLD, 0.6, 0.5], atol=1e-6,
+        )
+        np.testing.assert_allclose(detections[0]["bbox"], [0.1, 0.2, 0.3, 0.4], atol=1e-6)
+        # Значения - обычные float, как раньше: результат сериализуется в JSON
+        assert all(type(value) is float for d in detections for value in (d["confidence"], *d["bbox"]))
+
     @patch("ml_models.yolo_detector.get_yolo_model")
     @patch("PIL.Image.open")
     def test_detect_objects_model_exception(self, mock_pil_open, mock_get_model):
@@ -108,5 +176,68 @@ class TestYoloDetector(unittest.TestCase):
         assert "Mock YOLO Error" in str(exc.value)
 
 
+
+class TestYoloThreadSafety(unittest.TestCase):
+    def _run_threads(self, target) -> list:
+        barrier = threading.Barrier(NUM_THREADS)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(target())
+
+        threads = [threading.Thread(target=worker) for _ in range(NUM_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_model_loaded_once_across_threads(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        model_path = Path(tmp_dir.name) / "yolo.pt"
+        model_path.touch()
+
+        def slow_load(_path):
+            time.sleep(LOAD_DELAY)
+            return MagicMock()
+
+        with (
+            patch.object(yolo_detector, "_yolo_model", None),
+            patch.object(yolo_detector.settings, "MODEL_CACHE_DIR", tmp_dir.name),
+            patch.object(yolo_detector.settings, "YOLO_MODEL_PATH", model_path.name),
+            patch.object(yolo_detector, "YOLO", side_effect=slow_load) as mock_yolo,
+        ):
+            models = self._run_threads(yolo_detector.get_yolo_model)
+
+        # Потоки пула делят одну модель, а не загружают по копии каждый
+        mock_yolo.assert_called_once()
+        assert all(model is models[0] for model in models)
+
+    @patch("ml_models.yolo_detector.get_yolo_model")
+    def test_predict_calls_serialized(self, mock_get_model):
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def predict(**_kwargs):
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(LOAD_DELAY)
+            with lock:
+                active -= 1
+            return []
+
+        mock_get_model.return_value.predict.side_effect = predict
+        image = DecodedImage(np.zeros((8, 8, 3), dtype=np.uint8))
+
+        self._run_threads(lambda: detect_objects(image))
+
+        assert max_active == 1
+
+
 if __name__ == "__main__":
     unittest.main()
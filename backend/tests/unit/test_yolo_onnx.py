@@ -0,0 +1,114 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import torch
+from config import settings
+from ml_models import yolo_detector
+from ultralytics import YOLO
+from utils.image_utils import DecodedImage
+
+
+ort = pytest.importorskip("onnxruntime")
+onnx = pytest.importorskip("onnx")
+
+from ml_models.yolo_onnx import get_int8_onnx_path  # noqa: E402
+from ml_models.yolo_onnx import get_yolo_onnx_file  # noqa: E402
+from ml_models.yolo_onnx import load_yolo_onnx  # noqa: E402
+from ml_models.yolo_onnx_export import DETECTION_ATOL  # noqa: E402
+from ml_models.yolo_onnx_export import detections_match  # noqa: E402
+from ml_models.yolo_onnx_export import export_yolo_to_onnx  # noqa: E402
+from ml_models.yolo_onnx_export import quantize_yolo_onnx  # noqa: E402
+
+
+OUTPUT_ATOL = 1e-3
+DATASET_DIR = Path(__file__).resolve().parents[3] / "dataset"
+PT_MODEL_PATH = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH
+LOW_CONF_THRESHOLD = 0.0
+
+
+def _detect_with(model, image: DecodedImage, conf_threshold: float) -> list[dict]:
+    with patch.object(yolo_detector, "_yolo_model", model):
+        return yolo_detector.detect_objects(image, conf_threshold=conf_threshold)
+
+
+class TestYoloOnnxExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        tmp_path = Path(cls.tmp_dir.name)
+        torch.manual_seed(0)
+        # Маленькая сеть со случайными весами: проверяется граф, а не качество детекции
+        YOLO("yolov8n.yaml", task="detect").save(tmp_path / "tiny.pt")
+        cls.pt_model = YOLO(tmp_path / "tiny.pt")
+        cls.onnx_path = export_yolo_to_onnx(cls.pt_model, tmp_path / "tiny.onnx", imgsz=320)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_graph_outputs_match_pytorch(self):
+        session = ort.InferenceSession(str(self.onnx_path), providers=["CPUExecutionProvider"])
+        torch_model = self.pt_model.model.fuse().eval()
+        # Динамические оси: другой батч и размер входа, чем при экспорте
+        images = torch.rand((2, 3, 256, 384))
+        with torch.no_grad():
+            expected = torch_model(images)[0].numpy()
+        (actual,) = session.run(None, {"images": images.numpy()})
+
+        assert actual.shape == expected.shape
+        assert np.max(np.abs(actual - expected)) < OUTPUT_ATOL
+
+    def test_detect_objects_output_format(self):
+        image = DecodedImage((np.random.default_rng(0).random((240, 320, 3)) * 255).astype(np.uint8))
+        onnx_model = load_yolo_onnx(self.onnx_path)
+
+        detections = _detect_with(onnx_model, image, LOW_CONF_THRESHOLD)
+
+        assert onnx_model.names == self.pt_model.names
+        assert detections
+        assert all(set(detection) == {"class", "confidence", "bbox"} for detection in detections)
+        assert all(0 <= value <= 1 for detection in detections for value in detection["bbox"])
+
+    def test_int8_model_keeps_metadata(self):
+        int8_path = quantize_yolo_onnx(self.onnx_path, get_int8_onnx_path(self.onnx_path))
+
+        assert int8_path.name == "tiny.int8.onnx"
+        assert load_yolo_onnx(int8_path).names == self.pt_model.names
+        assert int8_path.stat().st_size < self.onnx_path.stat().st_size
+        # Ключи метаданных не дублируются
+        keys = [prop.key for prop in onnx.load(str(int8_path)).metadata_props]
+        assert len(keys) == len(set(keys))
+
+    def test_int8_not_written_over_fp32(self):
+        with pytest.raises(ValueError, match="отдельно от fp32"):
+            quantize_yolo_onnx(self.onnx_path, self.onnx_path)
+
+    def test_onnx_file_chosen_by_precision(self):
+        with patch.object(settings, "YOLO_ONNX_PATH", "yolov8m.onnx"):
+            with patch.object(settings, "YOLO_ONNX_INT8", False):
+                assert get_yolo_onnx_file() == "yolov8m.onnx"
+            with patch.object(settings, "YOLO_ONNX_INT8", True):
+                assert get_yolo_onnx_file() == "yolov8m.int8.onnx"
+
+
+@unittest.skipUnless(PT_MODEL_PATH.exists(), f"Нет весов YOLO {PT_MODEL_PATH}")
+class TestYoloOnnxAgreement(unittest.TestCase):
+    def test_detections_match_pt_model(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        pt_model = YOLO(PT_MODEL_PATH)
+        onnx_model = load_yolo_onnx(export_yolo_to_onnx(pt_model, Path(tmp_dir.name) / "yolo.onnx"))
+
+        for image_path in sorted(DATASET_DIR.glob("*.jpg")):
+            image = DecodedImage.from_path(image_path)
+            reference = _detect_with(pt_model, image, yolo_detector.CONF_THRESHOLD)
+            candidate = _detect_with(onnx_model, image, yolo_detector.CONF_THRESHOLD)
+            assert detections_match(reference, candidate, DETECTION_ATOL), image_path.name
+
+
+if __name__ == "__main__":
+    unittest.main()
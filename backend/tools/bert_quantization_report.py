@@ -0,0 +1,154 @@
+"""
+Сравнение fp32 и INT8 (динамическое квантование) версий мультимодального BERT.
+
+Для каждого изображения из датасета выполняются OCR и детекция, затем оба варианта
+классификатора предсказывают тему. Истинная тема берётся из имени файла
+(см. TOPIC_FILE_MAPPING). Отчёт: точность, согласие fp32/INT8, задержка, размер весов.
+
+Запуск из каталога backend:
+    python -m tools.bert_quantization_report --dataset ../dataset --with-topic-texts
+"""
+import argparse
+import io
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from config import TOPIC_TEXTS
+from ml_models import ocr_model
+from ml_models import yolo_detector
+from ml_models.classifier import load_bert_tokenizer
+from ml_models.classifier import load_torch_bert_model
+from ml_models.classifier import predict_topic
+from ml_models.classifier import quantize_bert_model
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+FILE_KEY_TO_TOPIC = {
+    'bag': 'bags',
+    'cutlery': 'cutlery',
+    'clock': 'clocks',
+    'cup': 'cups',
+    'tie': 'ties',
+}
+
+
+def topic_from_filename(filename: str) -> str | None:
+    name = filename.lower()
+    for key, topic in FILE_KEY_TO_TOPIC.items():
+        if key in name:
+            return topic
+    return None
+
+
+def collect_samples(dataset_dir: Path, with_topic_texts: bool) -> list[dict]:
+    samples = []
+    for image_path in sorted(dataset_dir.iterdir()):
+        if image_path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        image = DecodedImage.from_path(image_path)
+        ocr_text, _ = ocr_model.extract_text_and_blocks(image)
+        detected_objects = yolo_detector.detect_objects(image)
+        samples.append({
+            "name": image_path.name,
+            "label": topic_from_filename(image_path.name),
+            "ocr_text": ocr_text,
+            "detected_objects": detected_objects,
+        })
+        logger.info(f"Подготовлен пример {image_path.name}")
+
+    if with_topic_texts:
+        samples.extend(
+            {"name": f"text:{topic}", "label": topic, "ocr_text": text, "detected_objects": []}
+            for topic, text in TOPIC_TEXTS.items()
+        )
+    return samples
+
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+
+def evaluate(model, tokenizer, samples: list[dict]) -> tuple[list[str], list[float]]:
+    predictions, latencies = [], []
+    for sample in samples:
+        started = time.perf_counter()
+        topic, _ = predict_topic(model, tokenizer, sample["ocr_text"], sample["detected_objects"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        predictions.append(topic)
+    return predictions, latencies
+
+
+def summarize(name: str, model, predictions: list[str], latencies: list[float], samples: list[dict]) -> dict:
+    labelled = [(p, s["label"]) for p, s in zip(predictions, samples, strict=True) if s["label"]]
+    accuracy = sum(p == label for p, label in labelled) / len(labelled) if labelled else None
+    sorted_latencies = sorted(latencies)
+    return {
+        "variant": name,
+        "accuracy": accuracy,
+        "labelled_samples": len(labelled),
+        "latency_mean_ms": statistics.mean(latencies),
+        "latency_p95_ms": sorted_latencies[int(0.95 * (len(sorted_latencies) - 1))],
+        "model_size_mb": model_size_mb(model),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт fp32 vs INT8 для мультимодального BERT")
+    parser.add_argument("--dataset", default="../dataset", help="Каталог с изображениями")
+    parser.add_argument("--with-topic-texts", action="store_true", help="Добавить синтетические слоганы TOPIC_TEXTS")
+    parser.add_argument("--repeats", type=int, default=3, help="Число прогонов для замера задержки")
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл")
+    args = parser.parse_args()
+
+    samples = collect_samples(Path(args.dataset), args.with_topic_texts)
+    if not samples:
+        logger.error("Нет примеров для сравнения.")
+        raise SystemExit(1)
+
+    tokenizer = load_bert_tokenizer()
+    fp32_model = load_torch_bert_model(torch.device("cpu"))
+    int8_model = quantize_bert_model(load_torch_bert_model(torch.device("cpu")))
+
+    report = []
+    predictions = {}
+    for name, model in (("fp32", fp32_model), ("int8", int8_model)):
+        evaluate(model, tokenizer, samples[:1])  # прогрев
+        latencies = []
+        for _ in range(args.repeats):
+            predictions[name], run_latencies = evaluate(model, tokenizer, samples)
+            latencies.extend(run_latencies)
+        report.append(summarize(name, model, predictions[name], latencies, samples))
+
+    agreement = sum(a == b for a, b in zip(predictions["fp32"], predictions["int8"], strict=True)) / len(samples)
+
+    logger.info(f"Примеров: {len(samples)}, согласие fp32/INT8: {agreement:.2%}")
+    for row in report:
+        accuracy = f"{row['accuracy']:.2%}" if row["accuracy"] is not None else "—"
+        logger.info(
+            f"{row['variant']:>5}: точность {accuracy} ({row['labelled_samples']} с разметкой), "
+            f"задержка {row['latency_mean_ms']:.1f} мс (p95 {row['latency_p95_ms']:.1f} мс), "
+            f"веса {row['model_size_mb']:.1f} МБ",
+        )
+    for sample, fp32_topic, int8_topic in zip(samples, predictions["fp32"], predictions["int8"], strict=True):
+        if fp32_topic != int8_topic:
+            logger.info(f"Расхождение на {sample['name']}: fp32={fp32_topic}, int8={int8_topic}")
+
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps({"agreement": agreement, "variants": report}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
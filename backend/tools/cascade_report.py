@@ -0,0 +1,115 @@
+"""
+Офлайн-оценка каскадной классификации на уже обработанных креативах.
+
+Для креативов, классифицированных BERT, проверяется, какую долю каскад закрыл бы
+без BERT (hit rate) и насколько его тема совпадает с сохранённым ответом BERT.
+Порог уверенности детекции можно перебрать через --thresholds.
+
+Запуск из каталога backend:
+    python -m tools.cascade_report --thresholds 0.6 0.7 0.8 0.9
+"""
+import argparse
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+
+from config import CLASSIFICATION_PATH_BERT
+from config import settings
+from database import SessionLocal
+from database_models.creative import CreativeAnalysis
+from ml_models.cascade import cascade_topic
+from sqlalchemy import or_
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_bert_samples(db) -> list[dict]:
+    rows = (
+        db.query(CreativeAnalysis)
+        .filter(
+            CreativeAnalysis.overall_status == "SUCCESS",
+            CreativeAnalysis.main_topic.isnot(None),
+            or_(
+                CreativeAnalysis.classification_path.is_(None),
+                CreativeAnalysis.classification_path == CLASSIFICATION_PATH_BERT,
+            ),
+        )
+        .all()
+    )
+    return [
+        {
+            "creative_id": row.creative_id,
+            "ocr_text": row.ocr_text or "",
+            "detected_objects": row.detected_objects or [],
+            "bert_topic": row.main_topic,
+        }
+        for row in rows
+    ]
+
+
+def evaluate_threshold(samples: list[dict], threshold: float) -> dict:
+    hits = agreed = 0
+    hits_by_topic, disagreements = Counter(), Counter()
+    for sample in samples:
+        decision = cascade_topic(sample["ocr_text"], sample["detected_objects"], threshold)
+        if decision is None:
+            continue
+        hits += 1
+        topic, _ = decision
+        hits_by_topic[topic] += 1
+        if topic == sample["bert_topic"]:
+            agreed += 1
+        else:
+            disagreements[f"{topic}->{sample['bert_topic']}"] += 1
+    return {
+        "threshold": threshold,
+        "samples": len(samples),
+        "hits": hits,
+        "hit_rate": hits / len(samples) if samples else 0.0,
+        "agreement": agreed / hits if hits else None,
+        "hits_by_topic": dict(hits_by_topic),
+        "disagreements": dict(disagreements),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка каскадной классификации по сохранённым результатам")
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=[settings.CASCADE_CONF_THRESHOLD],
+        help="Пороги уверенности детекции",
+    )
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        samples = load_bert_samples(db)
+    finally:
+        db.close()
+    if not samples:
+        logger.error("Нет креативов, классифицированных BERT.")
+        raise SystemExit(1)
+
+    report = [evaluate_threshold(samples, threshold) for threshold in args.thresholds]
+    logger.info(f"Креативов с ответом BERT: {len(samples)}")
+    for row in report:
+        agreement = f"{row['agreement']:.2%}" if row["agreement"] is not None else "—"
+        logger.info(
+            f"Порог {row['threshold']:.2f}: без BERT {row['hits']} ({row['hit_rate']:.2%}), "
+            f"согласие с BERT {agreement}, по темам {row['hits_by_topic']}",
+        )
+        if row["disagreements"]:
+            logger.info(f"  Расхождения (каскад->BERT): {row['disagreements']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,91 @@
+"""
+Конвертация .pt артефактов из бакета моделей в safetensors.
+
+safetensors читаются через mmap: загрузка быстрее, а prefork-дочерние процессы
+Celery на одной машине делят страницы весов вместо приватных копий.
+Чтобы воркеры начали использовать новые файлы, укажите в .env
+BERT_MODEL_PATH / YOLO_MODEL_PATH с расширением .safetensors.
+
+Запуск из каталога backend:
+    python -m tools.convert_to_safetensors --bert --yolo --upload
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+
+import torch
+from config import settings
+from minio_client import minio_client
+from safetensors.torch import save_file
+from services.model_loader import ensure_model_exists_locally
+
+
+logger = logging.getLogger(__name__)
+
+
+def _to_safetensors_name(object_name: str) -> str:
+    return str(Path(object_name).with_suffix(".safetensors"))
+
+
+def _prepare_state_dict(state_dict: dict) -> dict:
+    # safetensors не хранит общие между тензорами хранилища и несмежные тензоры
+    return {key: value.detach().clone().contiguous() for key, value in state_dict.items()}
+
+
+def convert_bert_checkpoint(pt_path: Path, output_path: Path) -> Path:
+    state_dict = torch.load(pt_path, map_location="cpu")
+    save_file(_prepare_state_dict(state_dict), output_path, metadata={"format": "pt"})
+    logger.info(f"BERT: {pt_path} -> {output_path}")
+    return output_path
+
+
+def convert_yolo_checkpoint(pt_path: Path, output_path: Path) -> Path:
+    # Чекпойнт ultralytics содержит pickled-модель, а не только state_dict
+    checkpoint = torch.load(pt_path, map_location="cpu", weights_only=False)
+    model = (checkpoint.get("ema") or checkpoint["model"]).float()
+    metadata = {
+        "format": "pt",
+        "yaml_file": Path(model.yaml.get("yaml_file", settings.YOLO_MODEL_CONFIG)).name,
+        "names": json.dumps({int(k): v for k, v in model.names.items()}, ensure_ascii=False),
+    }
+    save_file(_prepare_state_dict(model.state_dict()), output_path, metadata=metadata)
+    logger.info(f"YOLO: {pt_path} -> {output_path}")
+    return output_path
+
+
+def _convert(name: str, object_name: str, converter, upload: bool):
+    cache_dir = Path(settings.MODEL_CACHE_DIR)
+    pt_path = cache_dir / object_name
+    if not ensure_model_exists_locally(name, object_name, pt_path):
+        logger.error(f"Не удалось получить {object_name} из бакета {settings.MODEL_MINIO_BUCKET}")
+        raise SystemExit(1)
+
+    safetensors_name = _to_safetensors_name(object_name)
+    output_path = converter(pt_path, cache_dir / safetensors_name)
+
+    if upload:
+        minio_client.fput_object(settings.MODEL_MINIO_BUCKET, safetensors_name, str(output_path))
+        logger.info(f"Загружено в {settings.MODEL_MINIO_BUCKET}/{safetensors_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конвертация .pt моделей в safetensors")
+    parser.add_argument("--bert", action="store_true", help="Конвертировать чекпойнт BERT")
+    parser.add_argument("--yolo", action="store_true", help="Конвертировать веса YOLO")
+    parser.add_argument("--bert-object", default=settings.BERT_MODEL_PATH, help="Имя .pt объекта BERT в бакете")
+    parser.add_argument("--yolo-object", default=settings.YOLO_MODEL_PATH, help="Имя .pt объекта YOLO в бакете")
+    parser.add_argument("--upload", action="store_true", help="Загрузить результат в бакет моделей MinIO")
+    args = parser.parse_args()
+
+    if not args.bert and not args.yolo:
+        parser.error("Укажите --bert и/или --yolo")
+    if args.bert:
+        _convert("Multimodal BERT", args.bert_object, convert_bert_checkpoint, args.upload)
+    if args.yolo:
+        _convert("YOLOv8", args.yolo_object, convert_yolo_checkpoint, args.upload)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
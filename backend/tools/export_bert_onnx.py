@@ -0,0 +1,74 @@
+"""
+Экспорт мультимодального BERT в ONNX и проверка совпадения логитов.
+
+Запуск из каталога backend:
+    python -m tools.export_bert_onnx --check --upload
+"""
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import torch
+from config import TOPIC_TEXTS
+from config import settings
+from minio_client import minio_client
+from ml_models.bert_onnx import OnnxBertClassifier
+from ml_models.bert_onnx import export_bert_to_onnx
+from ml_models.classifier import MAX_SEQ_LENGTH
+from ml_models.classifier import load_bert_tokenizer
+from ml_models.classifier import load_torch_bert_model
+from ml_models.preprocessing import clean_text_for_bert
+from ml_models.preprocessing import yolo_to_vector_for_bert
+
+
+logger = logging.getLogger(__name__)
+
+LOGITS_ATOL = 1e-4
+
+
+def compare_logits(model, onnx_model: OnnxBertClassifier, tokenizer) -> float:
+    texts = [clean_text_for_bert(text) for text in TOPIC_TEXTS.values()] + [""]
+    encoding = tokenizer(
+        texts, return_tensors='pt', padding='longest', truncation=True, max_length=MAX_SEQ_LENGTH,
+    )
+    yolo_vec = torch.tensor(
+        np.stack([yolo_to_vector_for_bert(["clock", "cup"], [0.9, 0.4]) for _ in texts]),
+        dtype=torch.float32,
+    )
+    with torch.no_grad():
+        torch_logits = model(encoding['input_ids'], encoding['attention_mask'], yolo_vec)['logits']
+    onnx_logits = onnx_model.forward(encoding['input_ids'], encoding['attention_mask'], yolo_vec)['logits']
+    return float(torch.max(torch.abs(torch_logits - onnx_logits)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт MultiModalBertClassifier в ONNX")
+    parser.add_argument(
+        "--output",
+        default=str(Path(settings.MODEL_CACHE_DIR) / settings.BERT_ONNX_PATH),
+        help="Путь для сохранения ONNX-модели",
+    )
+    parser.add_argument("--check", action="store_true", help="Сравнить логиты PyTorch и ONNX Runtime")
+    parser.add_argument("--upload", action="store_true", help="Загрузить модель в бакет моделей MinIO")
+    args = parser.parse_args()
+
+    model = load_torch_bert_model(torch.device("cpu"))
+    output_path = export_bert_to_onnx(model, args.output)
+
+    if args.check:
+        tokenizer = load_bert_tokenizer()
+        max_diff = compare_logits(model, OnnxBertClassifier(output_path), tokenizer)
+        logger.info(f"Максимальное расхождение логитов PyTorch/ONNX: {max_diff:.2e}")
+        if max_diff > LOGITS_ATOL:
+            logger.error(f"Расхождение логитов превышает допуск {LOGITS_ATOL}")
+            raise SystemExit(1)
+
+    if args.upload:
+        minio_client.fput_object(settings.MODEL_MINIO_BUCKET, settings.BERT_ONNX_PATH, str(output_path))
+        logger.info(f"ONNX-модель загружена в {settings.MODEL_MINIO_BUCKET}/{settings.BERT_ONNX_PATH}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
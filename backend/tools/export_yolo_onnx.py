@@ -0,0 +1,89 @@
+"""
+Экспорт детектора YOLOv8 в ONNX и проверка совпадения детекций с PyTorch.
+
+Запуск из каталога backend:
+    python -m tools.export_yolo_onnx --check --upload
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from config import settings
+from minio_client import minio_client
+from ml_models import yolo_detector
+from ml_models.yolo_onnx import get_int8_onnx_path
+from ml_models.yolo_onnx import load_yolo_onnx
+from ml_models.yolo_onnx_export import detections_match
+from ml_models.yolo_onnx_export import export_yolo_to_onnx
+from ml_models.yolo_onnx_export import quantize_yolo_onnx
+from ultralytics import YOLO
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def detect_with(model: YOLO, image: DecodedImage) -> list[dict]:
+    # detect_objects берёт модель из синглтона модуля, подменяем её на время вызова
+    previous = yolo_detector._yolo_model  # noqa: SLF001
+    yolo_detector._yolo_model = model  # noqa: SLF001
+    try:
+        return yolo_detector.detect_objects(image)
+    finally:
+        yolo_detector._yolo_model = previous  # noqa: SLF001
+
+
+def compare_detections(pt_model: YOLO, onnx_model: YOLO, dataset_dir: Path) -> list[str]:
+    """Имена изображений, на которых детекции ONNX-модели расходятся с PyTorch."""
+    mismatches = []
+    for image_path in sorted(dataset_dir.iterdir()):
+        if image_path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        image = DecodedImage.from_path(image_path)
+        reference, candidate = detect_with(pt_model, image), detect_with(onnx_model, image)
+        if not detections_match(reference, candidate):
+            logger.info(f"Расхождение на {image_path.name}: PyTorch={reference}, ONNX={candidate}")
+            mismatches.append(image_path.name)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт YOLOv8 в ONNX")
+    parser.add_argument(
+        "--output",
+        default=str(Path(settings.MODEL_CACHE_DIR) / settings.YOLO_ONNX_PATH),
+        help="Путь для сохранения ONNX-модели",
+    )
+    parser.add_argument("--int8", action="store_true", help="Дополнительно сохранить INT8-версию (*.int8.onnx)")
+    parser.add_argument("--check", action="store_true", help="Сравнить детекции PyTorch и ONNX Runtime")
+    parser.add_argument("--dataset", default="../dataset", help="Каталог с изображениями для --check")
+    parser.add_argument("--upload", action="store_true", help="Загрузить модель в бакет моделей MinIO")
+    args = parser.parse_args()
+
+    pt_model = yolo_detector.load_yolo_torch_model(Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH)
+    output_path = export_yolo_to_onnx(pt_model, args.output)
+
+    if args.check:
+        mismatches = compare_detections(pt_model, load_yolo_onnx(output_path), Path(args.dataset))
+        if mismatches:
+            logger.error(f"Детекции ONNX расходятся с PyTorch на {len(mismatches)} изображениях")
+            raise SystemExit(1)
+        logger.info("Детекции PyTorch и ONNX совпадают")
+
+    uploads = {settings.YOLO_ONNX_PATH: output_path}
+    if args.int8:
+        # Квантованная модель с PyTorch не сверяется: согласие смотрит tools.yolo_backend_report
+        int8_path = quantize_yolo_onnx(output_path, get_int8_onnx_path(output_path))
+        uploads[get_int8_onnx_path(settings.YOLO_ONNX_PATH).as_posix()] = int8_path
+
+    if args.upload:
+        for object_name, path in uploads.items():
+            minio_client.fput_object(settings.MODEL_MINIO_BUCKET, object_name, str(path))
+            logger.info(f"ONNX-модель загружена в {settings.MODEL_MINIO_BUCKET}/{object_name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,121 @@
+"""
+Задержка и полнота OCR при адаптивном разрешении детектора текста.
+
+Каждое изображение датасета распознаётся в исходном разрешении (эталон) и с
+OCR_TARGET_SIDE из --sides. Полнота - доля слов эталонного текста, найденных
+в тексте варианта. Отчёт помогает выбрать OCR_TARGET_SIDE для .env.
+
+Запуск из каталога backend:
+    python -m tools.ocr_resolution_benchmark --dataset ../dataset --sides 2048 1600 1280 960
+"""
+import argparse
+import json
+import logging
+import re
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+
+from config import settings
+from ml_models import ocr_model
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+WORD_PATTERN = re.compile(r"\w+")
+FULL_RESOLUTION = 0
+
+
+def collect_images(dataset_dir: Path) -> list[tuple[str, DecodedImage]]:
+    return [
+        (image_path.name, DecodedImage.from_path(image_path))
+        for image_path in sorted(dataset_dir.iterdir())
+        if image_path.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+
+
+def text_recall(reference: str, candidate: str) -> float:
+    reference_words = Counter(WORD_PATTERN.findall(reference.lower()))
+    if not reference_words:
+        return 1.0
+    found = reference_words & Counter(WORD_PATTERN.findall(candidate.lower()))
+    return sum(found.values()) / sum(reference_words.values())
+
+
+def run_variant(
+        images: list[tuple[str, DecodedImage]], target_side: int, repeats: int,
+) -> tuple[list[str], list[float]]:
+    previous = settings.OCR_TARGET_SIDE
+    settings.OCR_TARGET_SIDE = target_side
+    try:
+        ocr_model.extract_text_and_blocks(images[0][1])  # прогрев
+        texts, latencies = [], []
+        for _ in range(repeats):
+            texts = []
+            for _, image in images:
+                started = time.perf_counter()
+                text, _ = ocr_model.extract_text_and_blocks(image)
+                latencies.append((time.perf_counter() - started) * 1000)
+                texts.append(text)
+    finally:
+        settings.OCR_TARGET_SIDE = previous
+    return texts, latencies
+
+
+def summarize(target_side: int, texts: list[str], latencies: list[float], reference: dict) -> dict:
+    recalls = [text_recall(ref, text) for ref, text in zip(reference["texts"], texts, strict=True)]
+    sorted_latencies = sorted(latencies)
+    latency_mean = statistics.mean(latencies)
+    return {
+        "target_side": target_side or "full",
+        "latency_mean_ms": latency_mean,
+        "latency_p95_ms": sorted_latencies[int(0.95 * (len(sorted_latencies) - 1))],
+        "speedup": reference["latency_mean_ms"] / latency_mean if latency_mean else None,
+        "recall_mean": statistics.mean(recalls),
+        "recall_min": min(recalls),
+        "recalls": recalls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и полнота OCR при уменьшении входа детектора")
+    parser.add_argument("--dataset", default="../dataset", help="Каталог с изображениями")
+    parser.add_argument("--sides", type=int, nargs="+", default=[2048, 1600, 1280, 960],
+                        help="Значения OCR_TARGET_SIDE для сравнения")
+    parser.add_argument("--repeats", type=int, default=3, help="Число прогонов для замера задержки")
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл")
+    args = parser.parse_args()
+
+    images = collect_images(Path(args.dataset))
+    if not images:
+        logger.error("Нет изображений для замера.")
+        raise SystemExit(1)
+
+    texts, latencies = run_variant(images, FULL_RESOLUTION, args.repeats)
+    reference = {"texts": texts, "latency_mean_ms": statistics.mean(latencies)}
+    report = [summarize(FULL_RESOLUTION, texts, latencies, reference)]
+    for target_side in args.sides:
+        texts, latencies = run_variant(images, target_side, args.repeats)
+        report.append(summarize(target_side, texts, latencies, reference))
+
+    logger.info(f"Изображений: {len(images)}, размеры: {sorted({image.size for _, image in images})}")
+    for row in report:
+        logger.info(
+            f"{row['target_side']!s:>5}: задержка {row['latency_mean_ms']:.1f} мс "
+            f"(p95 {row['latency_p95_ms']:.1f} мс, ускорение x{row['speedup']:.2f}), "
+            f"полнота текста {row['recall_mean']:.2%} (мин. {row['recall_min']:.2%})",
+        )
+        for (name, _), recall in zip(images, row["recalls"], strict=True):
+            if recall < 1:
+                logger.info(f"       {name}: полнота {recall:.2%}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,52 @@
+"""
+Сохранение токенизатора и конфига ruBERT рядом с чекпойнтом для офлайн-запуска.
+
+Выполняется один раз на машине с доступом к HF Hub. Файлы кладутся в
+MODEL_CACHE_DIR/BERT_TOKENIZER_DIR и, с флагом --upload, в бакет моделей MinIO,
+откуда их забирает services.model_loader.load_models.
+
+Запуск из каталога backend:
+    python -m tools.save_bert_tokenizer --upload
+"""
+import argparse
+import logging
+import shutil
+from pathlib import Path
+
+from config import settings
+from minio_client import minio_client
+from ml_models.classifier import BUNDLED_BERT_CONFIG_PATH
+from transformers import AutoTokenizer
+
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сохранение файлов токенизатора ruBERT")
+    parser.add_argument(
+        "--output",
+        default=str(Path(settings.MODEL_CACHE_DIR) / settings.BERT_TOKENIZER_DIR),
+        help="Каталог для файлов токенизатора",
+    )
+    parser.add_argument("--upload", action="store_true", help="Загрузить файлы в бакет моделей MinIO")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    tokenizer = AutoTokenizer.from_pretrained(settings.BERT_TOKENIZER_NAME)
+    tokenizer.save_pretrained(output_dir)
+    shutil.copyfile(BUNDLED_BERT_CONFIG_PATH, output_dir / "config.json")
+    logger.info(f"Токенизатор {settings.BERT_TOKENIZER_NAME} сохранён в {output_dir}")
+
+    if args.upload:
+        for file_path in sorted(output_dir.rglob("*")):
+            if not file_path.is_file():
+                continue
+            object_name = f"{settings.BERT_TOKENIZER_DIR}/{file_path.relative_to(output_dir).as_posix()}"
+            minio_client.fput_object(settings.MODEL_MINIO_BUCKET, object_name, str(file_path))
+            logger.info(f"Загружен {settings.MODEL_MINIO_BUCKET}/{object_name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
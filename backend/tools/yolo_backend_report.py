@@ -0,0 +1,128 @@
+"""
+Сравнение бэкендов детектора YOLOv8: PyTorch, ONNX Runtime и ONNX Runtime с INT8-весами.
+
+Каждое изображение датасета прогоняется через detect_objects с каждым вариантом
+модели. Согласие считается относительно PyTorch: точное - те же объекты с
+уверенностью и боксами в пределах DETECTION_ATOL, по классам - тот же набор
+классов. Отчёт: задержка (среднее и p95), согласие, размер файла модели.
+
+Запуск из каталога backend:
+    python -m tools.yolo_backend_report --dataset ../dataset --repeats 3
+"""
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from config import settings
+from ml_models import yolo_detector
+from ml_models.yolo_onnx import get_int8_onnx_path
+from ml_models.yolo_onnx import load_yolo_onnx
+from ml_models.yolo_onnx_export import detections_match
+from ml_models.yolo_onnx_export import export_yolo_to_onnx
+from ml_models.yolo_onnx_export import quantize_yolo_onnx
+from ultralytics import YOLO
+from utils.image_utils import DecodedImage
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+REFERENCE_VARIANT = "torch"
+
+
+def collect_images(dataset_dir: Path) -> list[tuple[str, DecodedImage]]:
+    return [
+        (image_path.name, DecodedImage.from_path(image_path))
+        for image_path in sorted(dataset_dir.iterdir())
+        if image_path.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+
+
+def run_variant(
+        model: YOLO, images: list[tuple[str, DecodedImage]], repeats: int,
+) -> tuple[list[list[dict]], list[float]]:
+    # detect_objects берёт модель из синглтона модуля, подменяем её на время замера
+    previous = yolo_detector._yolo_model  # noqa: SLF001
+    yolo_detector._yolo_model = model  # noqa: SLF001
+    try:
+        yolo_detector.detect_objects(images[0][1])  # прогрев
+        detections, latencies = [], []
+        for _ in range(repeats):
+            detections = []
+            for _, image in images:
+                started = time.perf_counter()
+                detections.append(yolo_detector.detect_objects(image))
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        yolo_detector._yolo_model = previous  # noqa: SLF001
+    return detections, latencies
+
+
+def class_sets_match(reference: list[dict], candidate: list[dict]) -> bool:
+    return sorted(d["class"] for d in reference) == sorted(d["class"] for d in candidate)
+
+
+def summarize(
+        name: str, model_path: Path, detections: list[list[dict]], latencies: list[float], reference: list[list[dict]],
+) -> dict:
+    pairs = list(zip(reference, detections, strict=True))
+    sorted_latencies = sorted(latencies)
+    return {
+        "variant": name,
+        "latency_mean_ms": statistics.mean(latencies),
+        "latency_p95_ms": sorted_latencies[int(0.95 * (len(sorted_latencies) - 1))],
+        "exact_agreement": sum(detections_match(ref, cand) for ref, cand in pairs) / len(pairs),
+        "class_agreement": sum(class_sets_match(ref, cand) for ref, cand in pairs) / len(pairs),
+        "model_size_mb": model_path.stat().st_size / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и согласие бэкендов YOLOv8 на CPU")
+    parser.add_argument("--dataset", default="../dataset", help="Каталог с изображениями")
+    parser.add_argument("--repeats", type=int, default=3, help="Число прогонов для замера задержки")
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл")
+    args = parser.parse_args()
+
+    images = collect_images(Path(args.dataset))
+    if not images:
+        logger.error("Нет изображений для замера.")
+        raise SystemExit(1)
+
+    pt_path = Path(settings.MODEL_CACHE_DIR) / settings.YOLO_MODEL_PATH
+    pt_model = yolo_detector.load_yolo_torch_model(pt_path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_path = export_yolo_to_onnx(pt_model, Path(tmp_dir) / "yolo.onnx")
+        int8_path = quantize_yolo_onnx(onnx_path, get_int8_onnx_path(onnx_path))
+        variants = (
+            (REFERENCE_VARIANT, pt_path, pt_model),
+            ("onnx", onnx_path, load_yolo_onnx(onnx_path)),
+            ("onnx-int8", int8_path, load_yolo_onnx(int8_path)),
+        )
+        results = {name: run_variant(model, images, args.repeats) for name, _, model in variants}
+        reference = results[REFERENCE_VARIANT][0]
+        report = [summarize(name, path, *results[name], reference) for name, path, _ in variants]
+
+    logger.info(f"Изображений: {len(images)}, повторов: {args.repeats}")
+    for row in report:
+        logger.info(
+            f"{row['variant']:>9}: задержка {row['latency_mean_ms']:.1f} мс (p95 {row['latency_p95_ms']:.1f} мс), "
+            f"согласие с PyTorch {row['exact_agreement']:.2%} (по классам {row['class_agreement']:.2%}), "
+            f"модель {row['model_size_mb']:.1f} МБ",
+        )
+    for name, _, _ in variants[1:]:
+        for (image_name, _), ref, cand in zip(images, reference, results[name][0], strict=True):
+            if not class_sets_match(ref, cand):
+                logger.info(f"Расхождение {name} на {image_name}: PyTorch={ref}, {name}={cand}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -8,6 +8,7 @@ from config import MONOCHROME_HEX_SET
 from config import PALETTE_HEX
 from PIL import Image
 from sklearn.cluster import KMeans
+from utils.image_utils import DecodedImage
 
 
 logger = logging.getLogger(__name__)
@@ -44,19 +45,20 @@ MIN_COLOR_SATURATION_PERCENT = 15
 
 
 def get_top_colors(
-        image_path: str,
+        image: DecodedImage | str,
         n_dominant: int = 3,
         n_secondary: int = 3,
         resize_size: tuple = (300, 300),
         n_coeff: float = 1.0,
 ) -> dict:
     try:
-        logger.info(f"[Цвета] Начало обработки изображения: {image_path}")
-        image = Image.open(image_path).convert('RGB')
-        image = image.resize(resize_size)
+        logger.info(f"[Цвета] Начало обработки изображения: {image}")
+        if isinstance(image, DecodedImage):
+            data = image.resized(resize_size)
+        else:
+            data = np.array(Image.open(image).convert('RGB').resize(resize_size))
         logger.info(f"[Цвета] Изображение загружено и уменьшено до {resize_size}")
 
-        data = np.array(image)
         h, w, _ = data.shape
         data = data.reshape((h * w, 3))
         total_pixels = data.shape[0]
@@ -103,7 +105,7 @@ def get_top_colors(
             f"Второстепенные: {len(secondary_colors)}",
         )
     except Exception as e:
-        logger.error(f"[Цвета] Ошибка при определении цветов для {image_path}: {e}", exc_info=True)
+        logger.error(f"[Цвета] Ошибка при определении цветов для {image}: {e}", exc_info=True)
         return {
             "dominant_colors": [],
             "secondary_colors": [],
@@ -0,0 +1,80 @@
+import io
+import logging
+import threading
+from pathlib import Path
+from typing import BinaryIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+
+class DecodedImage:
+    """
+    Изображение креатива, декодированное один раз на задачу.
+
+    Хранит RGB-массив и размеры; оттенки серого и уменьшенные копии строятся
+    лениво и кэшируются, поэтому этапы OCR, детекции и анализа цветов
+    не читают и не декодируют файл повторно.
+    """
+
+    def __init__(self, rgb: np.ndarray, source: str | None = None):
+        self.rgb = rgb
+        self.height, self.width = rgb.shape[:2]
+        self.source = source
+        self._grey = None
+        self._variants: dict[tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pil(cls, image: Image.Image, source: str | None = None) -> "DecodedImage":
+        rgb = np.asarray(image.convert("RGB"))
+        return cls(rgb, source=source)
+
+    @classmethod
+    def from_path(cls, path: str | Path) -> "DecodedImage":
+        with Image.open(path) as image:
+            return cls.from_pil(image, source=str(path))
+
+    @classmethod
+    def from_fileobj(cls, fileobj: BinaryIO, source: str | None = None) -> "DecodedImage":
+        with Image.open(fileobj) as image:
+            return cls.from_pil(image, source=source)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, source: str | None = None) -> "DecodedImage":
+        return cls.from_fileobj(io.BytesIO(data), source=source)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def grey(self) -> np.ndarray:
+        with self._lock:
+            if self._grey is None:
+                self._grey = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+            return self._grey
+
+    def resized(self, size: tuple[int, int]) -> np.ndarray:
+        """RGB-копия размера size (ширина, высота), как Image.resize."""
+        size = (int(size[0]), int(size[1]))
+        with self._lock:
+            variant = self._variants.get(size)
+            if variant is None:
+                variant = np.asarray(Image.fromarray(self.rgb).resize(size))
+                self._variants[size] = variant
+            return variant
+
+    def downscaled(self, max_side: int) -> np.ndarray:
+        """Копия с длинной стороной не больше max_side и исходными пропорциями."""
+        scale = max_side / max(self.width, self.height)
+        if scale >= 1:
+            return self.rgb
+        return self.resized((max(1, round(self.width * scale)), max(1, round(self.height * scale))))
+
+    def __repr__(self) -> str:
+        return f"DecodedImage({self.source or 'memory'}, {self.width}x{self.height})"
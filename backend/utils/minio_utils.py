@@ -1,5 +1,6 @@
 import logging
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
 
 from config import settings
 from minio.error import S3Error
@@ -8,6 +9,8 @@ from minio_client import minio_client
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 
 class FileNotSavedException(Exception):
     message = "Файл не был сохранён локально"
@@ -42,8 +45,13 @@ def download_file_from_minio(creative, analysis, db, temp_local_path: str):
 
         temp_local_path.parent.mkdir(parents=True, exist_ok=True)
         response = minio_client.get_object(settings.MINIO_BUCKET, object_name)
-        with temp_local_path.open("wb") as f:
-            f.write(response.read())
+        try:
+            with temp_local_path.open("wb") as f:
+                for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
         if not temp_local_path.exists():
             _raise_file_not_saved_exception(str(temp_local_path))
         logger.info(f"Изображение {creative.creative_id} успешно загружено из MinIO")
@@ -71,3 +79,40 @@ def download_file_from_minio(creative, analysis, db, temp_local_path: str):
             raise
 
     return False
+
+
+def download_file_to_buffer(creative, analysis, db) -> SpooledTemporaryFile | None:
+    """
+    Скачивает файл креатива из MinIO в память.
+
+    Объект читается потоком в SpooledTemporaryFile: до MINIO_SPOOL_MAX_SIZE байт
+    данные остаются в памяти, крупные файлы сбрасываются во временный файл.
+    Соединение возвращается в пул сразу после чтения.
+    """
+    object_name = f"{creative.creative_id}.{creative.file_format}"
+    buffer = SpooledTemporaryFile(max_size=settings.MINIO_SPOOL_MAX_SIZE)  # noqa: SIM115
+    try:
+        response = minio_client.get_object(settings.MINIO_BUCKET, object_name)
+        try:
+            for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+        size = buffer.tell()
+        buffer.seek(0)
+        logger.info(f"Изображение {creative.creative_id} загружено из MinIO в память ({size} байт)")
+    except S3Error:
+        logger.exception(f"Ошибка MinIO при загрузке {creative.creative_id}")
+    except Exception as e:
+        logger.exception(
+            f"Ошибка загрузки изображения из MinIO для {creative.creative_id}: {type(e).__name__}",
+        )
+    else:
+        return buffer
+
+    buffer.close()
+    analysis.overall_status = "ERROR"
+    analysis.error_message = "Не удалось загрузить изображение из MinIO"
+    db.commit()
+    return None
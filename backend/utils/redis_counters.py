@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import redis
+
+
+logger = logging.getLogger(__name__)
+
+# Отправлять накопленные приращения, когда их столько набралось или прошло столько секунд
+FLUSH_EVERY = 100
+FLUSH_INTERVAL = 10.0
+
+
+class BufferedCounters:
+    """
+    Счётчики процесса с отложенной записью в общий хэш Redis.
+
+    Приращение не обращается к Redis: оно копится в памяти и отправляется
+    одним конвейером HINCRBY, когда набралось flush_every приращений или прошло
+    flush_interval секунд с прошлой отправки, либо явно через flush(). Если
+    Redis недоступен, приращения остаются в памяти до следующей попытки.
+    """
+
+    def __init__(
+            self,
+            redis_key: str,
+            fields: tuple[str, ...],
+            get_client: Callable[[], redis.Redis | None],
+            flush_every: int = FLUSH_EVERY,
+            flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.redis_key = redis_key
+        self.fields = fields
+        self._get_client = get_client
+        self._flush_every = flush_every
+        self._flush_interval = flush_interval
+        self._totals = dict.fromkeys(fields, 0)
+        self._pending = dict.fromkeys(fields, 0)
+        # Приращений с прошлой попытки: после сбоя Redis повтор не на каждом вызове
+        self._since_flush = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def increment(self, *fields: str):
+        with self._lock:
+            for field in fields:
+                self._totals[field] += 1
+                self._pending[field] += 1
+            self._since_flush += len(fields)
+            due = (
+                self._since_flush >= self._flush_every
+                or time.monotonic() - self._last_flush >= self._flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Отправляет накопленные приращения в Redis одним запросом."""
+        with self._lock:
+            pending = {field: count for field, count in self._pending.items() if count}
+            self._pending = dict.fromkeys(self.fields, 0)
+            self._since_flush = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, count in pending.items():
+                pipeline.hincrby(self.redis_key, field, count)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось обновить счётчики {self.redis_key} в Redis: {e}")
+            with self._lock:
+                for field, count in pending.items():
+                    self._pending[field] += count
+
+    def totals(self) -> dict:
+        """Счётчики текущего процесса, включая ещё не отправленные."""
+        with self._lock:
+            return dict(self._totals)
+
+    def clear(self):
+        """Сбрасывает счётчики процесса. Общие счётчики в Redis не трогаются."""
+        with self._lock:
+            self._totals = dict.fromkeys(self.fields, 0)
+            self._pending = dict.fromkeys(self.fields, 0)
+            self._since_flush = 0
+
+    def read_shared(self) -> dict | None:
+        """Счётчики всех процессов, накопленные в Redis."""
+        client = self._get_client()
+        if client is None:
+            return None
+        raw = client.hgetall(self.redis_key)
+        return {field: int(raw.get(field.encode(), 0)) for field in self.fields}
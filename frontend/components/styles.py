@@ -4,6 +4,8 @@ def style_status(val):
         return "background-color: #ebebeb; color: #6c757d"
     if val_str == "X":
         return "background-color: #f8d7da; color: #721c24"
+    if val_str == "TIMEOUT":
+        return "background-color: #ffe5d0; color: #8a4b08"
     if val_str.endswith("sec "):
         return "background-color: #fff3cd; color: #856404"
     if val_str.endswith("sec"):
@@ -120,7 +120,7 @@ def _process_status_data(data):
 
     is_finished = all(
         isinstance(s, str) and s.endswith("sec") and not s.endswith("sec ")
-        for s in stage_statuses if s != "X"
+        for s in stage_statuses if s not in ("X", "TIMEOUT")
     )
 
     status_entry = {
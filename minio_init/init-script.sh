@@ -28,4 +28,8 @@ if [ -d "/minio_init/models/easy_ocr" ]; then
     mc cp -r /minio_init/models/easy_ocr minio/models/
 fi
 
+if [ -d "/minio_init/models/bert_tokenizer" ]; then
+    mc cp -r /minio_init/models/bert_tokenizer minio/models/
+fi
+
 echo "MinIO initialization completed successfully"
\ No newline at end of file